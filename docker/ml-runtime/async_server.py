@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+LEAN Trading Bot Stack - ML Runtime asyncio serving mode
+Predykcje obsługiwane na pętli zdarzeń, inferencja w ograniczonych pulach wątków per model
+
+Request bodies are read, decoded and encoded on the event loop; only the
+model call runs on a per-model thread pool. Each model admits at most
+max_pending requests at a time (decoding, queued or running), and
+anything past that is rejected at once with 429 instead of queueing, so
+latency stays bounded under overload. A full micro-batching queue is
+reported as 503.
+
+Thread pools rather than process pools run inference: ONNX Runtime,
+scikit-learn and TensorFlow release the GIL inside the model call, and
+loaded sessions cannot be pickled into another process.
+
+Every other route is served by the Flask app (ml_api.app) through a small
+WSGI bridge on its own thread pool, so the API is the same in both modes.
+
+Run with gunicorn (ML_SERVING_MODE=async in start.sh, which picks the
+aiohttp worker class in gunicorn.conf.py) or directly: python async_server.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from aiohttp import web
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+import metrics
+import ml_api
+from ml_api import (
+    NPY_MIMETYPE, RAW_TENSOR_MIMETYPE, BatchQueueFull, FeaturesNotReady, ModelNotFound,
+    logger, model_manager
+)
+
+PREDICT_ENDPOINT = '/models/<model_id>/predict'
+
+
+class Overloaded(Exception):
+    """A model already has max_pending requests in flight"""
+
+
+class InferencePool:
+    """Bounded thread pool and admission counter for one model version
+
+    pending is only touched from the event loop thread, so it needs no lock.
+    """
+
+    def __init__(self, model_id, version, workers, max_pending):
+        self.model_id = model_id
+        self.version = version
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.retired = False
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'infer-{model_id}')
+
+    def admit(self):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded(
+                f"Model {self.model_id} has {self.pending} requests in flight (limit {self.max_pending})"
+            )
+        self.pending += 1
+
+    def release(self):
+        self.pending -= 1
+        if self.retired and not self.pending:
+            self.shutdown()
+
+    async def run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def retire(self):
+        """Stop the pool once the requests it already admitted are done"""
+        self.retired = True
+        if not self.pending:
+            self.shutdown()
+
+    def shutdown(self):
+        # Calls already submitted finish on their own; nothing new is accepted
+        self.executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'rejected': self.rejected
+        }
+
+
+class InferencePools:
+    """One InferencePool per loaded model, rebuilt when a new version is swapped in
+
+    Sizes come from the model's 'serving' load option, falling back to
+    ML_ASYNC_INFERENCE_WORKERS and ML_ASYNC_MAX_PENDING.
+    """
+
+    def __init__(self):
+        self.default_workers = int(os.getenv('ML_ASYNC_INFERENCE_WORKERS', '2'))
+        self.default_max_pending = int(os.getenv('ML_ASYNC_MAX_PENDING', '32'))
+        self.pools = {}
+
+    def get(self, model_id, model_info):
+        pool = self.pools.get(model_id)
+        if pool is not None and pool.version == model_info['version']:
+            return pool
+        serving = model_info.get('serving') or {}
+        new_pool = InferencePool(
+            model_id,
+            model_info['version'],
+            int(serving.get('workers', self.default_workers)),
+            int(serving.get('max_pending', self.default_max_pending))
+        )
+        if pool is not None:
+            pool.retire()
+        self.prune()
+        self.pools[model_id] = new_pool
+        return new_pool
+
+    def prune(self):
+        """Shut down the pools of models no longer in the registry"""
+        for model_id in list(self.pools):
+            if model_id not in model_manager.models:
+                self.pools.pop(model_id).retire()
+
+    def stats(self):
+        return {model_id: pool.stats() for model_id, pool in self.pools.items()}
+
+
+def error_response(message, status, **extra):
+    return web.json_response({'error': message, **extra}, status=status)
+
+
+async def resolve_model(model_id):
+    """The registered model, lazily loaded on a worker thread when it is not resident"""
+    if model_id in model_manager.models:
+        return model_manager.get_model(model_id)
+    return await asyncio.get_running_loop().run_in_executor(None, model_manager.get_model, model_id)
+
+
+def decode_request(mimetype, headers, body, dtype):
+    """Parse a predict body on the event loop; returns (input, feature_spec)
+
+    Feature requests are only recognized here; assembling them reads the
+    feature state from disk, so that happens off the loop.
+    """
+    if mimetype in (NPY_MIMETYPE, RAW_TENSOR_MIMETYPE):
+        return ml_api.decode_tensor_bytes(mimetype, headers, body, dtype), None
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and 'features' in data:
+        return None, data['features']
+    return ml_api.tensor_from_json(data, dtype), None
+
+
+def encode_response(model_id, prediction, mimetype, extra):
+    if mimetype in (NPY_MIMETYPE, RAW_TENSOR_MIMETYPE):
+        body, headers = ml_api.encode_tensor_bytes(model_id, prediction, mimetype, extra)
+        return web.Response(body=body, content_type=mimetype, headers=headers)
+    return web.json_response(ml_api.prediction_payload(model_id, prediction, extra))
+
+
+async def predict(request):
+    """Event-loop version of ml_api.predict with per-model admission control"""
+    model_id = request.match_info['model_id']
+    try:
+        model_info = await resolve_model(model_id)
+    except ModelNotFound as e:
+        return error_response(str(e), 404)
+    except Exception as e:
+        logger.error(f"Lazy load error for model {model_id}: {e}")
+        return error_response(str(e), 500)
+
+    pool = request.app['inference_pools'].get(model_id, model_info)
+    try:
+        pool.admit()
+    except Overloaded as e:
+        metrics.PREDICTION_ERRORS.labels(model_id, 'overloaded').inc()
+        return error_response(str(e), 429, max_pending=pool.max_pending)
+
+    try:
+        try:
+            started = time.perf_counter()
+            dtype = model_manager.input_dtype(model_info)
+            body = await request.read()
+            input_data, feature_spec = decode_request(request.content_type, request.headers, body, dtype)
+            if feature_spec is not None:
+                input_data = await asyncio.get_running_loop().run_in_executor(
+                    None, ml_api.assemble_features, feature_spec, dtype
+                )
+            metrics.PREDICTION_STAGE_SECONDS.labels(model_id, 'deserialize').observe(time.perf_counter() - started)
+        except FeaturesNotReady as e:
+            metrics.PREDICTION_ERRORS.labels(model_id, 'features_not_ready').inc()
+            return error_response(str(e), 409, missing=e.columns)
+        except (ValueError, KeyError) as e:
+            metrics.PREDICTION_ERRORS.labels(model_id, 'bad_input').inc()
+            return error_response(str(e).strip("'"), 400)
+
+        try:
+            prediction, cached = await pool.run(
+                model_manager.predict_with_cache_status, model_id, input_data, model_info
+            )
+        except BatchQueueFull as e:
+            return error_response(str(e), 503)
+        except Exception as e:
+            metrics.PREDICTION_ERRORS.labels(model_id, 'inference').inc()
+            logger.error(f"Prediction error: {e}")
+            return error_response(str(e), 500)
+
+        started = time.perf_counter()
+        accept = parse_accept_header(request.headers.get('Accept'), MIMEAccept)
+        mimetype = ml_api.pick_tensor_mimetype(request.content_type, accept)
+        response = encode_response(model_id, prediction, mimetype, {'cached': cached})
+        metrics.PREDICTION_STAGE_SECONDS.labels(model_id, 'serialize').observe(time.perf_counter() - started)
+        return response
+    finally:
+        pool.release()
+
+
+async def predict_ensemble(request):
+    """Event-loop version of ml_api.predict_ensemble
+
+    Every member is admitted to its model's pool before any runs; if one
+    pool is full the whole ensemble is rejected with 429.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        body = await request.read()
+        if request.content_type in (NPY_MIMETYPE, RAW_TENSOR_MIMETYPE):
+            options = request.query
+            input_data = ml_api.decode_tensor_bytes(request.content_type, request.headers, body)
+        else:
+            try:
+                options = json.loads(body) if body else {}
+            except ValueError:
+                options = {}
+            if not isinstance(options, dict):
+                raise ValueError('input data is required')
+            if 'features' in options:
+                input_data = await loop.run_in_executor(None, ml_api.assemble_features, options['features'])
+            else:
+                input_data = ml_api.tensor_from_json(options)
+        model_ids, method, weights, allow_partial = ml_api.parse_ensemble_options(options)
+        metrics.PREDICTION_STAGE_SECONDS.labels('ensemble', 'deserialize').observe(time.perf_counter() - started)
+    except FeaturesNotReady as e:
+        return error_response(str(e), 409, missing=e.columns)
+    except (ValueError, KeyError) as e:
+        return error_response(str(e).strip("'"), 400)
+
+    resolved = await asyncio.gather(*(resolve_model(model_id) for model_id in model_ids), return_exceptions=True)
+    missing = [model_id for model_id, info in zip(model_ids, resolved) if isinstance(info, ModelNotFound)]
+    if missing:
+        return error_response(f"Models not loaded: {', '.join(missing)}", 404)
+    for model_id, info in zip(model_ids, resolved):
+        if isinstance(info, Exception):
+            logger.error(f"Lazy load error for model {model_id}: {info}")
+            return error_response(str(info), 500)
+
+    pools = [request.app['inference_pools'].get(model_id, info) for model_id, info in zip(model_ids, resolved)]
+    admitted = []
+    try:
+        for pool in pools:
+            pool.admit()
+            admitted.append(pool)
+    except Overloaded as e:
+        metrics.PREDICTION_ERRORS.labels(pool.model_id, 'overloaded').inc()
+        for pool in admitted:
+            pool.release()
+        return error_response(str(e), 429, max_pending=pool.max_pending)
+
+    try:
+        # Cast once per distinct input dtype, on the loop, before fanning out
+        casts = {}
+        calls = []
+        for model_id, info, pool in zip(model_ids, resolved, pools):
+            dtype = model_manager.input_dtype(info)
+            if dtype is not None and dtype != input_data.dtype and dtype not in casts:
+                casts[dtype] = input_data.astype(dtype)
+            member_input = casts.get(dtype, input_data) if dtype is not None else input_data
+            calls.append(pool.run(model_manager.ensemble_member, model_id, info, member_input))
+        outcomes = await asyncio.gather(*calls, return_exceptions=True)
+    finally:
+        for pool in pools:
+            pool.release()
+
+    results = {
+        model_id: {'error': outcome} if isinstance(outcome, Exception) else outcome
+        for model_id, outcome in zip(model_ids, outcomes)
+    }
+    payload, status = ml_api.ensemble_payload(model_ids, results, method, weights, allow_partial)
+    if status == 200:
+        payload['total_ms'] = (time.perf_counter() - started) * 1000
+    return web.json_response(payload, status=status)
+
+
+async def serving_stats(request):
+    """Per-model pool sizes, in-flight requests and rejections of this worker"""
+    request.app['inference_pools'].prune()
+    return web.json_response({
+        'pid': os.getpid(),
+        'pools': request.app['inference_pools'].stats(),
+        'defaults': {
+            'workers': request.app['inference_pools'].default_workers,
+            'max_pending': request.app['inference_pools'].default_max_pending
+        }
+    })
+
+
+class WSGIInput:
+    """Blocking file-like view of the aiohttp request body for a WSGI app on a worker thread"""
+
+    def __init__(self, content, loop):
+        self.content = content
+        self.loop = loop
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._call(self.content.read())
+        return self._call(self.content.read(size))
+
+    def readline(self, size=-1):
+        line = self._call(self.content.readline())
+        return line if size is None or size < 0 else line[:size]
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+def wsgi_environ(request):
+    host, _, port = (request.host or 'localhost').partition(':')
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        # PEP 3333 carries the undecoded path bytes as latin-1 text
+        'PATH_INFO': unquote(request.raw_path.split('?', 1)[0], encoding='latin-1'),
+        'QUERY_STRING': request.query_string,
+        'SERVER_NAME': host,
+        'SERVER_PORT': port or ('443' if request.secure else '80'),
+        'SERVER_PROTOCOL': f'HTTP/{request.version.major}.{request.version.minor}',
+        'REMOTE_ADDR': request.remote or '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': WSGIInput(request.content, asyncio.get_running_loop()),
+        'wsgi.input_terminated': request.content_length is None,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in request.headers.items():
+        key = name.upper().replace('-', '_')
+        if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[key] = value
+        else:
+            key = f'HTTP_{key}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ClientGone(Exception):
+    """The client disconnected while a bridged response was still streaming"""
+
+
+def run_wsgi(environ, chunks, abandoned, loop):
+    """Call the Flask app and feed its response into the chunks queue
+
+    A streamed Flask body keeps its request context on the thread that
+    started it, so the whole response is iterated on this one thread.
+    The bounded queue makes a slow client slow the producer down too.
+    """
+    def put(item):
+        if abandoned.is_set():
+            raise ClientGone()
+        asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    body = None
+    try:
+        body = ml_api.app(environ, start_response)
+        announced = False
+        for chunk in body:
+            # A generator body may only call start_response once it is iterated
+            if not announced:
+                put(('start', started))
+                announced = True
+            if chunk:
+                put(('chunk', chunk))
+        if not announced:
+            put(('start', started))
+        put(('end', None))
+    except ClientGone:
+        pass
+    except Exception as e:
+        logger.error(f"Bridged request {environ['PATH_INFO']} failed: {e}")
+        if not abandoned.is_set():
+            put(('error', e))
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+async def forward_to_flask(request):
+    """Serve a request with the Flask app, streaming its response body"""
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(maxsize=8)
+    abandoned = threading.Event()
+    done = loop.run_in_executor(
+        request.app['wsgi_executor'], run_wsgi, wsgi_environ(request), chunks, abandoned, loop
+    )
+    try:
+        kind, value = await chunks.get()
+        if kind == 'error':
+            return error_response('Internal server error', 500)
+
+        response = web.StreamResponse(status=value['status'])
+        for name, value in value['headers']:
+            if name.lower() not in ('content-length', 'transfer-encoding', 'connection'):
+                response.headers.add(name, value)
+        await response.prepare(request)
+        while True:
+            kind, value = await chunks.get()
+            if kind != 'chunk':
+                break
+            await response.write(value)
+        await response.write_eof()
+        await done
+        return response
+    finally:
+        # Unblock the producer if the client went away mid-stream
+        abandoned.set()
+        while not chunks.empty():
+            chunks.get_nowait()
+
+
+@web.middleware
+async def registry_middleware(request, handler):
+    """Apply other workers' registry changes and count requests served on the loop
+
+    The manifest is only stat'ed on the loop; reading it (and any load it
+    triggers) happens on a worker thread. Bridged Flask requests are
+    counted by ml_api's own after_request hook.
+    """
+    if ml_api.registry_sync and ml_api.registry_sync.changed():
+        await asyncio.get_running_loop().run_in_executor(None, ml_api.registry_sync.sync)
+    if handler is forward_to_flask:
+        return await handler(request)
+
+    started = time.perf_counter()
+    route = request.match_info.route.resource
+    endpoint = PREDICT_ENDPOINT if handler is predict else (route.canonical if route else 'unmatched')
+    response = await handler(request)
+    metrics.REQUESTS.labels(endpoint, request.method, str(response.status)).inc()
+    metrics.REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+    return response
+
+
+async def create_executors(app):
+    # Runs in each worker once its event loop starts, so no pool is inherited from the master
+    app['inference_pools'] = InferencePools()
+    app['wsgi_executor'] = ThreadPoolExecutor(
+        max_workers=int(os.getenv('ML_ASYNC_WSGI_THREADS', '8')), thread_name_prefix='wsgi'
+    )
+
+
+async def shutdown_executors(app):
+    for pool in app['inference_pools'].pools.values():
+        pool.shutdown()
+    app['wsgi_executor'].shutdown(wait=False)
+
+
+def create_app():
+    app = web.Application(
+        middlewares=[registry_middleware],
+        client_max_size=int(float(os.getenv('ML_ASYNC_MAX_BODY_MB', '256')) * 1024 * 1024)
+    )
+    app.router.add_post('/models/{model_id}/predict', predict)
+    app.router.add_post('/ensembles/predict', predict_ensemble)
+    app.router.add_get('/serving', serving_stats)
+    app.router.add_route('*', '/{tail:.*}', forward_to_flask)
+    app.on_startup.append(create_executors)
+    app.on_cleanup.append(shutdown_executors)
+    return app
+
+
+# With preload_app the gunicorn master imports async_server:app before forking, so
+# create_app() only builds routes; executors are created per worker in on_startup
+app = create_app()
+
+
+if __name__ == '__main__':
+    port = int(os.getenv('ML_API_PORT', 5001))
+    logger.info(f"Starting ML Runtime API (asyncio) on port {port}")
+    web.run_app(app, host='0.0.0.0', port=port)
@@ -0,0 +1,234 @@
+"""
+LEAN Trading Bot Stack - ML Runtime bulk scoring
+Strumieniowe czytanie wejścia i zapis predykcji porcjami o stałym rozmiarze
+"""
+
+import io
+import json
+import os
+import time
+
+import numpy as np
+
+CSV_MIMETYPE = 'text/csv'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+NPY_MIMETYPE = 'application/x-npy'
+
+# Bytes requested from a stream per read while parsing .npy input
+NPY_READ_SIZE = 1 << 20
+
+
+def format_for_path(path):
+    """Wire format implied by a file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return CSV_MIMETYPE
+    if extension in ('.ndjson', '.jsonl'):
+        return NDJSON_MIMETYPE
+    if extension == '.npy':
+        return NPY_MIMETYPE
+    raise ValueError(f"Unsupported bulk file format: {path}")
+
+
+def _is_header(line):
+    try:
+        [float(field) for field in line.split(',')]
+        return False
+    except ValueError:
+        return True
+
+
+def iter_csv_chunks(lines, chunk_size, dtype):
+    """Parse comma-separated rows into arrays of at most chunk_size rows
+
+    A first line that is not numeric is treated as a header and skipped.
+    """
+    buffer = []
+    first = True
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.strip()
+        if not line:
+            continue
+        if first:
+            first = False
+            if _is_header(line):
+                continue
+        buffer.append(line)
+        if len(buffer) == chunk_size:
+            yield np.loadtxt(buffer, delimiter=',', dtype=dtype, ndmin=2)
+            buffer = []
+    if buffer:
+        yield np.loadtxt(buffer, delimiter=',', dtype=dtype, ndmin=2)
+
+
+def iter_ndjson_chunks(lines, chunk_size, dtype):
+    """Parse one JSON row per line (a list, or an object with 'input') into chunks"""
+    buffer = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        row = json.loads(line)
+        buffer.append(row['input'] if isinstance(row, dict) else row)
+        if len(buffer) == chunk_size:
+            yield np.asarray(buffer, dtype=dtype)
+            buffer = []
+    if buffer:
+        yield np.asarray(buffer, dtype=dtype)
+
+
+def _read_exactly(stream, size):
+    parts = []
+    remaining = size
+    while remaining > 0:
+        part = stream.read(min(remaining, NPY_READ_SIZE))
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b''.join(parts)
+
+
+def iter_npy_stream_chunks(stream, chunk_size, dtype=None):
+    """Read a .npy payload from a non-seekable stream, chunk_size rows at a time"""
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, fortran_order, array_dtype = np.lib.format.read_array_header_1_0(stream)
+    else:
+        shape, fortran_order, array_dtype = np.lib.format.read_array_header_2_0(stream)
+    if array_dtype.hasobject:
+        raise ValueError("Object arrays are not accepted")
+    if fortran_order:
+        # Column-major rows are not contiguous, so this layout has to be read whole
+        size = int(np.prod(shape, dtype=np.int64)) * array_dtype.itemsize
+        array = np.frombuffer(_read_exactly(stream, size), dtype=array_dtype).reshape(shape, order='F')
+        for start in range(0, len(array), chunk_size):
+            chunk = np.ascontiguousarray(array[start:start + chunk_size])
+            yield chunk if dtype is None else chunk.astype(dtype, copy=False)
+        return
+
+    row_shape = shape[1:]
+    row_bytes = int(np.prod(row_shape, dtype=np.int64)) * array_dtype.itemsize
+    remaining = shape[0] if shape else 0
+    while remaining > 0:
+        count = min(chunk_size, remaining)
+        payload = _read_exactly(stream, count * row_bytes)
+        if len(payload) != count * row_bytes:
+            raise ValueError("Truncated .npy input")
+        chunk = np.frombuffer(payload, dtype=array_dtype).reshape((count, *row_shape))
+        yield chunk if dtype is None else chunk.astype(dtype, copy=False)
+        remaining -= count
+
+
+def iter_npy_file_chunks(path, chunk_size, dtype=None):
+    """Slice a memory-mapped .npy file, so only one chunk is paged in at a time"""
+    array = np.load(path, mmap_mode='r', allow_pickle=False)
+    for start in range(0, len(array), chunk_size):
+        chunk = np.asarray(array[start:start + chunk_size])
+        yield chunk if dtype is None else chunk.astype(dtype, copy=False)
+
+
+def iter_file_chunks(path, chunk_size, dtype=None):
+    """Chunks of a CSV, NDJSON or .npy file, picked by extension"""
+    input_format = format_for_path(path)
+    if input_format == NPY_MIMETYPE:
+        yield from iter_npy_file_chunks(path, chunk_size, dtype)
+        return
+
+    parse = iter_csv_chunks if input_format == CSV_MIMETYPE else iter_ndjson_chunks
+    with open(path, 'rb') as lines:
+        yield from parse(lines, chunk_size, dtype)
+
+
+def npy_row_count(path):
+    return np.load(path, mmap_mode='r', allow_pickle=False).shape[0]
+
+
+def encode_ndjson(prediction):
+    """One JSON line per prediction row"""
+    rows = np.asarray(prediction).tolist()
+    return ''.join(f"{json.dumps(row)}\n" for row in rows)
+
+
+def encode_csv(prediction):
+    prediction = np.asarray(prediction)
+    if prediction.ndim > 2:
+        prediction = prediction.reshape(len(prediction), -1)
+    buffer = io.StringIO()
+    np.savetxt(buffer, prediction, delimiter=',', fmt='%.10g')
+    return buffer.getvalue()
+
+
+class ChunkWriter:
+    """Append prediction chunks to a CSV, NDJSON or .npy file
+
+    .npy output needs the total row count up front, so it is only
+    available when that count is known (for example for .npy input).
+    """
+
+    def __init__(self, path, total_rows=None):
+        self.path = path
+        self.format = format_for_path(path)
+        self.total_rows = total_rows
+        self.rows_written = 0
+        self._file = None
+        self._array = None
+
+        if self.format == NPY_MIMETYPE and total_rows is None:
+            raise ValueError(".npy output requires an input with a known row count")
+        if self.format != NPY_MIMETYPE:
+            self._file = open(path, 'w')
+
+    def write(self, prediction):
+        prediction = np.asarray(prediction)
+        if self.format == CSV_MIMETYPE:
+            self._file.write(encode_csv(prediction))
+        elif self.format == NDJSON_MIMETYPE:
+            self._file.write(encode_ndjson(prediction))
+        else:
+            if self._array is None:
+                self._array = np.lib.format.open_memmap(
+                    self.path, mode='w+', dtype=prediction.dtype,
+                    shape=(self.total_rows, *prediction.shape[1:])
+                )
+            self._array[self.rows_written:self.rows_written + len(prediction)] = prediction
+        self.rows_written += len(prediction)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._array is not None:
+            self._array.flush()
+            self._array = None
+
+
+class ScoringRun:
+    """Feeds input chunks through a predict function and tracks throughput"""
+
+    def __init__(self, predict_fn, chunks):
+        self.predict_fn = predict_fn
+        self.chunks = chunks
+        self.rows = 0
+        self.chunk_count = 0
+        self.started = None
+        self.finished = None
+
+    def __iter__(self):
+        self.started = time.perf_counter()
+        for chunk in self.chunks:
+            prediction = self.predict_fn(chunk)
+            self.rows += len(chunk)
+            self.chunk_count += 1
+            yield prediction
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        return {
+            'rows': self.rows,
+            'chunks': self.chunk_count,
+            'seconds': elapsed,
+            'rows_per_second': self.rows / elapsed if elapsed > 0 else None
+        }
@@ -0,0 +1,81 @@
+"""
+LEAN Trading Bot Stack - ML Runtime ensembles
+Łączenie wyników kilku modeli: surowe wyjścia, średnia, średnia ważona, głosowanie
+"""
+
+import numpy as np
+
+COMBINE_METHODS = ('raw', 'mean', 'weighted', 'vote')
+
+
+def normalize_weights(model_ids, weights):
+    """Weights aligned with model_ids, summing to one
+
+    weights is a {model_id: weight} dict or a list in model order;
+    None gives every model the same weight.
+    """
+    if weights is None:
+        values = np.ones(len(model_ids))
+    elif isinstance(weights, dict):
+        unknown = set(weights) - set(model_ids)
+        if unknown:
+            raise ValueError(f"weights name models outside the ensemble: {', '.join(sorted(unknown))}")
+        values = np.array([float(weights.get(model_id, 0.0)) for model_id in model_ids])
+    else:
+        values = np.asarray(weights, dtype=np.float64)
+        if values.shape != (len(model_ids),):
+            raise ValueError(f"weights needs one value per model ({len(model_ids)})")
+
+    if (values < 0).any() or values.sum() <= 0:
+        raise ValueError("weights must be non-negative with a positive sum")
+    return values / values.sum()
+
+
+def _stack(outputs):
+    """Stack outputs of equal shape; (n,) and (n, 1) count as the same shape"""
+    arrays = [np.asarray(output, dtype=np.float64) for output in outputs]
+    arrays = [array[:, 0] if array.ndim == 2 and array.shape[1] == 1 else array for array in arrays]
+    shapes = {array.shape for array in arrays}
+    if len(shapes) > 1:
+        raise ValueError(f"Model outputs have different shapes and cannot be averaged: {sorted(shapes)}")
+    return np.stack(arrays)
+
+
+def labels(output):
+    """Class labels from one model output
+
+    Probability matrices (one column per class) vote for their argmax;
+    anything else is read as labels already, rounded to integers, so
+    -1/0/1 signals and sklearn predict() output both work.
+    """
+    array = np.asarray(output)
+    if array.ndim == 2 and array.shape[1] > 1:
+        return array.argmax(axis=1)
+    return np.rint(array.reshape(len(array))).astype(np.int64)
+
+
+def vote(outputs, weights):
+    """Weighted majority per row; ties go to the smallest label
+
+    Returns the winning labels and the share of weight that voted for them.
+    """
+    votes = np.stack([labels(output) for output in outputs])
+    candidates = np.unique(votes)
+    # (classes, rows): total weight behind each candidate label in every row
+    tally = np.stack([(weights[:, None] * (votes == label)).sum(axis=0) for label in candidates])
+    winners = tally.argmax(axis=0)
+    return candidates[winners], tally[winners, np.arange(votes.shape[1])]
+
+
+def combine(outputs, method, weights):
+    """Combine per-model outputs (in model order) into one result dict"""
+    if method == 'raw':
+        return {}
+    if method == 'vote':
+        prediction, agreement = vote(outputs, weights)
+        return {'prediction': prediction, 'agreement': agreement}
+
+    stacked = _stack(outputs)
+    if method == 'mean':
+        return {'prediction': stacked.mean(axis=0), 'spread': stacked.std(axis=0)}
+    return {'prediction': np.tensordot(weights, stacked, axes=1)}
@@ -0,0 +1,531 @@
+"""
+LEAN Trading Bot Stack - ML Runtime feature engine
+Przyrostowe wskaźniki techniczne per symbol (SMA, EMA, RSI, ATR, Bollinger, z-score, stopy zwrotu)
+"""
+
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from stats_engine import FileLock
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Run the kernels as plain Python when numba is not installed"""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+FEATURE_KINDS = ('sma', 'ema', 'rsi', 'atr', 'bollinger', 'zscore', 'return')
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9._-]{0,63}$')
+
+# Rolling sums are rebuilt from the ring buffer this often to stop float drift
+RESYNC_INTERVAL = 1024
+
+
+def _validate_name(kind, name):
+    if not isinstance(name, str) or not NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid {kind} name: {name}")
+    return name
+
+
+class FeatureSet:
+    """Named list of indicator specs and the feature vector layout they produce
+
+    Each spec is a dict with 'kind' and its parameters:
+    sma/zscore {window, field}, ema {span, field}, rsi {window},
+    atr {window}, bollinger {window, num_std}, return {lag, log}.
+    Rolling standard deviations use ddof=0.
+    """
+
+    def __init__(self, name, specs):
+        self.name = _validate_name('feature set', name)
+        if not specs:
+            raise ValueError("A feature set needs at least one feature")
+        self.specs = [self._normalize(spec) for spec in specs]
+        self.columns = [column for spec in self.specs for column in spec['outputs']]
+        # Longest look-back any spec needs from the ring buffer
+        self.history = max(
+            [spec.get('window', 1) for spec in self.specs] +
+            [spec.get('lag', 0) + 1 for spec in self.specs] + [2]
+        )
+
+    @staticmethod
+    def _normalize(spec):
+        spec = dict(spec)
+        kind = spec.get('kind')
+        if kind not in FEATURE_KINDS:
+            raise ValueError(f"Unknown feature kind: {kind}")
+
+        field = spec.setdefault('field', 'close')
+        if field not in BAR_FIELDS:
+            raise ValueError(f"Unknown bar field: {field}")
+
+        if kind == 'ema':
+            spec['span'] = int(spec.get('span', 12))
+            if spec['span'] < 1:
+                raise ValueError("span must be at least 1")
+            default_name = f"ema_{spec['span']}"
+        elif kind == 'return':
+            spec['lag'] = int(spec.get('lag', 1))
+            spec['log'] = bool(spec.get('log', False))
+            if spec['lag'] < 1:
+                raise ValueError("lag must be at least 1")
+            default_name = f"{'logret' if spec['log'] else 'return'}_{spec['lag']}"
+        else:
+            defaults = {'sma': 20, 'rsi': 14, 'atr': 14, 'bollinger': 20, 'zscore': 20}
+            spec['window'] = int(spec.get('window', defaults[kind]))
+            if spec['window'] < 2:
+                raise ValueError("window must be at least 2")
+            default_name = f"{kind}_{spec['window']}"
+
+        name = spec.setdefault('name', default_name)
+        if kind == 'bollinger':
+            spec['num_std'] = float(spec.get('num_std', 2.0))
+            spec['outputs'] = [f"{name}_upper", f"{name}_lower"]
+        else:
+            spec['outputs'] = [name]
+        return spec
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'features': [
+                {key: value for key, value in spec.items() if key != 'outputs'}
+                for spec in self.specs
+            ],
+            'columns': self.columns
+        }
+
+
+@njit(cache=True)
+def _ema_kernel(values, alpha):
+    out = np.empty_like(values)
+    level = values[0]
+    for i in range(values.shape[0]):
+        if i:
+            level += alpha * (values[i] - level)
+        out[i] = level
+    return out
+
+
+@njit(cache=True)
+def _rsi_kernel(close, window):
+    out = np.full(close.shape[0], np.nan)
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, close.shape[0]):
+        change = close[i] - close[i - 1]
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        if i == 1:
+            avg_gain = gain
+            avg_loss = loss
+        else:
+            avg_gain += (gain - avg_gain) / window
+            avg_loss += (loss - avg_loss) / window
+        if i >= window:
+            out[i] = _rsi_value(avg_gain, avg_loss)
+    return out, avg_gain, avg_loss
+
+
+@njit(cache=True)
+def _rsi_value(avg_gain, avg_loss):
+    if avg_loss == 0.0:
+        return 100.0 if avg_gain > 0.0 else 50.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+@njit(cache=True)
+def _atr_kernel(high, low, close, window):
+    out = np.full(close.shape[0], np.nan)
+    atr = 0.0
+    for i in range(close.shape[0]):
+        true_range = high[i] - low[i]
+        if i:
+            true_range = max(true_range, abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+            atr += (true_range - atr) / window
+        else:
+            atr = true_range
+        if i + 1 >= window:
+            out[i] = atr
+    return out, atr
+
+
+def _rolling_mean_std(values, window):
+    """Exact rolling mean and population std, NaN until the window is full"""
+    mean = np.full(values.shape[0], np.nan)
+    std = np.full(values.shape[0], np.nan)
+    if values.shape[0] >= window:
+        windows = sliding_window_view(values, window)
+        mean[window - 1:] = windows.mean(axis=1)
+        std[window - 1:] = windows.std(axis=1)
+    return mean, std
+
+
+class SymbolFeatureState:
+    """Rolling indicator state of one symbol under one feature set
+
+    update() costs O(1) per bar: windowed sums are kept relative to an
+    anchor value and adjusted by the value entering and the one leaving
+    the window. backfill() computes a whole history with vectorized
+    NumPy and numba kernels and leaves the same state behind, so
+    incremental updates can continue from it.
+    """
+
+    def __init__(self, feature_set):
+        self.feature_set = feature_set
+        self.size = feature_set.history
+        self.rings = np.zeros((len(BAR_FIELDS), self.size))
+        self.count = 0
+        self.position = 0
+        # Per spec scalars: windowed [anchor, sum, sumsq]; ema [level];
+        # rsi [prev_close, avg_gain, avg_loss]; atr [prev_close, atr]
+        self.state = [np.zeros(3) for _ in feature_set.specs]
+        self.latest = np.full(len(feature_set.columns), np.nan)
+
+    def _ring(self, field):
+        return self.rings[BAR_FIELDS.index(field)]
+
+    def _lookback(self, field, lag):
+        """Value lag bars before the newest one"""
+        return self._ring(field)[(self.position - 1 - lag) % self.size]
+
+    def update(self, bar):
+        """Fold one bar (array ordered as BAR_FIELDS) into the state and refresh latest"""
+        dropped = {}
+        for spec_index, spec in enumerate(self.feature_set.specs):
+            window = spec.get('window')
+            if spec['kind'] in ('sma', 'bollinger', 'zscore') and self.count >= window:
+                dropped[spec_index] = self._ring(spec['field'])[(self.position - window) % self.size]
+
+        self.rings[:, self.position] = bar
+        self.position = (self.position + 1) % self.size
+        self.count += 1
+
+        column = 0
+        for spec_index, spec in enumerate(self.feature_set.specs):
+            state = self.state[spec_index]
+            kind = spec['kind']
+            value = bar[BAR_FIELDS.index(spec['field'])]
+
+            if kind in ('sma', 'bollinger', 'zscore'):
+                window = spec['window']
+                if self.count == 1:
+                    state[:] = (value, 0.0, 0.0)
+                deviation = value - state[0]
+                state[1] += deviation
+                state[2] += deviation * deviation
+                if spec_index in dropped:
+                    old = dropped[spec_index] - state[0]
+                    state[1] -= old
+                    state[2] -= old * old
+                if self.count % RESYNC_INTERVAL == 0:
+                    self._resync(spec_index)
+                self._write_window_outputs(spec, state, value, column)
+
+            elif kind == 'ema':
+                alpha = 2.0 / (spec['span'] + 1.0)
+                state[0] = value if self.count == 1 else state[0] + alpha * (value - state[0])
+                self.latest[column] = state[0] if self.count >= spec['span'] else np.nan
+
+            elif kind == 'rsi':
+                close = bar[BAR_FIELDS.index('close')]
+                if self.count > 1:
+                    change = close - state[0]
+                    gain, loss = max(change, 0.0), max(-change, 0.0)
+                    if self.count == 2:
+                        state[1], state[2] = gain, loss
+                    else:
+                        state[1] += (gain - state[1]) / spec['window']
+                        state[2] += (loss - state[2]) / spec['window']
+                state[0] = close
+                self.latest[column] = (
+                    _rsi_value(state[1], state[2]) if self.count > spec['window'] else np.nan
+                )
+
+            elif kind == 'atr':
+                high, low, close = (bar[BAR_FIELDS.index(name)] for name in ('high', 'low', 'close'))
+                true_range = high - low
+                if self.count > 1:
+                    true_range = max(true_range, abs(high - state[0]), abs(low - state[0]))
+                    state[1] += (true_range - state[1]) / spec['window']
+                else:
+                    state[1] = true_range
+                state[0] = close
+                self.latest[column] = state[1] if self.count >= spec['window'] else np.nan
+
+            elif kind == 'return':
+                lag = spec['lag']
+                if self.count > lag:
+                    previous = self._lookback(spec['field'], lag)
+                    ratio = value / previous if previous else np.nan
+                    self.latest[column] = np.log(ratio) if spec['log'] else ratio - 1.0
+                else:
+                    self.latest[column] = np.nan
+
+            column += len(spec['outputs'])
+        return self.latest
+
+    def _write_window_outputs(self, spec, state, value, column):
+        window = spec['window']
+        if self.count < window:
+            self.latest[column:column + len(spec['outputs'])] = np.nan
+            return
+
+        offset = state[1] / window
+        mean = state[0] + offset
+        std = np.sqrt(max(state[2] / window - offset * offset, 0.0))
+        if spec['kind'] == 'sma':
+            self.latest[column] = mean
+        elif spec['kind'] == 'bollinger':
+            self.latest[column] = mean + spec['num_std'] * std
+            self.latest[column + 1] = mean - spec['num_std'] * std
+        else:
+            self.latest[column] = (value - mean) / std if std > 0 else 0.0
+
+    def _resync(self, spec_index):
+        """Rebuild a window's sums exactly from the ring buffer, re-anchored on its mean"""
+        spec = self.feature_set.specs[spec_index]
+        window = min(spec['window'], self.count)
+        ring = self._ring(spec['field'])
+        values = ring[(self.position - 1 - np.arange(window)) % self.size]
+        anchor = values.mean()
+        deviations = values - anchor
+        self.state[spec_index][:] = (anchor, deviations.sum(), (deviations * deviations).sum())
+
+    def backfill(self, bars):
+        """Compute the feature matrix for a full history (bars: N x BAR_FIELDS) from an empty state
+
+        Returns an (N, n_features) array; the state ends as if every bar
+        had been passed to update().
+        """
+        if self.count:
+            raise ValueError("backfill needs an empty state; reset the symbol first")
+
+        bars = np.ascontiguousarray(bars, dtype=np.float64)
+        total = bars.shape[0]
+        matrix = np.full((total, len(self.feature_set.columns)), np.nan)
+        if total == 0:
+            return matrix
+        high, low, close = (bars[:, BAR_FIELDS.index(name)] for name in ('high', 'low', 'close'))
+
+        column = 0
+        for spec_index, spec in enumerate(self.feature_set.specs):
+            kind = spec['kind']
+            values = bars[:, BAR_FIELDS.index(spec['field'])]
+            state = self.state[spec_index]
+
+            if kind in ('sma', 'bollinger', 'zscore'):
+                mean, std = _rolling_mean_std(values, spec['window'])
+                if kind == 'sma':
+                    matrix[:, column] = mean
+                elif kind == 'bollinger':
+                    matrix[:, column] = mean + spec['num_std'] * std
+                    matrix[:, column + 1] = mean - spec['num_std'] * std
+                else:
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        matrix[:, column] = np.where(std > 0, (values - mean) / std, 0.0)
+                    matrix[:spec['window'] - 1, column] = np.nan
+
+            elif kind == 'ema':
+                level = _ema_kernel(values, 2.0 / (spec['span'] + 1.0))
+                matrix[:, column] = level
+                matrix[:spec['span'] - 1, column] = np.nan
+                state[0] = level[-1]
+
+            elif kind == 'rsi':
+                out, avg_gain, avg_loss = _rsi_kernel(close, spec['window'])
+                matrix[:, column] = out
+                state[:] = (close[-1], avg_gain, avg_loss)
+
+            elif kind == 'atr':
+                out, atr = _atr_kernel(high, low, close, spec['window'])
+                matrix[:, column] = out
+                state[:2] = (close[-1], atr)
+
+            elif kind == 'return':
+                lag = spec['lag']
+                if total > lag:
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        ratio = values[lag:] / values[:-lag]
+                    matrix[lag:, column] = np.log(ratio) if spec['log'] else ratio - 1.0
+
+            column += len(spec['outputs'])
+
+        # Leave the ring buffer and windowed sums exactly where update() would
+        keep = min(total, self.size)
+        self.count = total
+        self.position = keep % self.size
+        self.rings[:, :keep] = bars[total - keep:].T
+        for spec_index, spec in enumerate(self.feature_set.specs):
+            if spec['kind'] in ('sma', 'bollinger', 'zscore'):
+                self._resync(spec_index)
+        self.latest = matrix[-1].copy()
+        return matrix
+
+    def to_arrays(self):
+        arrays = {
+            'rings': self.rings,
+            'count': np.array(self.count),
+            'position': np.array(self.position),
+            'latest': self.latest
+        }
+        for index, state in enumerate(self.state):
+            arrays[f'state_{index}'] = state
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, feature_set, arrays):
+        instance = cls(feature_set)
+        instance.rings = arrays['rings'].copy()
+        instance.count = int(arrays['count'])
+        instance.position = int(arrays['position'])
+        instance.latest = arrays['latest'].copy()
+        instance.state = [arrays[f'state_{index}'].copy() for index in range(len(feature_set.specs))]
+        return instance
+
+
+def parse_bars(payload):
+    """N x BAR_FIELDS float64 array from JSON records, JSON columns or a 2-D array
+
+    Only close is required; open/high/low default to close and volume to 0.
+    """
+    if isinstance(payload, np.ndarray):
+        array = np.asarray(payload, dtype=np.float64)
+        if array.ndim != 2 or array.shape[1] not in (1, len(BAR_FIELDS)):
+            raise ValueError("Bar arrays must be N x 5 (open, high, low, close, volume) or N x 1 (close)")
+        if array.shape[1] == 1:
+            close = array[:, 0]
+            return np.column_stack([close, close, close, close, np.zeros_like(close)])
+        return array
+
+    if isinstance(payload, list):
+        columns = {
+            field: [bar.get(field) for bar in payload]
+            for field in BAR_FIELDS
+        }
+    elif isinstance(payload, dict):
+        columns = payload
+    else:
+        raise ValueError("bars must be a list of bars or a dict of columns")
+
+    if columns.get('close') is None:
+        raise ValueError("close prices are required")
+    close = np.asarray(columns['close'], dtype=np.float64)
+    result = np.empty((len(close), len(BAR_FIELDS)))
+    for index, field in enumerate(BAR_FIELDS):
+        values = columns.get(field)
+        if values is None or (isinstance(values, list) and all(value is None for value in values)):
+            result[:, index] = 0.0 if field == 'volume' else close
+        else:
+            result[:, index] = np.asarray(values, dtype=np.float64)
+    return result
+
+
+class FeatureStore:
+    """Feature sets and per-symbol states, persisted on disk for all worker processes
+
+    States are cached in-process and only re-read when another process
+    has written a newer version of the file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'sets'), exist_ok=True)
+        self._sets = {}
+        self._states = {}
+
+    def _set_path(self, name):
+        return os.path.join(self.directory, 'sets', f"{_validate_name('feature set', name)}.json")
+
+    def _state_path(self, set_name, symbol):
+        directory = os.path.join(self.directory, _validate_name('feature set', set_name))
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{_validate_name('symbol', symbol)}.npz")
+
+    def define(self, name, specs):
+        feature_set = FeatureSet(name, specs)
+        path = self._set_path(name)
+        if os.path.exists(path) and self.get_set(name).to_dict() != feature_set.to_dict():
+            # Existing states were built for the old layout
+            self.drop_states(name)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(feature_set.to_dict(), f)
+        os.replace(tmp_path, path)
+        self._sets[name] = (os.stat(path).st_mtime_ns, feature_set)
+        return feature_set
+
+    def get_set(self, name):
+        path = self._set_path(name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise KeyError(f"Feature set {name} is not defined")
+        cached = self._sets.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path) as f:
+            feature_set = FeatureSet(name, json.load(f)['features'])
+        self._sets[name] = (mtime, feature_set)
+        return feature_set
+
+    def list_sets(self):
+        names = sorted(
+            os.path.splitext(entry)[0]
+            for entry in os.listdir(os.path.join(self.directory, 'sets'))
+            if entry.endswith('.json')
+        )
+        return [self.get_set(name).to_dict() for name in names]
+
+    def lock(self, set_name, symbol):
+        self.get_set(set_name)
+        return FileLock(f"{self._state_path(set_name, symbol)}.lock")
+
+    def load_state(self, set_name, symbol):
+        feature_set = self.get_set(set_name)
+        path = self._state_path(set_name, symbol)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return SymbolFeatureState(feature_set)
+
+        cached = self._states.get((set_name, symbol))
+        if cached and cached[0] == mtime and cached[1].feature_set is feature_set:
+            return cached[1]
+        with np.load(path) as arrays:
+            state = SymbolFeatureState.from_arrays(feature_set, arrays)
+        self._states[(set_name, symbol)] = (mtime, state)
+        return state
+
+    def save_state(self, set_name, symbol, state):
+        path = self._state_path(set_name, symbol)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **state.to_arrays())
+        os.replace(tmp_path, path)
+        self._states[(set_name, symbol)] = (os.stat(path).st_mtime_ns, state)
+
+    def reset_state(self, set_name, symbol):
+        path = self._state_path(set_name, symbol)
+        if os.path.exists(path):
+            os.remove(path)
+        self._states.pop((set_name, symbol), None)
+
+    def drop_states(self, set_name):
+        directory = os.path.join(self.directory, set_name)
+        if os.path.isdir(directory):
+            for entry in os.listdir(directory):
+                if entry.endswith('.npz'):
+                    os.remove(os.path.join(directory, entry))
+        for key in [key for key in self._states if key[0] == set_name]:
+            del self._states[key]
+
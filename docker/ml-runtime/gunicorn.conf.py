@@ -0,0 +1,34 @@
+"""
+LEAN Trading Bot Stack - ML Runtime production serving (gunicorn)
+
+The app is imported once in the master process (preload_app), so models
+listed in ML_PRELOAD_MODELS are loaded before the workers fork and their
+weights are shared copy-on-write. Each worker then rebuilds the state
+that does not survive fork (threads, ONNX Runtime / TensorFlow sessions).
+
+PROMETHEUS_MULTIPROC_DIR is set by start.sh so /metrics covers all workers.
+With ML_SERVING_MODE=async the workers run async_server:app on aiohttp's
+event loop worker instead of threaded Flask workers.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('ML_API_PORT', '5001')}"
+workers = int(os.getenv('ML_API_WORKERS', '4'))
+if os.getenv('ML_SERVING_MODE') == 'async':
+    worker_class = 'aiohttp.GunicornWebWorker'
+else:
+    worker_class = 'gthread'
+threads = int(os.getenv('ML_API_THREADS', '4'))
+timeout = int(os.getenv('ML_API_TIMEOUT', '120'))
+preload_app = True
+
+
+def post_fork(server, worker):
+    from ml_api import model_manager
+    model_manager.after_fork()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,121 @@
+"""
+LEAN Trading Bot Stack - ML Runtime metrics
+Metryki Prometheus dla ścieżki predykcji, rejestru modeli i kolejek batchowania
+
+With several gunicorn workers PROMETHEUS_MULTIPROC_DIR must point to an
+empty directory before the app is imported; /metrics then aggregates the
+samples written by every worker.
+"""
+
+import os
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, multiprocess
+    )
+except ImportError:
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+    Counter = Gauge = Histogram = None
+
+# Sub-millisecond resolution for the fast stages, up to a few seconds for slow models
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+ROW_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _NoopMetric:
+    """Stands in for every metric when prometheus-client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _metric(kind, *args, **kwargs):
+    if kind is None:
+        return _NoopMetric()
+    if kind is not Gauge:
+        kwargs.pop('multiprocess_mode', None)
+    return kind(*args, **kwargs)
+
+
+REQUESTS = _metric(
+    Counter, 'ml_api_requests_total', 'HTTP requests handled',
+    ['endpoint', 'method', 'status']
+)
+REQUEST_SECONDS = _metric(
+    Histogram, 'ml_api_request_seconds', 'HTTP request wall time',
+    ['endpoint'], buckets=LATENCY_BUCKETS
+)
+PREDICTION_STAGE_SECONDS = _metric(
+    Histogram, 'ml_prediction_stage_seconds',
+    'Time per prediction stage (deserialize, inference, serialize)',
+    ['model_id', 'stage'], buckets=LATENCY_BUCKETS
+)
+PREDICTION_ERRORS = _metric(
+    Counter, 'ml_prediction_errors_total', 'Failed predictions by reason',
+    ['model_id', 'reason']
+)
+PREDICTION_ROWS = _metric(
+    Histogram, 'ml_prediction_input_rows', 'Rows per prediction input',
+    ['model_id'], buckets=ROW_BUCKETS
+)
+MICROBATCH_ROWS = _metric(
+    Histogram, 'ml_microbatch_rows', 'Rows per merged micro-batch model call',
+    ['model_id'], buckets=ROW_BUCKETS
+)
+CACHE_HITS = _metric(
+    Counter, 'ml_prediction_cache_hits_total', 'Predictions served from the result cache',
+    ['model_id']
+)
+MODEL_LOAD_SECONDS = _metric(
+    Histogram, 'ml_model_load_seconds', 'Model load time including session setup and warm-up',
+    ['model_id', 'model_type'], buckets=LOAD_BUCKETS
+)
+MODEL_RESIDENT_BYTES = _metric(
+    Gauge, 'ml_model_resident_bytes', 'Size of each model held in the registry',
+    ['model_id'], multiprocess_mode='liveall'
+)
+REGISTRY_RESIDENT_BYTES = _metric(
+    Gauge, 'ml_registry_resident_bytes', 'Total size of the models held in the registry',
+    multiprocess_mode='liveall'
+)
+REGISTRY_MODELS = _metric(
+    Gauge, 'ml_registry_models', 'Models held in the registry',
+    multiprocess_mode='liveall'
+)
+BATCH_QUEUE_DEPTH = _metric(
+    Gauge, 'ml_batch_queue_depth', 'Requests waiting in a model micro-batching queue',
+    ['model_id'], multiprocess_mode='liveall'
+)
+
+
+def available():
+    return Counter is not None
+
+
+def render():
+    """Exposition body for /metrics, aggregated over workers in multiprocess mode"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead(pid):
+    """Drop the live gauges of an exited worker (gunicorn child_exit hook)"""
+    if available() and os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
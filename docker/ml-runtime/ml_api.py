@@ -4,14 +4,33 @@ LEAN Trading Bot Stack - ML Runtime API
 Obsługuje modele ONNX, TensorFlow i scikit-learn
 """
 
+import io
 import os
+import hashlib
+import itertools
 import json
+import fcntl
+import tempfile
+import queue
 import logging
+import threading
+import time
 import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import numpy as np
+import pandas as pd
+
+import bulk_scoring
+import ensemble
+import feature_engine
+import metrics
+import model_conversion
+import stats_engine
 
 # ML Libraries
 try:
@@ -41,16 +60,460 @@ logger = logging.getLogger(__name__)
 # Global variables for loaded models
 loaded_models = {}
 
+# Binary tensor wire formats accepted and returned by /predict
+NPY_MIMETYPE = 'application/x-npy'
+RAW_TENSOR_MIMETYPE = 'application/octet-stream'
+
+# ONNX tensor element types mapped to the NumPy dtype the session expects
+ONNX_TENSOR_DTYPES = {
+    'tensor(float)': np.float32,
+    'tensor(double)': np.float64,
+    'tensor(float16)': np.float16,
+    'tensor(int8)': np.int8,
+    'tensor(int16)': np.int16,
+    'tensor(int32)': np.int32,
+    'tensor(int64)': np.int64,
+    'tensor(uint8)': np.uint8,
+    'tensor(bool)': np.bool_
+}
+
+# ONNX Runtime session settings accepted by /models/<id>/load
+ONNX_GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': 'ORT_DISABLE_ALL',
+    'basic': 'ORT_ENABLE_BASIC',
+    'extended': 'ORT_ENABLE_EXTENDED',
+    'all': 'ORT_ENABLE_ALL'
+}
+ONNX_EXECUTION_MODES = {
+    'sequential': 'ORT_SEQUENTIAL',
+    'parallel': 'ORT_PARALLEL'
+}
+ONNX_SESSION_SETTINGS = {
+    'intra_op_num_threads', 'inter_op_num_threads', 'execution_mode',
+    'graph_optimization_level', 'cache_optimized'
+}
+# Reduced-precision variants that /models/<id>/load can build from a float ONNX model
+ONNX_PRECISIONS = ('int8', 'fp16')
+ONNX_PRECISION_SETTINGS = {'type', 'per_channel', 'evaluate', 'samples'}
+
+class BatchQueueFull(Exception):
+    """Raised when a model's batching queue has no room for another request"""
+
+
+class _PendingPrediction:
+    """Single caller waiting for its rows of a batched prediction"""
+    __slots__ = ('input_data', 'event', 'result', 'error')
+
+    def __init__(self, input_data):
+        self.input_data = input_data
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Merges concurrent predictions for one model into a single batched call"""
+
+    def __init__(self, model_id, run_fn, max_batch_size=32, max_wait_ms=2.0, max_queue_size=1024):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must not be negative")
+        if max_queue_size < 1:
+            raise ValueError("max_queue_size must be at least 1")
+
+        self.model_id = model_id
+        self.run_fn = run_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self.max_queue_size = int(max_queue_size)
+        self.batches_run = 0
+        self.rows_run = 0
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._worker, name=f'batcher-{model_id}', daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def config(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'max_queue_size': self.max_queue_size
+        }
+
+    def stats(self):
+        return {
+            **self.config(),
+            'queue_depth': self.queue_depth,
+            'batches_run': self.batches_run,
+            'rows_run': self.rows_run
+        }
+
+    def submit(self, input_data):
+        """Queue input rows and block until their slice of the batch result is ready"""
+        if self._stopped:
+            raise RuntimeError(f"Batching for model {self.model_id} has been stopped")
+
+        # Scalars and flat vectors have no batch axis to merge along
+        if input_data.ndim < 2:
+            return self.run_fn(input_data)
+
+        pending = _PendingPrediction(input_data)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            metrics.PREDICTION_ERRORS.labels(self.model_id, 'queue_full').inc()
+            raise BatchQueueFull(
+                f"Batch queue for model {self.model_id} is full ({self.max_queue_size} requests)"
+            )
+
+        metrics.BATCH_QUEUE_DEPTH.labels(self.model_id).set(self._queue.qsize())
+        pending.event.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def stop(self):
+        """Finish queued requests and stop the worker thread"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _worker(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            rows = len(first.input_data)
+            deadline = time.monotonic() + self.max_wait
+
+            while rows < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                rows += len(item.input_data)
+
+            metrics.BATCH_QUEUE_DEPTH.labels(self.model_id).set(self._queue.qsize())
+            metrics.MICROBATCH_ROWS.labels(self.model_id).observe(rows)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # Only inputs with the same row shape and dtype can share one tensor
+        groups = {}
+        for item in batch:
+            key = (item.input_data.shape[1:], item.input_data.dtype.str)
+            groups.setdefault(key, []).append(item)
+
+        for items in groups.values():
+            try:
+                if len(items) == 1:
+                    items[0].result = self.run_fn(items[0].input_data)
+                else:
+                    merged = np.concatenate([item.input_data for item in items], axis=0)
+                    result = np.asarray(self.run_fn(merged))
+                    if len(result) != len(merged):
+                        raise ValueError(
+                            f"Model {self.model_id} returned {len(result)} rows for a batch of {len(merged)}"
+                        )
+                    offset = 0
+                    for item in items:
+                        count = len(item.input_data)
+                        item.result = result[offset:offset + count]
+                        offset += count
+                self.batches_run += 1
+                self.rows_run += sum(len(item.input_data) for item in items)
+            except Exception as e:
+                logger.error(f"Batched prediction error for model {self.model_id}: {e}")
+                for item in items:
+                    item.error = e
+            finally:
+                for item in items:
+                    item.event.set()
+
+
+class PredictionCache:
+    """Size-bounded LRU cache of prediction results with a time-to-live
+
+    Keys combine the model version with a hash of the input's shape,
+    dtype and raw bytes, so a reloaded model never serves results
+    computed by its previous version.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=60.0):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds must be positive")
+
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(version, input_data):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{version}|{input_data.shape}|{input_data.dtype.str}|".encode())
+        digest.update(np.ascontiguousarray(input_data).data)
+        return digest.digest()
+
+    def config(self):
+        return {'max_entries': self.max_entries, 'ttl_seconds': self.ttl}
+
+    def stats(self):
+        return {**self.config(), 'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result):
+        if isinstance(result, np.ndarray):
+            # Shared between callers, so nobody may modify it in place
+            result = result.copy()
+            result.flags.writeable = False
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ModelNotFound(LookupError):
+    """Raised when a model is neither loaded nor resolvable from storage"""
+
+
+# File extensions tried, in order, when a model is loaded lazily by id
+MODEL_FILE_EXTENSIONS = ('.onnx', '.joblib', '.pkl', '.h5', '.pb')
+
+
+def file_fingerprint(path):
+    """Size and modification time of a model file, identifying one version of its contents"""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def path_size(path):
+    """Size of a model file or model directory on disk, in bytes"""
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(path)
+            for name in files
+        )
+    return os.path.getsize(path)
+
+
 class ModelManager:
-    """Manager for loading and using different types of ML models"""
+    """Manager for loading and using different types of ML models
+
+    Loaded models are kept in least-recently-used order. When
+    MODEL_MEMORY_BUDGET_MB is set, loading a model evicts the least
+    recently used unpinned models until the approximate resident size
+    fits the budget again. A predict for a model that is not in memory
+    loads it from MODEL_STORAGE_PATH first.
+
+    A model is built and warmed up completely before it replaces the
+    current version under the registry lock, so predictions never see a
+    half-loaded model. Replaced versions stay in memory for
+    ML_ROLLBACK_GRACE_SECONDS so rollback() can swap them back in.
+    """
     
     def __init__(self):
-        self.models = {}
+        self.models = OrderedDict()
+        self.model_specs = {}
+        self.retired = {}
         self.model_storage_path = os.getenv('MODEL_STORAGE_PATH', '/app/models')
+        self.memory_budget_bytes = int(float(os.getenv('MODEL_MEMORY_BUDGET_MB', '0')) * 1024 * 1024)
+        self.rollback_grace_seconds = float(os.getenv('ML_ROLLBACK_GRACE_SECONDS', '300'))
+        self.load_workers = int(os.getenv('ML_LOAD_WORKERS', '2'))
+        self.ensemble_workers = int(os.getenv('ML_ENSEMBLE_WORKERS', '8'))
+        self.registry_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self._versions = itertools.count(1)
+        self._load_executor = ThreadPoolExecutor(max_workers=self.load_workers, thread_name_prefix='model-load')
+        self._ensemble_executor = ThreadPoolExecutor(max_workers=self.ensemble_workers, thread_name_prefix='ensemble')
         os.makedirs(self.model_storage_path, exist_ok=True)
+
+    @property
+    def resident_bytes(self):
+        """Size of the active models plus the retired versions kept for rollback"""
+        active = sum(model['size_bytes'] for model in list(self.models.values()))
+        return active + self.retired_bytes
+
+    @property
+    def retired_bytes(self):
+        return sum(
+            entry['model']['size_bytes']
+            for versions in list(self.retired.values()) for entry in list(versions)
+        )
+
+    def snapshot(self):
+        """Copy of the loaded models, safe to iterate while other requests load or evict"""
+        with self._lock:
+            return list(self.models.items())
+
+    def registry_info(self):
+        """Cache counters and memory usage of the model registry"""
+        with self._lock:
+            return {
+                **self.registry_stats,
+                'loaded_models': len(self.models),
+                'pinned_models': sum(1 for model in self.models.values() if model['pinned']),
+                'resident_bytes': self.resident_bytes,
+                'retired_versions': sum(len(versions) for versions in self.retired.values()),
+                'retired_bytes': self.retired_bytes,
+                'rollback_grace_seconds': self.rollback_grace_seconds,
+                'memory_budget_bytes': self.memory_budget_bytes or None
+            }
     
-    def load_onnx_model(self, model_path):
-        """Load ONNX model"""
+    def build_session_options(self, model_path, settings, providers=None):
+        """Translate load settings into SessionOptions and the model file to open
+
+        When graph optimization is enabled the optimized graph is saved next
+        to the model as <name>.<level>.<provider>.optimized.onnx; the
+        provider is part of the name because ORT bakes provider-specific
+        fusions into the graph. A later load of the same, unchanged model
+        opens that file with optimization disabled, so the graph is not
+        optimized again.
+
+        Returns (options, session_path, from_cache, pending). ORT writes the
+        optimized graph while the session is created, so it goes to a
+        temporary file; pending is (temporary_path, cached_path), or None,
+        and the caller moves it into place with publish_optimized_graph.
+        """
+        settings = settings or {}
+        options = ort.SessionOptions()
+
+        if settings.get('intra_op_num_threads') is not None:
+            options.intra_op_num_threads = int(settings['intra_op_num_threads'])
+        if settings.get('inter_op_num_threads') is not None:
+            options.inter_op_num_threads = int(settings['inter_op_num_threads'])
+
+        execution_mode = settings.get('execution_mode', 'sequential')
+        if execution_mode not in ONNX_EXECUTION_MODES:
+            raise ValueError(f"Unsupported execution_mode: {execution_mode}")
+        options.execution_mode = getattr(ort.ExecutionMode, ONNX_EXECUTION_MODES[execution_mode])
+
+        level = settings.get('graph_optimization_level', 'all')
+        if level not in ONNX_GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unsupported graph_optimization_level: {level}")
+
+        session_path = model_path
+        from_cache = False
+        pending = None
+        if level != 'disable' and settings.get('cache_optimized', True):
+            provider = (providers or ['CPUExecutionProvider'])[0].replace('ExecutionProvider', '').lower()
+            cached_path = f"{os.path.splitext(model_path)[0]}.{level}.{provider}.optimized.onnx"
+            if os.path.exists(cached_path) and os.path.getmtime(cached_path) >= os.path.getmtime(model_path):
+                session_path = cached_path
+                from_cache = True
+                level = 'disable'
+            elif os.access(os.path.dirname(model_path) or '.', os.W_OK):
+                # Other workers check the cached name, so ORT must never write it directly
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cached_path) or '.', suffix='.onnx')
+                os.close(fd)
+                options.optimized_model_filepath = tmp_path
+                pending = (tmp_path, cached_path)
+
+        options.graph_optimization_level = getattr(
+            ort.GraphOptimizationLevel, ONNX_GRAPH_OPTIMIZATION_LEVELS[level]
+        )
+        return options, session_path, from_cache, pending
+
+    @staticmethod
+    def publish_optimized_graph(pending, created):
+        """Move a fully written optimized graph into its cached name, or drop it"""
+        if not pending:
+            return
+        tmp_path, cached_path = pending
+        if created and os.path.getsize(tmp_path):
+            os.replace(tmp_path, cached_path)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    @staticmethod
+    def build_precision_variant(model_path, precision):
+        """Return the int8 or fp16 variant of an ONNX model, creating it on first use
+
+        The variant is cached next to the model as <name>.<tag>.onnx and
+        rebuilt only when the source model is newer. Returns
+        (variant_path, from_cache).
+        """
+        settings = precision if isinstance(precision, dict) else {'type': precision}
+        kind = settings.get('type')
+        if kind not in ONNX_PRECISIONS:
+            raise ValueError(f"Unsupported precision: {kind}")
+        per_channel = bool(settings.get('per_channel', False))
+        tag = f"{kind}-per-channel" if kind == 'int8' and per_channel else kind
+
+        variant_path = f"{os.path.splitext(model_path)[0]}.{tag}.onnx"
+        if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= os.path.getmtime(model_path):
+            return variant_path, True
+
+        # Build under a temporary name so other workers never open a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(variant_path), suffix='.onnx')
+        os.close(fd)
+        try:
+            if kind == 'int8':
+                model_conversion.quantize_int8(model_path, tmp_path, per_channel=per_channel)
+            else:
+                model_conversion.convert_fp16(model_path, tmp_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+        # Converters can emit graphs ONNX Runtime rejects (e.g. mixed float/float16 inputs)
+        try:
+            ort.InferenceSession(tmp_path, providers=['CPUExecutionProvider'])
+        except Exception as e:
+            os.remove(tmp_path)
+            raise ValueError(f"The {kind} variant of {os.path.basename(model_path)} is not loadable: {e}")
+        os.replace(tmp_path, variant_path)
+        return variant_path, False
+
+    def load_onnx_model(self, model_path, session_options=None, warmup=None, precision=None):
+        """Load ONNX model, or its reduced-precision variant when precision is given"""
         if not ort:
             raise ImportError("ONNX Runtime is not installed")
         
@@ -58,15 +521,126 @@ class ModelManager:
         if os.getenv('ONNX_RUNTIME_PROVIDER') == 'CUDAExecutionProvider':
             providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
         
-        session = ort.InferenceSession(model_path, providers=providers)
-        return {
+        variant_path = None
+        variant_from_cache = False
+        if precision:
+            variant_path, variant_from_cache = self.build_precision_variant(model_path, precision)
+
+        options, session_path, from_cache, pending = self.build_session_options(
+            variant_path or model_path, session_options, providers
+        )
+        try:
+            session = ort.InferenceSession(session_path, sess_options=options, providers=providers)
+        except Exception:
+            self.publish_optimized_graph(pending, created=False)
+            raise
+        self.publish_optimized_graph(pending, created=True)
+        model = {
             'type': 'onnx',
             'session': session,
             'input_names': [inp.name for inp in session.get_inputs()],
             'output_names': [out.name for out in session.get_outputs()],
-            'input_shapes': [inp.shape for inp in session.get_inputs()]
+            'input_shapes': [inp.shape for inp in session.get_inputs()],
+            'input_types': [inp.type for inp in session.get_inputs()],
+            'session_options': session_options or {},
+            'optimized_from_cache': from_cache,
+            'precision': precision,
+            'variant_path': variant_path,
+            'variant_from_cache': variant_from_cache
         }
+        if warmup:
+            model['warmup_ms'] = self.warm_up_onnx(model, warmup)
+        return model
+
+    def warm_up_onnx(self, model_info, warmup):
+        """Run synthetic inputs shaped from input_shapes; returns the mean run time in ms
+
+        warmup is either an iteration count or
+        {"iterations": N, "batch_size": B}. Symbolic dimensions become B
+        on the first axis and 1 elsewhere.
+        """
+        if not isinstance(warmup, dict):
+            warmup = {'iterations': int(warmup)}
+        iterations = max(1, int(warmup.get('iterations', 1)))
+        batch_size = max(1, int(warmup.get('batch_size', 1)))
+
+        feeds = {}
+        for name, shape, onnx_type in zip(
+            model_info['input_names'], model_info['input_shapes'], model_info['input_types']
+        ):
+            dims = [
+                dim if isinstance(dim, int) and dim > 0 else (batch_size if axis == 0 else 1)
+                for axis, dim in enumerate(shape)
+            ]
+            feeds[name] = np.zeros(dims, dtype=ONNX_TENSOR_DTYPES.get(onnx_type, np.float32))
+
+        session = model_info['session']
+        started = time.perf_counter()
+        for _ in range(iterations):
+            session.run(None, feeds)
+        return (time.perf_counter() - started) * 1000.0 / iterations
     
+    def evaluate_precision(self, model_info, samples=64):
+        """Compare a reduced-precision ONNX model with its float original
+
+        Runs the same synthetic inputs through both sessions and reports
+        file sizes, median single-row latency and the output difference.
+        """
+        original = ort.InferenceSession(model_info['model_path'], providers=['CPUExecutionProvider'])
+        input_name = model_info['input_names'][0]
+        dtype = ONNX_TENSOR_DTYPES.get(model_info['input_types'][0], np.float32)
+        inputs = model_conversion.sample_inputs(model_info['input_shapes'][0], n_samples=samples).astype(dtype)
+
+        def run_original(batch):
+            return original.run(None, {input_name: batch})[0]
+
+        def run_variant(batch):
+            return model_info['session'].run(None, {input_name: batch})[0]
+
+        comparison = model_conversion.compare_outputs(run_original(inputs), run_variant(inputs))
+        original_size = path_size(model_info['model_path'])
+        return {
+            'precision': model_info['precision'],
+            'variant_path': os.path.basename(model_info['variant_path']),
+            'variant_from_cache': model_info['variant_from_cache'],
+            'original_size_bytes': original_size,
+            'variant_size_bytes': model_info['size_bytes'],
+            'size_ratio': model_info['size_bytes'] / original_size if original_size else None,
+            'latency_ms': {
+                'original': model_conversion.measure_latency(run_original, inputs[:1]),
+                'variant': model_conversion.measure_latency(run_variant, inputs[:1])
+            },
+            'max_abs_diff': comparison.get('max_abs_diff'),
+            'mean_abs_diff': comparison.get('mean_abs_diff'),
+            'samples': samples
+        }
+
+    @staticmethod
+    def warm_up(model_info, warmup):
+        """Run synthetic inputs through a TensorFlow or scikit-learn model; returns mean ms per run"""
+        if not isinstance(warmup, dict):
+            warmup = {'iterations': int(warmup)}
+        iterations = max(1, int(warmup.get('iterations', 1)))
+        batch_size = max(1, int(warmup.get('batch_size', 1)))
+
+        model = model_info['model']
+        if model_info['type'] == 'tensorflow':
+            dims = [dim or 1 for dim in model_info['input_shape'][1:]]
+            batch = np.zeros((batch_size, *dims), dtype=np.float32)
+            run = lambda: model.predict(batch, verbose=0)
+        else:
+            n_features = getattr(model, 'n_features_in_', None)
+            if not n_features:
+                raise ValueError(f"Cannot warm up {model_info['model_class']}: input width unknown")
+            batch = np.zeros((batch_size, n_features))
+            run = model.predict_proba if hasattr(model, 'predict_proba') else model.predict
+            run = lambda run=run: run(batch)
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            run()
+        return (time.perf_counter() - started) * 1000.0 / iterations
+
     def load_tensorflow_model(self, model_path):
         """Load TensorFlow model"""
         if not tf:
@@ -84,18 +658,31 @@ class ModelManager:
         if not joblib:
             raise ImportError("joblib is not installed")
         
-        model = joblib.load(model_path)
+        # Memory-mapped arrays live in the page cache, shared by every worker process
+        mmap_mode = 'r' if os.getenv('ML_MMAP_WEIGHTS', 'true').lower() == 'true' else None
+        model = joblib.load(model_path, mmap_mode=mmap_mode)
         return {
             'type': 'sklearn',
             'model': model,
-            'model_class': type(model).__name__
+            'model_class': type(model).__name__,
+            'mmap_inode': os.stat(model_path).st_ino if mmap_mode else None
         }
     
-    def load_model(self, model_id, model_path):
-        """Load model based on file extension"""
+    def load_model(self, model_id, model_path, batching=None, pinned=False,
+                   session_options=None, warmup=None, cache=None, precision=None, serving=None,
+                   retire_previous=True):
+        """Load model based on file extension
+
+        retire_previous=False drops the replaced version instead of keeping
+        it for rollback (after_fork: the parent's copy is unusable here).
+        """
+        started = time.perf_counter()
         try:
+            if (session_options or precision) and not model_path.endswith('.onnx'):
+                raise ValueError("session_options and precision apply only to ONNX models")
+
             if model_path.endswith('.onnx'):
-                model = self.load_onnx_model(model_path)
+                model = self.load_onnx_model(model_path, session_options, warmup, precision)
             elif model_path.endswith(('.h5', '.pb')):
                 model = self.load_tensorflow_model(model_path)
             elif model_path.endswith(('.pkl', '.joblib')):
@@ -103,23 +690,406 @@ class ModelManager:
             else:
                 raise ValueError(f"Unsupported model format: {model_path}")
             
+            if warmup and model['type'] != 'onnx':
+                model['warmup_ms'] = self.warm_up(model, warmup)
+
             model['loaded_at'] = datetime.now().isoformat()
             model['model_path'] = model_path
-            self.models[model_id] = model
+            model['fingerprint'] = file_fingerprint(model_path)
+            model['size_bytes'] = path_size(model.get('variant_path') or model_path)
+            model['pinned'] = bool(pinned)
+            model['last_used'] = time.time()
+            model['batcher'] = self._make_batcher(model_id, model, batching)
+            model['version'] = next(self._versions)
+            model['cache'] = PredictionCache(**cache) if cache else None
+            model['serving'] = serving or {}
+
+            spec = {
+                'model_path': model_path,
+                'batching': batching,
+                'pinned': bool(pinned),
+                'session_options': session_options,
+                'warmup': warmup,
+                'cache': cache,
+                'precision': precision,
+                'serving': serving
+            }
+            # The new version is fully built; swap it in atomically
+            with self._lock:
+                previous = self.models.pop(model_id, None)
+                previous_spec = self.model_specs.get(model_id)
+                self.models[model_id] = model
+                self.model_specs[model_id] = spec
+                if previous and retire_previous:
+                    self._retire(model_id, previous, previous_spec)
+                evicted = self._evict_over_budget(keep=model_id)
+                self._publish_registry_metrics()
+
+            for evicted_model in evicted:
+                self._release(evicted_model)
             
+            metrics.MODEL_LOAD_SECONDS.labels(model_id, model['type']).observe(time.perf_counter() - started)
             logger.info(f"Model {model_id} loaded successfully: {model['type']}")
             return model
             
         except Exception as e:
             logger.error(f"Error loading model {model_id}: {e}")
             raise
+
+    def _publish_registry_metrics(self, removed=()):
+        """Refresh the resident memory gauges; caller holds the lock"""
+        for model_id in removed:
+            if model_id not in self.models:
+                metrics.MODEL_RESIDENT_BYTES.labels(model_id).set(0)
+                metrics.BATCH_QUEUE_DEPTH.labels(model_id).set(0)
+        for model_id, model_info in self.models.items():
+            metrics.MODEL_RESIDENT_BYTES.labels(model_id).set(model_info['size_bytes'])
+        metrics.REGISTRY_RESIDENT_BYTES.set(self.resident_bytes)
+        metrics.REGISTRY_MODELS.set(len(self.models))
+
+    def _retire(self, model_id, model_info, spec):
+        """Keep a replaced version for rollback; caller holds the lock"""
+        self._release(model_info)
+        if self.rollback_grace_seconds <= 0:
+            return
+        self.retired.setdefault(model_id, []).append({
+            'model': model_info,
+            'spec': spec,
+            'retired_at': time.time()
+        })
+        self._prune_retired()
+
+    def _prune_retired(self):
+        """Drop retired versions whose grace period is over; caller holds the lock"""
+        cutoff = time.time() - self.rollback_grace_seconds
+        for model_id in list(self.retired):
+            versions = [entry for entry in self.retired[model_id] if entry['retired_at'] > cutoff]
+            if versions:
+                self.retired[model_id] = versions
+            else:
+                del self.retired[model_id]
+
+    def retired_versions(self, model_id):
+        with self._lock:
+            self._prune_retired()
+            return [
+                {
+                    'fingerprint': entry['model']['fingerprint'],
+                    'model_path': entry['model']['model_path'],
+                    'loaded_at': entry['model']['loaded_at'],
+                    'retired_at': datetime.fromtimestamp(entry['retired_at']).isoformat(),
+                    'expires_in_seconds': entry['retired_at'] + self.rollback_grace_seconds - time.time()
+                }
+                for entry in reversed(self.retired.get(model_id, []))
+            ]
+
+    @staticmethod
+    def _weights_intact(model_info):
+        """False when memory-mapped weights were overwritten in place by a newer file"""
+        inode = model_info.get('mmap_inode')
+        if inode is None:
+            return True
+        try:
+            stat = os.stat(model_info['model_path'])
+        except FileNotFoundError:
+            return True
+        return stat.st_ino != inode or file_fingerprint(model_info['model_path']) == model_info['fingerprint']
+
+    def rollback(self, model_id, fingerprint=None):
+        """Swap a retired version back in; the newest one unless a fingerprint is given
+
+        The current version is retired in turn, so a rollback can itself
+        be rolled back within the grace period.
+        """
+        with self._lock:
+            self._prune_retired()
+            versions = self.retired.get(model_id, [])
+            candidates = [
+                entry for entry in versions
+                if fingerprint is None or entry['model']['fingerprint'] == fingerprint
+            ]
+            if not candidates:
+                raise ModelNotFound(f"No retired version of model {model_id} to roll back to")
+            entry = candidates[-1]
+            if not self._weights_intact(entry['model']):
+                raise ValueError(
+                    f"{entry['model']['model_path']} was overwritten in place, so the memory-mapped "
+                    f"weights of the retired version changed too; replace model files atomically "
+                    f"(write, then rename) to keep rollback available"
+                )
+            versions.remove(entry)
+            if not versions:
+                self.retired.pop(model_id, None)
+
+            model = entry['model']
+            spec = entry['spec']
+            model['batcher'] = self._make_batcher(model_id, model, spec['batching'])
+            model['cache'] = PredictionCache(**spec['cache']) if spec['cache'] else None
+            model['version'] = next(self._versions)
+            model['last_used'] = time.time()
+
+            previous = self.models.pop(model_id, None)
+            previous_spec = self.model_specs.get(model_id)
+            self.models[model_id] = model
+            self.model_specs[model_id] = spec
+            if previous:
+                self._retire(model_id, previous, previous_spec)
+            self._publish_registry_metrics()
+
+        logger.info(f"Model {model_id} rolled back to {model['fingerprint']}")
+        return model
+
+    def restore_retired(self, model_id, spec, fingerprint):
+        """Roll back to a retired version matching spec and fingerprint, if this process still has one"""
+        with self._lock:
+            for entry in self.retired.get(model_id, []):
+                if (entry['spec'] == spec and entry['model']['fingerprint'] == fingerprint
+                        and self._weights_intact(entry['model'])):
+                    break
+            else:
+                return None
+        return self.rollback(model_id, fingerprint)
+
+    def submit(self, function, *args, **kwargs):
+        """Run a load on the background executor and return its future"""
+        return self._load_executor.submit(function, *args, **kwargs)
+
+    def load_model_serialized(self, model_id, model_path, **options):
+        """load_model, one load per model id at a time"""
+        with self._lock:
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+        with load_lock:
+            return self.load_model(model_id, model_path, **options)
+
+    @staticmethod
+    def _release(model_info):
+        """Stop background work and drop cached results of a model leaving the registry"""
+        if model_info.get('batcher'):
+            model_info['batcher'].stop()
+        if model_info.get('cache'):
+            model_info['cache'].clear()
+
+    def _make_batcher(self, model_id, model_info, batching):
+        if not batching:
+            return None
+        return MicroBatcher(
+            model_id,
+            lambda batch: self._run_model(model_id, model_info, batch),
+            **batching
+        )
+
+    def after_fork(self):
+        """Rebuild per-process state in a worker forked from a preloaded parent
+
+        Threads and native thread pools do not survive fork, so locks and
+        batching workers are recreated, and ONNX Runtime / TensorFlow
+        sessions are rebuilt. scikit-learn models keep the parent's
+        copy-on-write (or memory-mapped) weights.
+        """
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self._load_executor = ThreadPoolExecutor(max_workers=self.load_workers, thread_name_prefix='model-load')
+        self._ensemble_executor = ThreadPoolExecutor(max_workers=self.ensemble_workers, thread_name_prefix='ensemble')
+        # Retired sessions are unusable after fork, and there is nothing to roll back to yet
+        self.retired = {}
+        for model_id, model_info in list(self.models.items()):
+            spec = self.model_specs[model_id]
+            if model_info['type'] in ('onnx', 'tensorflow'):
+                # The inherited version's batcher threads do not exist here, so it is not released either
+                self.load_model(model_id, **spec, retire_previous=False)
+            else:
+                model_info['batcher'] = self._make_batcher(model_id, model_info, spec['batching'])
+                model_info['cache'] = PredictionCache(**spec['cache']) if spec['cache'] else None
+
+    def unload_model(self, model_id):
+        """Remove model from memory and stop its batching queue"""
+        with self._lock:
+            model_info = self.models.pop(model_id, None)
+            self.model_specs.pop(model_id, None)
+            self.retired.pop(model_id, None)
+            self._publish_registry_metrics(removed=[model_id])
+        if model_info is None:
+            return False
+        self._release(model_info)
+        return True
+
+    def pin_model(self, model_id, pinned=True):
+        """Exempt a loaded model from (or return it to) LRU eviction"""
+        with self._lock:
+            if model_id not in self.models:
+                raise ModelNotFound(f"Model {model_id} not loaded")
+            self.models[model_id]['pinned'] = pinned
+            self.model_specs[model_id]['pinned'] = pinned
+            evicted = [] if pinned else self._evict_over_budget(keep=None)
+            self._publish_registry_metrics()
+        for evicted_model in evicted:
+            self._release(evicted_model)
+
+    def get_model(self, model_id):
+        """Return a loaded model, loading it from storage on a miss"""
+        with self._lock:
+            if self.retired:
+                self._prune_retired()
+            model_info = self.models.get(model_id)
+            if model_info is not None:
+                self.models.move_to_end(model_id)
+                model_info['last_used'] = time.time()
+                self.registry_stats['hits'] += 1
+                return model_info
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        # Serialize loads of the same model without blocking other models
+        with load_lock:
+            with self._lock:
+                model_info = self.models.get(model_id)
+                if model_info is not None:
+                    self.models.move_to_end(model_id)
+                    self.registry_stats['hits'] += 1
+                    return model_info
+                self.registry_stats['misses'] += 1
+                spec = self.model_specs.get(model_id)
+
+            if spec is None:
+                model_path = self._find_model_file(model_id)
+                if model_path is None:
+                    raise ModelNotFound(f"Model {model_id} not loaded")
+                spec = {'model_path': model_path}
+
+            logger.info(f"Lazily loading model {model_id} from {spec['model_path']}")
+            return self.load_model(model_id, **spec)
+
+    def storage_path(self, relative_path):
+        """Resolve a path under the model storage directory, refusing paths that escape it"""
+        root = os.path.realpath(self.model_storage_path)
+        full_path = os.path.realpath(os.path.join(root, relative_path))
+        if not full_path.startswith(root + os.sep):
+            raise ValueError(f"Path is outside model storage: {relative_path}")
+        return full_path
+
+    def _find_model_file(self, model_id):
+        """Look for <model_id>.<ext> under the model storage path"""
+        for extension in MODEL_FILE_EXTENSIONS:
+            candidate = os.path.join(self.model_storage_path, f"{model_id}{extension}")
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def _evict_over_budget(self, keep):
+        """Drop least recently used unpinned models until the budget fits; caller holds the lock"""
+        if not self.memory_budget_bytes:
+            return []
+
+        # Versions kept only for rollback go first, oldest first
+        retired = sorted(
+            ((entry['retired_at'], model_id, entry) for model_id, versions in self.retired.items() for entry in versions),
+            key=lambda item: item[0]
+        )
+        for _, model_id, entry in retired:
+            if self.resident_bytes <= self.memory_budget_bytes:
+                break
+            self.retired[model_id].remove(entry)
+            if not self.retired[model_id]:
+                del self.retired[model_id]
+
+        evicted = []
+        for model_id in list(self.models):
+            if self.resident_bytes <= self.memory_budget_bytes:
+                break
+            model_info = self.models[model_id]
+            if model_id == keep or model_info['pinned']:
+                continue
+            del self.models[model_id]
+            self.registry_stats['evictions'] += 1
+            evicted.append(model_info)
+            self._publish_registry_metrics(removed=[model_id])
+            logger.info(f"Evicted model {model_id} ({model_info['size_bytes']} bytes) to stay within memory budget")
+
+        if self.resident_bytes > self.memory_budget_bytes:
+            logger.warning(
+                f"Resident models use {self.resident_bytes} bytes, over the "
+                f"{self.memory_budget_bytes} byte budget; remaining models are pinned or in use"
+            )
+        return evicted
+    
+    @staticmethod
+    def input_dtype(model_info):
+        """NumPy dtype declared by the model's first input, if the format declares one"""
+        if model_info['type'] != 'onnx':
+            return None
+        dtype = ONNX_TENSOR_DTYPES.get(model_info['input_types'][0])
+        return np.dtype(dtype) if dtype is not None else None
     
-    def predict(self, model_id, input_data):
+    def predict(self, model_id, input_data, model_info=None, use_cache=True):
         """Make prediction using loaded model"""
-        if model_id not in self.models:
-            raise ValueError(f"Model {model_id} not loaded")
-        
-        model_info = self.models[model_id]
+        return self.predict_with_cache_status(model_id, input_data, model_info, use_cache)[0]
+
+    def predict_with_cache_status(self, model_id, input_data, model_info=None, use_cache=True):
+        """Make prediction; also returns whether it was served from the result cache"""
+        if model_info is None:
+            model_info = self.get_model(model_id)
+
+        cache = model_info.get('cache') if use_cache else None
+        if cache is not None:
+            key = PredictionCache.make_key(model_info['version'], input_data)
+            cached = cache.get(key)
+            if cached is not None:
+                metrics.CACHE_HITS.labels(model_id).inc()
+                return cached, True
+
+        if input_data.ndim:
+            metrics.PREDICTION_ROWS.labels(model_id).observe(len(input_data))
+        started = time.perf_counter()
+        batcher = model_info.get('batcher')
+        # An evicted model can still finish requests that already hold it
+        if batcher and not batcher.stopped:
+            result = batcher.submit(input_data)
+        else:
+            result = self._run_model(model_id, model_info, input_data)
+        metrics.PREDICTION_STAGE_SECONDS.labels(model_id, 'inference').observe(time.perf_counter() - started)
+
+        if cache is not None:
+            cache.put(key, result)
+        return result, False
+
+    def ensemble_member(self, model_id, model_info, input_data):
+        """One model's share of an ensemble: prediction, cache status and wall time"""
+        started = time.perf_counter()
+        prediction, cached = self.predict_with_cache_status(model_id, input_data, model_info)
+        return {'prediction': prediction, 'cached': cached, 'ms': (time.perf_counter() - started) * 1000}
+
+    def predict_ensemble(self, model_ids, input_data):
+        """Run several models on one decoded input concurrently
+
+        The input is cast at most once per distinct input dtype the
+        models declare. Returns {model_id: result} in model order, where
+        a failed model's result is {'error': exception}.
+        """
+        casts = {}
+        casts_lock = threading.Lock()
+
+        def run(model_id):
+            model_info = self.get_model(model_id)
+            dtype = self.input_dtype(model_info)
+            if dtype is not None and dtype != input_data.dtype:
+                with casts_lock:
+                    if dtype not in casts:
+                        casts[dtype] = input_data.astype(dtype)
+                member_input = casts[dtype]
+            else:
+                member_input = input_data
+            return self.ensemble_member(model_id, model_info, member_input)
+
+        futures = [(model_id, self._ensemble_executor.submit(run, model_id)) for model_id in model_ids]
+        results = {}
+        for model_id, future in futures:
+            try:
+                results[model_id] = future.result()
+            except Exception as e:
+                results[model_id] = {'error': e}
+        return results
+
+    def _run_model(self, model_id, model_info, input_data):
+        """Run a single inference call on the underlying model"""
         model_type = model_info['type']
         
         try:
@@ -152,7 +1122,481 @@ class ModelManager:
 # Initialize model manager
 model_manager = ModelManager()
 
+
+class RegistrySync:
+    """Keeps the loaded model set identical across worker processes
+
+    Every load or unload request handled by one worker is written to a
+    shared manifest file with a version number. Before each request a
+    worker compares the manifest with what it has applied and loads or
+    unloads models to match, so all workers converge on the same
+    ModelManager state. A model the worker already serves is replaced
+    in the background, and a rollback to a version the worker still
+    holds is applied instantly.
+    """
+
+    def __init__(self, manager, manifest_path):
+        self.manager = manager
+        self.manifest_path = manifest_path
+        self.lock_path = f"{manifest_path}.lock"
+        self.applied = {}
+        self._signature = None
+
+    def _read(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'generation': 0, 'models': {}}
+
+    def _write(self, manifest):
+        directory = os.path.dirname(self.manifest_path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.registry-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _update(self, mutate):
+        with open(self.lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            manifest = self._read()
+            manifest['generation'] += 1
+            mutate(manifest)
+            self._write(manifest)
+            return manifest['generation']
+
+    def reset(self):
+        """Replace the manifest with the models currently loaded in this process"""
+        def mutate(manifest):
+            manifest['models'] = {
+                model_id: self._entry(model_id, spec, manifest['generation'])
+                for model_id, spec in self.manager.model_specs.items()
+            }
+        generation = self._update(mutate)
+        self.applied = {model_id: generation for model_id in self.manager.model_specs}
+
+    def _entry(self, model_id, spec, generation):
+        model_info = self.manager.models.get(model_id)
+        fingerprint = model_info['fingerprint'] if model_info else None
+        return {**spec, 'fingerprint': fingerprint, 'version': generation}
+
+    def publish_load(self, model_id):
+        spec = self.manager.model_specs[model_id]
+
+        def mutate(manifest):
+            manifest['models'][model_id] = self._entry(model_id, spec, manifest['generation'])
+        self.applied[model_id] = self._update(mutate)
+
+    def publish_unload(self, model_id):
+        self._update(lambda manifest: manifest['models'].pop(model_id, None))
+        self.applied.pop(model_id, None)
+
+    def _only_pin_changed(self, model_id, spec, fingerprint):
+        current = self.manager.model_specs.get(model_id)
+        model_info = self.manager.models.get(model_id)
+        if current is None or model_info is None or model_info['fingerprint'] != fingerprint:
+            return False
+        return {**current, 'pinned': spec['pinned']} == spec
+
+    def _load_in_background(self, model_id, spec):
+        try:
+            self.manager.load_model_serialized(model_id, **spec)
+        except Exception as e:
+            logger.error(f"Registry sync could not load model {model_id}: {e}")
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def changed(self):
+        """Whether the manifest moved since the last sync, without reading it"""
+        signature = self._stat_signature()
+        return signature is not None and signature != self._signature
+
+    def sync(self):
+        """Apply manifest changes published by other workers"""
+        signature = self._stat_signature()
+        if signature is None or signature == self._signature:
+            return
+
+        manifest = self._read()
+        for model_id, entry in manifest['models'].items():
+            if self.applied.get(model_id) == entry['version']:
+                continue
+            spec = {key: value for key, value in entry.items() if key not in ('version', 'fingerprint')}
+            fingerprint = entry.get('fingerprint')
+            try:
+                if self._only_pin_changed(model_id, spec, fingerprint):
+                    self.manager.pin_model(model_id, spec['pinned'])
+                elif fingerprint and self.manager.restore_retired(model_id, spec, fingerprint):
+                    pass
+                elif model_id in self.manager.models:
+                    # Keep serving the current version while the new one loads
+                    self.manager.submit(self._load_in_background, model_id, spec)
+                else:
+                    self.manager.load_model_serialized(model_id, **spec)
+            except Exception as e:
+                logger.error(f"Registry sync could not load model {model_id}: {e}")
+            self.applied[model_id] = entry['version']
+
+        for model_id in list(self.applied):
+            if model_id not in manifest['models']:
+                self.manager.unload_model(model_id)
+                del self.applied[model_id]
+
+        self._signature = signature
+
+
+class LoadJobStore:
+    """Status records of background model loads
+
+    Records are small JSON files, so a job started by one worker can be
+    polled through any other. Finished jobs are removed after
+    retention_seconds.
+    """
+
+    def __init__(self, directory, submit, retention_seconds=3600):
+        self.directory = directory
+        self.submit = submit
+        self.retention_seconds = retention_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id):
+        if not all(char in '0123456789abcdef' for char in job_id) or len(job_id) != 32:
+            raise ValueError(f"Invalid job id: {job_id}")
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _write(self, job):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.job-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._path(job['job_id']))
+
+    def get(self, job_id):
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            try:
+                if entry.endswith('.json') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def start(self, model_id, load):
+        """Queue load() on the background executor; returns the initial job record"""
+        self._prune()
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'model_id': model_id,
+            'status': 'queued',
+            'submitted_at': datetime.now().isoformat()
+        }
+        job['status_url'] = f"/load-jobs/{job['job_id']}"
+        self._write(job)
+
+        def run():
+            record = dict(job, status='running', started_at=datetime.now().isoformat())
+            self._write(record)
+            try:
+                record['result'] = load()
+                record['status'] = 'succeeded'
+            except Exception as e:
+                logger.error(f"Background load of model {model_id} failed: {e}")
+                record['status'] = 'failed'
+                record['error'] = str(e)
+            record['finished_at'] = datetime.now().isoformat()
+            self._write(record)
+
+        self.submit(run)
+        return job
+
+
+def preload_models(manifest_name):
+    """Load the models listed in a JSON manifest under MODEL_STORAGE_PATH
+
+    The manifest maps model ids to load options, for example
+    {"eurusd": {"model_path": "eurusd.onnx", "pinned": true}}.
+    """
+    manifest_path = os.path.join(model_manager.model_storage_path, manifest_name)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    for model_id, options in manifest.items():
+        options = dict(options)
+        full_path = os.path.join(model_manager.model_storage_path, options.pop('model_path'))
+        try:
+            model_manager.load_model(model_id, full_path, **options)
+        except Exception as e:
+            logger.error(f"Preloading model {model_id} failed: {e}")
+
+
+# Multi-process serving: load the model set once before workers fork
+registry_sync = None
+if int(os.getenv('ML_API_WORKERS', '1')) > 1:
+    registry_sync = RegistrySync(
+        model_manager,
+        os.getenv('ML_REGISTRY_MANIFEST', os.path.join(tempfile.gettempdir(), 'ml-runtime-registry.json'))
+    )
+
+if os.getenv('ML_PRELOAD_MODELS'):
+    preload_models(os.getenv('ML_PRELOAD_MODELS'))
+
+if registry_sync:
+    registry_sync.reset()
+
+
+# Background load jobs, pollable from any worker
+load_jobs = LoadJobStore(
+    os.getenv('ML_LOAD_JOB_PATH', os.path.join(tempfile.gettempdir(), 'ml-load-jobs')),
+    model_manager.submit
+)
+
+# Incremental /analyze sessions, stored on disk so every worker sees them
+analysis_sessions = stats_engine.AnalysisSessionStore(
+    os.getenv('ANALYSIS_SESSION_PATH', os.path.join(tempfile.gettempdir(), 'ml-analysis-sessions'))
+)
+
+# Feature sets and per-symbol indicator state, shared by all workers through disk
+feature_store = feature_engine.FeatureStore(
+    os.getenv('FEATURE_STATE_PATH', os.path.join(tempfile.gettempdir(), 'ml-feature-state'))
+)
+
+
+@app.before_request
+def sync_model_registry():
+    g.request_started = time.perf_counter()
+    if registry_sync:
+        registry_sync.sync()
+
+@app.after_request
+def count_request(response):
+    # The URL rule keeps one series per route rather than one per path
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    if 'request_started' in g:
+        metrics.REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.request_started)
+    return response
+
+def decode_tensor(req, dtype=None):
+    """Decode the request body into an ndarray, coerced to dtype when given
+
+    Binary bodies are either a .npy file (application/x-npy) or raw
+    little-endian bytes (application/octet-stream) described by the
+    X-Tensor-Shape and X-Tensor-Dtype headers. Anything else is read as
+    JSON with the tensor under 'input'.
+    """
+    if req.mimetype in (NPY_MIMETYPE, RAW_TENSOR_MIMETYPE):
+        return decode_tensor_bytes(req.mimetype, req.headers, req.get_data(), dtype)
+    return tensor_from_json(req.get_json(silent=True), dtype)
+
+
+def decode_tensor_bytes(mimetype, headers, body, dtype=None):
+    """Decode a binary tensor body; shared by the Flask and asyncio front-ends"""
+    if mimetype == NPY_MIMETYPE:
+        array = np.load(io.BytesIO(body), allow_pickle=False)
+    else:
+        shape_header = headers.get('X-Tensor-Shape')
+        dtype_header = headers.get('X-Tensor-Dtype', 'float32')
+        if not shape_header:
+            raise ValueError('X-Tensor-Shape header is required for raw tensor input')
+        shape = tuple(int(dim) for dim in shape_header.split(','))
+        wire_dtype = np.dtype(dtype_header).newbyteorder('<')
+        if wire_dtype.kind not in 'biuf':
+            raise ValueError(f'Unsupported tensor dtype: {dtype_header}')
+        array = np.frombuffer(body, dtype=wire_dtype).reshape(shape)
+
+    if dtype is not None and array.dtype != dtype:
+        array = array.astype(dtype)
+    return array
+
+
+def tensor_from_json(data, dtype=None):
+    if not data or 'input' not in data:
+        raise ValueError('input data is required')
+    # Build straight into the target dtype so no float64 copy is made first
+    return np.asarray(data['input'], dtype=dtype)
+
+
+def encode_tensor_response(model_id, prediction, mimetype, extra=None):
+    """Serialize a prediction in the negotiated wire format"""
+    if mimetype in (NPY_MIMETYPE, RAW_TENSOR_MIMETYPE):
+        body, headers = encode_tensor_bytes(model_id, prediction, mimetype, extra)
+        return Response(body, mimetype=mimetype, headers=headers)
+    return jsonify(prediction_payload(model_id, prediction, extra))
+
+
+def encode_tensor_bytes(model_id, prediction, mimetype, extra=None):
+    """Binary response body and headers describing its shape and dtype"""
+    array = np.asarray(prediction)
+    array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+    headers = {
+        'X-Model-Id': model_id,
+        'X-Tensor-Shape': ','.join(str(dim) for dim in array.shape),
+        'X-Tensor-Dtype': array.dtype.name
+    }
+    for key, value in (extra or {}).items():
+        headers[f"X-{key.replace('_', '-').title()}"] = str(value)
+
+    if mimetype == NPY_MIMETYPE:
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        return buffer.getvalue(), headers
+    return array.tobytes(), headers
+
+
+def prediction_payload(model_id, prediction, extra=None):
+    # Convert numpy arrays to lists for JSON serialization
+    if isinstance(prediction, np.ndarray):
+        prediction = prediction.tolist()
+
+    return {
+        'model_id': model_id,
+        'prediction': prediction,
+        'timestamp': datetime.now().isoformat(),
+        **(extra or {})
+    }
+
+
+class FeaturesNotReady(ValueError):
+    """The symbol has not seen enough bars to fill every feature yet"""
+
+    def __init__(self, message, columns):
+        super().__init__(message)
+        self.columns = columns
+
+
+def assemble_features(spec, dtype=None):
+    """Build a (1, n_features) model input from a symbol's current feature state
+
+    spec names the 'symbol' and 'feature_set'; the vector is copied
+    straight from the stored state, so no per-request lists are built.
+    """
+    if not isinstance(spec, dict) or 'symbol' not in spec or 'feature_set' not in spec:
+        raise ValueError('features needs symbol and feature_set')
+
+    state = feature_store.load_state(spec['feature_set'], spec['symbol'])
+    missing = np.isnan(state.latest)
+    if missing.any():
+        columns = [column for column, flag in zip(state.feature_set.columns, missing) if flag]
+        raise FeaturesNotReady(
+            f"{spec['symbol']} has {state.count} bars, not enough for every feature in {spec['feature_set']}",
+            columns
+        )
+    return state.latest.astype(dtype or np.float64).reshape(1, -1)
+
+
+def feature_values(state):
+    return {
+        column: None if np.isnan(value) else float(value)
+        for column, value in zip(state.feature_set.columns, state.latest)
+    }
+
+
+def negotiate_tensor_mimetype(req):
+    """Pick the response format from Accept, preferring the request's own format"""
+    return pick_tensor_mimetype(req.mimetype, req.accept_mimetypes)
+
+
+def pick_tensor_mimetype(request_mimetype, accept):
+    """accept is a werkzeug MIMEAccept, as parsed from the Accept header"""
+    offered = ['application/json', NPY_MIMETYPE, RAW_TENSOR_MIMETYPE]
+    if request_mimetype in offered:
+        offered.remove(request_mimetype)
+        offered.insert(0, request_mimetype)
+    if not accept:
+        return offered[0]
+    return accept.best_match(offered) or 'application/json'
+
+def parse_ensemble_options(options):
+    """Validate ensemble options from a JSON body or the query string
+
+    Returns (model_ids, combine method, normalized weights, allow_partial).
+    """
+    model_ids = options.get('models')
+    if isinstance(model_ids, str):
+        model_ids = [model_id for model_id in model_ids.split(',') if model_id]
+    if not isinstance(model_ids, list) or not model_ids:
+        raise ValueError('models must list at least one model id')
+    if len(set(model_ids)) != len(model_ids):
+        raise ValueError('models must not repeat a model id')
+
+    method = options.get('combine', 'mean')
+    if method not in ensemble.COMBINE_METHODS:
+        raise ValueError(f'combine must be one of: {", ".join(ensemble.COMBINE_METHODS)}')
+
+    # Query strings carry weights as id:weight,id:weight
+    weights = options.get('weights')
+    if isinstance(weights, str):
+        weights = dict(pair.split(':', 1) for pair in weights.split(',') if pair)
+    if weights is not None and method not in ('weighted', 'vote'):
+        raise ValueError('weights apply only to the weighted and vote methods')
+
+    allow_partial = str(options.get('allow_partial', False)).lower() == 'true'
+    return model_ids, method, ensemble.normalize_weights(model_ids, weights), allow_partial
+
+
+def ensemble_payload(model_ids, results, method, weights, allow_partial):
+    """Combine member results into (response dict, status code)
+
+    With allow_partial, failed members are reported under 'errors' and
+    the rest are combined with their weights renormalized.
+    """
+    errors = {model_id: result['error'] for model_id, result in results.items() if 'error' in result}
+    missing = [model_id for model_id, error in errors.items() if isinstance(error, ModelNotFound)]
+    if missing:
+        return {'error': f"Models not loaded: {', '.join(missing)}"}, 404
+    if errors and (not allow_partial or len(errors) == len(model_ids)):
+        status = 503 if all(isinstance(error, BatchQueueFull) for error in errors.values()) else 500
+        return {
+            'error': 'Ensemble member failed',
+            'errors': {model_id: str(error) for model_id, error in errors.items()}
+        }, status
+
+    members = [model_id for model_id in model_ids if model_id not in errors]
+    member_weights = weights[[model_ids.index(model_id) for model_id in members]]
+    if member_weights.sum() <= 0:
+        return {'error': 'The models that succeeded all have zero weight'}, 500
+    member_weights = member_weights / member_weights.sum()
+
+    outputs = [results[model_id]['prediction'] for model_id in members]
+    try:
+        combined = ensemble.combine(outputs, method, member_weights)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    payload = {
+        'models': members,
+        'combine': method,
+        **{key: np.asarray(value).tolist() for key, value in combined.items()},
+        'outputs': {model_id: np.asarray(output).tolist() for model_id, output in zip(members, outputs)},
+        'cached': {model_id: results[model_id]['cached'] for model_id in members},
+        'timings_ms': {model_id: results[model_id]['ms'] for model_id in members},
+        'timestamp': datetime.now().isoformat()
+    }
+    if method in ('weighted', 'vote'):
+        payload['weights'] = dict(zip(members, member_weights.tolist()))
+    if errors:
+        payload['errors'] = {model_id: str(error) for model_id, error in errors.items()}
+    return payload, 200
+
 # API Routes
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus exposition of request, latency, registry and queue metrics"""
+    if not metrics.available():
+        return jsonify({'error': 'prometheus-client is not installed'}), 501
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE_LATEST)
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
@@ -160,6 +1604,7 @@ def health_check():
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
         'loaded_models': len(model_manager.models),
+        'registry': model_manager.registry_info(),
         'available_libraries': {
             'onnxruntime': ort is not None,
             'tensorflow': tf is not None,
@@ -171,11 +1616,14 @@ def health_check():
 def list_models():
     """List all loaded models"""
     models_info = {}
-    for model_id, model_info in model_manager.models.items():
+    for model_id, model_info in model_manager.snapshot():
         models_info[model_id] = {
             'type': model_info['type'],
             'loaded_at': model_info['loaded_at'],
-            'model_path': model_info['model_path']
+            'model_path': model_info['model_path'],
+            'size_bytes': model_info['size_bytes'],
+            'pinned': model_info['pinned'],
+            'last_used': datetime.fromtimestamp(model_info['last_used']).isoformat()
         }
         
         # Add type-specific info
@@ -183,12 +1631,26 @@ def list_models():
             models_info[model_id]['input_names'] = model_info['input_names']
             models_info[model_id]['output_names'] = model_info['output_names']
             models_info[model_id]['input_shapes'] = model_info['input_shapes']
+            models_info[model_id]['session_options'] = model_info['session_options']
+            models_info[model_id]['optimized_from_cache'] = model_info['optimized_from_cache']
+            if model_info['precision']:
+                models_info[model_id]['precision'] = model_info.get('precision_report') or model_info['precision']
         elif model_info['type'] == 'tensorflow':
             models_info[model_id]['input_shape'] = str(model_info['input_shape'])
         elif model_info['type'] == 'sklearn':
             models_info[model_id]['model_class'] = model_info['model_class']
+
+        if model_info.get('batcher'):
+            models_info[model_id]['batching'] = model_info['batcher'].stats()
+        if model_info.get('cache'):
+            models_info[model_id]['cache'] = model_info['cache'].stats()
+        models_info[model_id]['version'] = model_info['version']
+        models_info[model_id]['fingerprint'] = model_info['fingerprint']
+        retired = model_manager.retired_versions(model_id)
+        if retired:
+            models_info[model_id]['retired_versions'] = retired
     
-    return jsonify({'models': models_info})
+    return jsonify({'models': models_info, 'registry': model_manager.registry_info()})
 
 @app.route('/models/<model_id>/load', methods=['POST'])
 def load_model(model_id):
@@ -204,133 +1666,618 @@ def load_model(model_id):
     full_path = os.path.join(model_manager.model_storage_path, model_path)
     if not os.path.exists(full_path):
         return jsonify({'error': f'Model file not found: {model_path}'}), 404
+
+    # Optional micro-batching: {"max_batch_size": 32, "max_wait_ms": 2, "max_queue_size": 1024}
+    batching = data.get('batching')
+    if batching is not None:
+        allowed = {'max_batch_size', 'max_wait_ms', 'max_queue_size'}
+        if not isinstance(batching, dict) or not set(batching) <= allowed:
+            return jsonify({'error': f'batching accepts only: {", ".join(sorted(allowed))}'}), 400
+
+    # Optional result cache: {"max_entries": 1024, "ttl_seconds": 60}
+    cache = data.get('cache')
+    if cache is not None:
+        allowed = {'max_entries', 'ttl_seconds'}
+        if not isinstance(cache, dict) or not set(cache) <= allowed:
+            return jsonify({'error': f'cache accepts only: {", ".join(sorted(allowed))}'}), 400
+
+    # Optional ONNX Runtime tuning: threads, execution mode, graph optimization level
+    session_options = data.get('session_options')
+    if session_options is not None:
+        if not isinstance(session_options, dict) or not set(session_options) <= ONNX_SESSION_SETTINGS:
+            return jsonify({
+                'error': f'session_options accepts only: {", ".join(sorted(ONNX_SESSION_SETTINGS))}'
+            }), 400
+
+    # Optional reduced precision: "int8", "fp16" or {"type": "int8", "per_channel": false,
+    # "evaluate": true, "samples": 64}
+    precision = data.get('precision')
+    evaluate = True
+    samples = 64
+    if isinstance(precision, dict):
+        if not set(precision) <= ONNX_PRECISION_SETTINGS:
+            return jsonify({
+                'error': f'precision accepts only: {", ".join(sorted(ONNX_PRECISION_SETTINGS))}'
+            }), 400
+        evaluate = bool(precision.get('evaluate', True))
+        samples = int(precision.get('samples', 64))
+        precision = {key: precision[key] for key in ('type', 'per_channel') if key in precision}
     
-    try:
-        model_info = model_manager.load_model(model_id, full_path)
-        return jsonify({
+    # Optional asyncio front-end limits: {"workers": 2, "max_pending": 32}
+    serving = data.get('serving')
+    if serving is not None:
+        allowed = {'workers', 'max_pending'}
+        if not isinstance(serving, dict) or not set(serving) <= allowed:
+            return jsonify({'error': f'serving accepts only: {", ".join(sorted(allowed))}'}), 400
+
+    options = {
+        'batching': batching,
+        'pinned': bool(data.get('pinned', False)),
+        'session_options': session_options,
+        'warmup': data.get('warmup'),
+        'cache': cache,
+        'precision': precision,
+        'serving': serving
+    }
+
+    def finish_load():
+        model_info = model_manager.load_model_serialized(model_id, full_path, **options)
+        response = {
             'message': f'Model {model_id} loaded successfully',
             'type': model_info['type']
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        }
+        if model_info['batcher']:
+            response['batching'] = model_info['batcher'].config()
+        if model_info['cache']:
+            response['cache'] = model_info['cache'].config()
+        if model_info['serving']:
+            response['serving'] = model_info['serving']
+        if model_info['type'] == 'onnx':
+            response['optimized_from_cache'] = model_info['optimized_from_cache']
+            if 'warmup_ms' in model_info:
+                response['warmup_ms'] = model_info['warmup_ms']
+            if precision and evaluate:
+                model_info['precision_report'] = model_manager.evaluate_precision(model_info, samples)
+                response['precision'] = model_info['precision_report']
+            elif precision:
+                response['precision'] = precision
+        response['fingerprint'] = model_info['fingerprint']
+        response['version'] = model_info['version']
+        if registry_sync:
+            registry_sync.publish_load(model_id)
+        return response
+
+    # By default the load runs in the background and the current version keeps serving
+    if data.get('wait') is True or str(data.get('wait', '')).lower() == 'true':
+        try:
+            return jsonify(finish_load())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    return jsonify(load_jobs.start(model_id, finish_load)), 202
+
+@app.route('/load-jobs/<job_id>', methods=['GET'])
+def load_job_status(job_id):
+    """Status of a background model load (queued, running, succeeded or failed)"""
+    try:
+        job = load_jobs.get(job_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if job is None:
+        return jsonify({'error': f'Load job {job_id} not found'}), 404
+    return jsonify(job)
+
+@app.route('/models/<model_id>/rollback', methods=['POST'])
+def rollback_model(model_id):
+    """Swap the previous version of a model back in (or the one with the given fingerprint)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        model_info = model_manager.rollback(model_id, data.get('fingerprint'))
+    except ModelNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    if registry_sync:
+        registry_sync.publish_load(model_id)
+    return jsonify({
+        'message': f'Model {model_id} rolled back',
+        'fingerprint': model_info['fingerprint'],
+        'loaded_at': model_info['loaded_at'],
+        'version': model_info['version'],
+        'retired_versions': model_manager.retired_versions(model_id)
+    })
 
 @app.route('/models/<model_id>/predict', methods=['POST'])
 def predict(model_id):
     """Make prediction using loaded model"""
-    if model_id not in model_manager.models:
-        return jsonify({'error': f'Model {model_id} not loaded'}), 404
-    
-    data = request.get_json()
+    try:
+        model_info = model_manager.get_model(model_id)
+    except ModelNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Lazy load error for model {model_id}: {e}")
+        return jsonify({'error': str(e)}), 500
     
-    if not data or 'input' not in data:
-        return jsonify({'error': 'input data is required'}), 400
+    try:
+        started = time.perf_counter()
+        dtype = model_manager.input_dtype(model_info)
+        data = request.get_json(silent=True) if request.mimetype == 'application/json' else None
+        if data and 'features' in data:
+            input_data = assemble_features(data['features'], dtype)
+        else:
+            input_data = decode_tensor(request, dtype)
+        metrics.PREDICTION_STAGE_SECONDS.labels(model_id, 'deserialize').observe(time.perf_counter() - started)
+    except FeaturesNotReady as e:
+        metrics.PREDICTION_ERRORS.labels(model_id, 'features_not_ready').inc()
+        return jsonify({'error': str(e), 'missing': e.columns}), 409
+    except (ValueError, KeyError) as e:
+        metrics.PREDICTION_ERRORS.labels(model_id, 'bad_input').inc()
+        return jsonify({'error': str(e).strip("'")}), 400
     
     try:
-        input_data = np.array(data['input'])
-        
         # Make prediction
-        prediction = model_manager.predict(model_id, input_data)
+        prediction, cached = model_manager.predict_with_cache_status(model_id, input_data, model_info)
         
-        # Convert numpy arrays to lists for JSON serialization
-        if isinstance(prediction, np.ndarray):
-            prediction = prediction.tolist()
-        
-        return jsonify({
-            'model_id': model_id,
-            'prediction': prediction,
-            'timestamp': datetime.now().isoformat()
-        })
+        started = time.perf_counter()
+        response = encode_tensor_response(
+            model_id, prediction, negotiate_tensor_mimetype(request), extra={'cached': cached}
+        )
+        metrics.PREDICTION_STAGE_SECONDS.labels(model_id, 'serialize').observe(time.perf_counter() - started)
+        return response
+
+    except BatchQueueFull as e:
+        return jsonify({'error': str(e)}), 503
         
     except Exception as e:
+        metrics.PREDICTION_ERRORS.labels(model_id, 'inference').inc()
         logger.error(f"Prediction error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/ensembles/predict', methods=['POST'])
+def predict_ensemble():
+    """Run several models on one input concurrently and combine their outputs
+
+    JSON body: {"models": [...], "input": [...] or "features": {...},
+    "combine": "raw" | "mean" | "weighted" | "vote", "weights": {id: w},
+    "allow_partial": false}. Binary tensor bodies take models, combine,
+    weights (id:w,...) and allow_partial from the query string. The
+    input is decoded once and shared by every model.
+    """
+    started = time.perf_counter()
+    try:
+        if request.mimetype in (NPY_MIMETYPE, RAW_TENSOR_MIMETYPE):
+            options = request.args
+            input_data = decode_tensor(request)
+        else:
+            options = request.get_json(silent=True) or {}
+            if 'features' in options:
+                input_data = assemble_features(options['features'])
+            else:
+                input_data = tensor_from_json(options)
+        model_ids, method, weights, allow_partial = parse_ensemble_options(options)
+        metrics.PREDICTION_STAGE_SECONDS.labels('ensemble', 'deserialize').observe(time.perf_counter() - started)
+    except FeaturesNotReady as e:
+        return jsonify({'error': str(e), 'missing': e.columns}), 409
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': str(e).strip("'")}), 400
+
+    results = model_manager.predict_ensemble(model_ids, input_data)
+    payload, status = ensemble_payload(model_ids, results, method, weights, allow_partial)
+    if status == 200:
+        payload['total_ms'] = (time.perf_counter() - started) * 1000
+    return jsonify(payload), status
+
+@app.route('/models/<model_id>/predict/bulk', methods=['POST'])
+def predict_bulk(model_id):
+    """Score a large input in fixed-size chunks with constant memory
+
+    The input is either the request body itself (text/csv,
+    application/x-ndjson or application/x-npy) or, for a JSON body,
+    a file under MODEL_STORAGE_PATH named by input_path. Predictions
+    are streamed back as NDJSON ending with a summary line, or written
+    to output_path (.csv, .ndjson or .npy) with the summary returned.
+    """
+    try:
+        model_info = model_manager.get_model(model_id)
+    except ModelNotFound as e:
+        return jsonify({'error': str(e)}), 404
+
+    options = request.get_json() if request.mimetype == 'application/json' else request.args
+    options = options or {}
+    dtype = model_manager.input_dtype(model_info) or np.float64
+
+    try:
+        chunk_size = int(options.get('chunk_size', 10000))
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+
+        total_rows = None
+        if request.mimetype == 'application/json':
+            if 'input_path' not in options:
+                return jsonify({'error': 'input_path is required for JSON requests'}), 400
+            input_path = model_manager.storage_path(options['input_path'])
+            if not os.path.exists(input_path):
+                return jsonify({'error': f"Input file not found: {options['input_path']}"}), 404
+            if bulk_scoring.format_for_path(input_path) == bulk_scoring.NPY_MIMETYPE:
+                total_rows = bulk_scoring.npy_row_count(input_path)
+            chunks = bulk_scoring.iter_file_chunks(input_path, chunk_size, dtype)
+        elif request.mimetype == bulk_scoring.CSV_MIMETYPE:
+            chunks = bulk_scoring.iter_csv_chunks(request.stream, chunk_size, dtype)
+        elif request.mimetype == bulk_scoring.NDJSON_MIMETYPE:
+            chunks = bulk_scoring.iter_ndjson_chunks(request.stream, chunk_size, dtype)
+        elif request.mimetype == bulk_scoring.NPY_MIMETYPE:
+            chunks = bulk_scoring.iter_npy_stream_chunks(request.stream, chunk_size, dtype)
+        else:
+            return jsonify({'error': f'Unsupported bulk input type: {request.mimetype}'}), 415
+
+        # Bulk chunks are not worth keeping in the per-request result cache
+        run = bulk_scoring.ScoringRun(
+            lambda chunk: model_manager.predict(model_id, chunk, model_info, use_cache=False),
+            chunks
+        )
+
+        output_path = options.get('output_path')
+        if output_path:
+            writer = bulk_scoring.ChunkWriter(model_manager.storage_path(output_path), total_rows)
+            try:
+                for prediction in run:
+                    writer.write(prediction)
+            finally:
+                writer.close()
+            return jsonify({
+                'model_id': model_id,
+                'output_path': output_path,
+                'summary': run.summary()
+            })
+
+        def generate():
+            try:
+                for prediction in run:
+                    yield bulk_scoring.encode_ndjson(prediction)
+                yield json.dumps({'summary': run.summary()}) + '\n'
+            except Exception as e:
+                logger.error(f"Bulk prediction error for model {model_id}: {e}")
+                yield json.dumps({'error': str(e), 'summary': run.summary()}) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype=bulk_scoring.NDJSON_MIMETYPE)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Bulk prediction error for model {model_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/models/<model_id>/unload', methods=['POST'])
 def unload_model(model_id):
     """Unload a model from memory"""
-    if model_id in model_manager.models:
-        del model_manager.models[model_id]
+    if model_manager.unload_model(model_id):
+        if registry_sync:
+            registry_sync.publish_unload(model_id)
         return jsonify({'message': f'Model {model_id} unloaded successfully'})
     else:
         return jsonify({'error': f'Model {model_id} not found'}), 404
 
+@app.route('/models/<model_id>/pin', methods=['POST', 'DELETE'])
+def pin_model(model_id):
+    """Pin a model so it is never evicted (POST) or release the pin (DELETE)"""
+    pinned = request.method == 'POST'
+    try:
+        model_manager.pin_model(model_id, pinned)
+    except ModelNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    if registry_sync:
+        registry_sync.publish_load(model_id)
+    return jsonify({'model_id': model_id, 'pinned': pinned})
+
 @app.route('/convert', methods=['POST'])
 def convert_model():
-    """Convert model between different formats"""
+    """Convert a scikit-learn or Keras model to ONNX and verify it against the original
+
+    Optional fields: target_path, n_features, opset, sample_input,
+    n_samples, rtol, atol, repeats, and load_as (a model id to serve
+    the converted model under; refused when outputs do not match
+    unless force is true).
+    """
     data = request.get_json()
     
     required_fields = ['source_path', 'target_format']
-    if not all(field in data for field in required_fields):
+    if not data or not all(field in data for field in required_fields):
         return jsonify({'error': 'source_path and target_format are required'}), 400
     
     source_path = data['source_path']
     target_format = data['target_format']
+
+    if target_format != 'onnx':
+        return jsonify({'error': f'Unsupported target format: {target_format}'}), 400
+
+    target_path = data.get('target_path') or f"{os.path.splitext(source_path)[0]}.onnx"
+    try:
+        # Unpickling runs code, so both paths must stay inside model storage
+        source_full_path = model_manager.storage_path(source_path)
+        target_full_path = model_manager.storage_path(target_path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not os.path.exists(source_full_path):
+        return jsonify({'error': f'Model file not found: {source_path}'}), 404
+    if target_full_path == source_full_path:
+        return jsonify({'error': 'target_path must differ from source_path'}), 400
     
     try:
-        # Placeholder for model conversion logic
-        # This would implement actual conversion between formats
-        
-        if target_format == 'onnx':
-            # Convert to ONNX
-            target_path = source_path.replace('.h5', '.onnx').replace('.pkl', '.onnx')
-            # Actual conversion logic would go here
-            
-        elif target_format == 'tensorflow':
-            # Convert to TensorFlow
-            target_path = source_path.replace('.onnx', '.h5').replace('.pkl', '.h5')
-            # Actual conversion logic would go here
-            
+        if source_path.endswith(('.pkl', '.joblib')):
+            original = model_manager.load_sklearn_model(source_full_path)
+            n_features = data.get('n_features') or getattr(original['model'], 'n_features_in_', None)
+            model_conversion.sklearn_to_onnx(
+                original['model'], target_full_path, n_features=n_features, opset=data.get('opset')
+            )
+            input_shape = (None, n_features)
+        elif source_path.endswith(('.h5', '.pb')):
+            original = model_manager.load_tensorflow_model(source_full_path)
+            model_conversion.keras_to_onnx(original['model'], target_full_path, opset=data.get('opset'))
+            input_shape = original['input_shape']
         else:
-            return jsonify({'error': f'Unsupported target format: {target_format}'}), 400
-        
-        return jsonify({
+            return jsonify({'error': f'Cannot convert {source_path} to onnx'}), 400
+
+        converted = model_manager.load_onnx_model(target_full_path)
+
+        if 'sample_input' in data:
+            samples = np.asarray(data['sample_input'], dtype=np.float32)
+        else:
+            samples = model_conversion.sample_inputs(input_shape, int(data.get('n_samples', 64)))
+
+        def run_original(batch):
+            return model_manager._run_model(source_path, original, batch)
+
+        def run_converted(batch):
+            return model_manager._run_model(target_path, converted, batch)
+
+        verification = model_conversion.compare_outputs(
+            run_original(samples), run_converted(samples),
+            rtol=float(data.get('rtol', 1e-3)), atol=float(data.get('atol', 1e-4))
+        )
+
+        repeats = int(data.get('repeats', 20))
+        latency = {}
+        for name, run in (('original', run_original), ('onnx', run_converted)):
+            latency[name] = {
+                'single_row_ms': model_conversion.measure_latency(run, samples[:1], repeats),
+                'batch_ms': model_conversion.measure_latency(run, samples, repeats),
+                'batch_size': len(samples)
+            }
+        latency['speedup'] = {
+            key: latency['original'][f'{key}_ms'] / max(latency['onnx'][f'{key}_ms'], 1e-9)
+            for key in ('single_row', 'batch')
+        }
+
+        response = {
             'message': 'Model conversion completed',
             'source_path': source_path,
             'target_path': target_path,
-            'target_format': target_format
-        })
+            'target_format': target_format,
+            'verification': verification,
+            'latency': latency
+        }
+
+        load_as = data.get('load_as')
+        if load_as:
+            if verification['matches'] or data.get('force'):
+                # Keep serving options of the model being replaced
+                spec = model_manager.model_specs.get(load_as) or {}
+                # Serialized with /models/<id>/load and lazy loads of the same id
+                model_manager.load_model_serialized(
+                    load_as, target_full_path,
+                    batching=spec.get('batching'),
+                    pinned=spec.get('pinned', False),
+                    cache=spec.get('cache')
+                )
+                if registry_sync:
+                    registry_sync.publish_load(load_as)
+                response['loaded_as'] = load_as
+            else:
+                response['loaded_as'] = None
+                response['load_skipped'] = 'Converted outputs do not match the original; pass force to load anyway'
         
+        return jsonify(response)
+        
+    except ImportError as e:
+        return jsonify({'error': str(e)}), 501
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Model conversion error: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/analyze', methods=['POST'])
 def analyze_data():
-    """Analyze trading data using statistical methods"""
-    data = request.get_json()
-    
-    if not data or 'data' not in data:
-        return jsonify({'error': 'data is required'}), 400
+    """Analyze trading data using statistical methods
+
+    Data arrives as JSON records ('data'), as a file under
+    MODEL_STORAGE_PATH ('input_path'), or as a CSV, Parquet, Arrow or
+    .npy request body, and is folded into an incremental statistics
+    engine chunk by chunk. With a session_id the engine state is stored,
+    so later calls only send new rows.
+    """
+    if request.mimetype == 'application/json':
+        data = request.get_json(silent=True) or {}
+        if 'data' not in data and 'input_path' not in data:
+            return jsonify({'error': 'data or input_path is required'}), 400
+        options = data
+    else:
+        data = None
+        options = request.args
+
+    session_id = options.get('session_id')
+    if not session_id and str(options.get('keep_session', '')).lower() == 'true':
+        session_id = uuid.uuid4().hex
     
     try:
-        import pandas as pd
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(data['data'])
-        
-        # Basic statistical analysis
-        analysis = {
-            'shape': df.shape,
-            'columns': df.columns.tolist(),
-            'missing_values': df.isnull().sum().to_dict(),
-            'basic_stats': df.describe().to_dict() if df.select_dtypes(include=[np.number]).shape[1] > 0 else {},
-            'data_types': df.dtypes.astype(str).to_dict()
-        }
-        
-        # Calculate correlations for numeric columns
-        numeric_df = df.select_dtypes(include=[np.number])
-        if numeric_df.shape[1] > 1:
-            analysis['correlations'] = numeric_df.corr().to_dict()
+        chunk_size = int(options.get('chunk_size', 50000))
+        reservoir_size = int(options.get('reservoir_size', stats_engine.DEFAULT_RESERVOIR_SIZE))
+        columns = options.get('columns')
+        if isinstance(columns, str):
+            columns = columns.split(',')
+
+        def frames():
+            if data is not None and 'data' in data:
+                yield pd.DataFrame(data['data'])
+            elif data is not None:
+                input_path = model_manager.storage_path(data['input_path'])
+                extension = os.path.splitext(input_path)[1].lower()
+                mimetype = stats_engine.MIMETYPES_BY_EXTENSION.get(extension)
+                if mimetype is None:
+                    raise ValueError(f"Unsupported analysis file format: {data['input_path']}")
+                with open(input_path, 'rb') as source:
+                    yield from stats_engine.iter_frames(source, mimetype, chunk_size, columns)
+            else:
+                yield from stats_engine.iter_frames(request.stream, request.mimetype, chunk_size, columns)
+
+        def run(engine):
+            rows_before = engine.rows
+            for frame in frames():
+                engine.update(frame)
+            return engine.rows - rows_before
+
+        if session_id:
+            with analysis_sessions.lock(session_id):
+                engine = analysis_sessions.load(session_id, reservoir_size)
+                rows_added = run(engine)
+                analysis_sessions.save(session_id, engine)
+        else:
+            engine = stats_engine.IncrementalStats(reservoir_size=reservoir_size)
+            rows_added = run(engine)
         
-        return jsonify({
-            'analysis': analysis,
+        response = {
+            'analysis': engine.analysis(),
+            'rows_added': rows_added,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        if session_id:
+            response['session_id'] = session_id
+        return jsonify(response)
+
+    except (ValueError, FileNotFoundError, ImportError) as e:
+        return jsonify({'error': str(e)}), 400
         
     except Exception as e:
         logger.error(f"Data analysis error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/analyze/<session_id>', methods=['GET', 'DELETE'])
+def analysis_session(session_id):
+    """Return (GET) or drop (DELETE) the statistics of a stored analysis session"""
+    try:
+        if not analysis_sessions.exists(session_id):
+            return jsonify({'error': f'Analysis session {session_id} not found'}), 404
+        if request.method == 'DELETE':
+            analysis_sessions.delete(session_id)
+            return jsonify({'message': f'Analysis session {session_id} deleted'})
+        with analysis_sessions.lock(session_id):
+            engine = analysis_sessions.load(session_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'analysis': engine.analysis(),
+        'session_id': session_id,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/features/sets', methods=['GET'])
+def list_feature_sets():
+    return jsonify({'feature_sets': feature_store.list_sets()})
+
+@app.route('/features/sets/<set_name>', methods=['POST'])
+def define_feature_set(set_name):
+    """Create or replace a feature set; replacing it with new specs drops its symbol states"""
+    data = request.get_json(silent=True) or {}
+    try:
+        feature_set = feature_store.define(set_name, data.get('features'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(feature_set.to_dict())
+
+@app.route('/features/<set_name>/<symbol>/bars', methods=['POST'])
+def push_bars(set_name, symbol):
+    """Fold new bars into a symbol's feature state
+
+    Bars come as JSON ('bars' as records or columns) or as an N x 5
+    .npy body (open, high, low, close, volume). A symbol without state
+    (or with reset=true) is backfilled in one vectorized pass; after that
+    every bar is an O(1) incremental update. With history=true the
+    feature row of every pushed bar is returned as well.
+    """
+    if request.mimetype == NPY_MIMETYPE:
+        options = request.args
+    else:
+        options = request.get_json(silent=True) or {}
+    reset = str(options.get('reset', '')).lower() == 'true' or options.get('reset') is True
+    history = str(options.get('history', '')).lower() == 'true' or options.get('history') is True
+
+    try:
+        if request.mimetype == NPY_MIMETYPE:
+            bars = feature_engine.parse_bars(np.load(io.BytesIO(request.get_data()), allow_pickle=False))
+        else:
+            if 'bars' not in options:
+                return jsonify({'error': 'bars are required'}), 400
+            bars = feature_engine.parse_bars(options['bars'])
+
+        with feature_store.lock(set_name, symbol):
+            if reset:
+                feature_store.reset_state(set_name, symbol)
+            state = feature_store.load_state(set_name, symbol)
+            if state.count == 0:
+                matrix = state.backfill(bars)
+            else:
+                matrix = np.empty((len(bars), len(state.latest))) if history else None
+                for index, bar in enumerate(bars):
+                    row = state.update(bar)
+                    if history:
+                        matrix[index] = row
+            feature_store.save_state(set_name, symbol, state)
+    except KeyError as e:
+        return jsonify({'error': str(e).strip("'")}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    mimetype = negotiate_tensor_mimetype(request)
+    if history and mimetype != 'application/json':
+        return encode_tensor_response(symbol, matrix, mimetype, extra={'feature_set': set_name})
+
+    response = {
+        'symbol': symbol,
+        'feature_set': set_name,
+        'bars_added': len(bars),
+        'bars_seen': state.count,
+        'features': feature_values(state)
+    }
+    if history:
+        response['columns'] = state.feature_set.columns
+        response['history'] = np.where(np.isnan(matrix), None, matrix).tolist()
+    return jsonify(response)
+
+@app.route('/features/<set_name>/<symbol>', methods=['GET', 'DELETE'])
+def symbol_features(set_name, symbol):
+    """Return (GET) or reset (DELETE) the current features of a symbol"""
+    try:
+        if request.method == 'DELETE':
+            with feature_store.lock(set_name, symbol):
+                feature_store.reset_state(set_name, symbol)
+            return jsonify({'message': f'Feature state of {symbol} in {set_name} reset'})
+        state = feature_store.load_state(set_name, symbol)
+    except KeyError as e:
+        return jsonify({'error': str(e).strip("'")}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'symbol': symbol,
+        'feature_set': set_name,
+        'bars_seen': state.count,
+        'features': feature_values(state)
+    })
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Not found'}), 404
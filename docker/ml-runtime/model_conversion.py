@@ -0,0 +1,148 @@
+"""
+LEAN Trading Bot Stack - ML Runtime model conversion
+Konwersja modeli scikit-learn i Keras do ONNX z weryfikacją numeryczną
+"""
+
+import time
+
+import numpy as np
+
+try:
+    from skl2onnx import to_onnx
+    from sklearn.base import is_classifier
+except ImportError:
+    to_onnx = None
+    is_classifier = None
+
+try:
+    import tensorflow as tf
+    import tf2onnx
+except ImportError:
+    tf = None
+    tf2onnx = None
+
+try:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+except ImportError:
+    QuantType = None
+    quantize_dynamic = None
+
+try:
+    import onnx
+    from onnxconverter_common import float16
+except ImportError:
+    onnx = None
+    float16 = None
+
+# Name of the single float input of every converted model
+ONNX_INPUT_NAME = 'input'
+
+
+def sklearn_to_onnx(model, target_path, n_features=None, opset=None):
+    """Convert a fitted scikit-learn estimator or pipeline to an ONNX file
+
+    Classifiers are exported without the ZipMap post-processing and with
+    'probabilities' as the first graph output, so the converted model
+    serves the same predict_proba array the original model does.
+    """
+    if to_onnx is None:
+        raise ImportError("skl2onnx is not installed")
+
+    n_features = n_features or getattr(model, 'n_features_in_', None)
+    if not n_features:
+        raise ValueError("n_features is required for models without n_features_in_")
+
+    sample = np.zeros((1, int(n_features)), dtype=np.float32)
+    classifier = is_classifier(model)
+    options = {'zipmap': False} if classifier else None
+    onnx_model = to_onnx(model, sample, options=options, target_opset=opset)
+
+    # ModelManager serves the first output; put probabilities there
+    if classifier and hasattr(model, 'predict_proba'):
+        outputs = list(onnx_model.graph.output)
+        ordered = sorted(outputs, key=lambda output: output.name != 'probabilities')
+        del onnx_model.graph.output[:]
+        onnx_model.graph.output.extend(ordered)
+
+    with open(target_path, 'wb') as f:
+        f.write(onnx_model.SerializeToString())
+    return target_path
+
+
+def keras_to_onnx(model, target_path, opset=None):
+    """Convert a Keras model to an ONNX file with a dynamic batch axis"""
+    if tf2onnx is None:
+        raise ImportError("tf2onnx is not installed")
+
+    input_shape = model.input_shape
+    if isinstance(input_shape, list):
+        raise ValueError("Only single-input Keras models can be converted")
+
+    signature = [tf.TensorSpec((None,) + tuple(input_shape[1:]), tf.float32, name=ONNX_INPUT_NAME)]
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset, output_path=target_path)
+    return target_path
+
+
+def quantize_int8(source_path, target_path, per_channel=False):
+    """Write a dynamically quantized copy of an ONNX model
+
+    Weights are stored as int8 and activations are quantized at run
+    time, so no calibration data is needed.
+    """
+    if quantize_dynamic is None:
+        raise ImportError("onnxruntime quantization tooling is not installed")
+    quantize_dynamic(source_path, target_path, per_channel=per_channel, weight_type=QuantType.QInt8)
+    return target_path
+
+
+def convert_fp16(source_path, target_path):
+    """Write a float16 copy of an ONNX model that keeps float32 inputs and outputs"""
+    if float16 is None:
+        raise ImportError("onnxconverter-common is not installed")
+    converted = float16.convert_float_to_float16(onnx.load(source_path), keep_io_types=True)
+    onnx.save(converted, target_path)
+    return target_path
+
+
+def sample_inputs(input_shape, n_samples=64, seed=0):
+    """Standard-normal float32 rows shaped like input_shape, batch axis first"""
+    dims = [
+        dim if isinstance(dim, int) and dim > 0 else 1
+        for dim in list(input_shape)[1:]
+    ]
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n_samples, *dims)).astype(np.float32)
+
+
+def compare_outputs(expected, actual, rtol=1e-3, atol=1e-4):
+    """Element-wise agreement between the original and converted model outputs"""
+    expected = np.asarray(expected)
+    actual = np.asarray(actual)
+    if expected.shape != actual.shape:
+        try:
+            actual = actual.reshape(expected.shape)
+        except ValueError:
+            return {
+                'matches': False,
+                'error': f'Output shapes differ: {expected.shape} vs {actual.shape}'
+            }
+
+    difference = np.abs(expected.astype(np.float64) - actual.astype(np.float64))
+    return {
+        'matches': bool(np.allclose(expected, actual, rtol=rtol, atol=atol)),
+        'max_abs_diff': float(difference.max()) if difference.size else 0.0,
+        'mean_abs_diff': float(difference.mean()) if difference.size else 0.0,
+        'rtol': rtol,
+        'atol': atol
+    }
+
+
+def measure_latency(predict_fn, input_data, repeats=20):
+    """Median wall time of predict_fn in milliseconds, after one untimed call"""
+    predict_fn(input_data)
+    timings = []
+    for _ in range(max(1, repeats)):
+        started = time.perf_counter()
+        predict_fn(input_data)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return float(np.median(timings))
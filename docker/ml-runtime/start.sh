@@ -29,9 +29,28 @@ if [ "${JUPYTER_ENABLE_LAB:-yes}" = "yes" ]; then
 fi
 
 # Start ML API service
+# ML_SERVING_MODE=production runs gunicorn with ML_API_WORKERS processes,
+# ML_SERVING_MODE=async runs the asyncio front-end (async_server.py) in them
+start_api() {
+    if [ "${ML_SERVING_MODE:-development}" = "production" ] || [ "$ML_SERVING_MODE" = "async" ]; then
+        export ML_API_WORKERS="${ML_API_WORKERS:-4}"
+        # Workers write metric samples here; /metrics aggregates them
+        export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/ml-prometheus}"
+        rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+        mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+        if [ "$ML_SERVING_MODE" = "async" ]; then
+            gunicorn -c gunicorn.conf.py async_server:app &
+        else
+            gunicorn -c gunicorn.conf.py ml_api:app &
+        fi
+    else
+        python ml_api.py &
+    fi
+    API_PID=$!
+}
+
 echo "Starting ML API service on port 5001..."
-python ml_api.py &
-API_PID=$!
+start_api
 echo "ML API started with PID: $API_PID"
 
 # Wait for services to be ready
@@ -56,8 +75,7 @@ echo "All ML Runtime services started successfully"
 while true; do
     if ! kill -0 $API_PID 2>/dev/null; then
         echo "ML API service died, restarting..."
-        python ml_api.py &
-        API_PID=$!
+        start_api
     fi
     
     if [ "${JUPYTER_ENABLE_LAB:-yes}" = "yes" ] && ! kill -0 $JUPYTER_PID 2>/dev/null; then
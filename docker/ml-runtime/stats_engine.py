@@ -0,0 +1,327 @@
+"""
+LEAN Trading Bot Stack - ML Runtime incremental statistics
+Przyrostowe statystyki (momenty, kowariancja, kwantyle) liczone porcjami danych
+"""
+
+import fcntl
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Values kept per column for quantile estimates; exact until a column exceeds it
+DEFAULT_RESERVOIR_SIZE = 10000
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class IncrementalStats:
+    """Running describe()/corr() over a stream of DataFrame chunks
+
+    Numeric columns keep pairwise-complete co-moments, merged per chunk
+    with the parallel update of Chan et al. on chunk-centred values, so
+    means, variances and correlations match pandas (which also uses
+    pairwise-complete observations) without holding past rows. Quantiles
+    come from a per-column reservoir sample and are exact while a column
+    has no more non-null values than the reservoir holds.
+    """
+
+    def __init__(self, reservoir_size=DEFAULT_RESERVOIR_SIZE, seed=None):
+        self.reservoir_size = int(reservoir_size)
+        self.rows = 0
+        self.columns = None
+        self.data_types = {}
+        self.missing = {}
+        self.numeric_columns = []
+        self._rng = np.random.default_rng(seed)
+        self._init_numeric(0)
+
+    def _init_numeric(self, k):
+        self.pair_count = np.zeros((k, k))
+        # pair_mean[i, j]: mean of column i over rows where i and j are both present
+        self.pair_mean = np.zeros((k, k))
+        self.comoment = np.zeros((k, k))
+        # pair_sq[i, j]: squared deviations of column i over rows where j is present too
+        self.pair_sq = np.zeros((k, k))
+        self.minimum = np.full(k, np.inf)
+        self.maximum = np.full(k, -np.inf)
+        self.reservoir = np.full((self.reservoir_size, k), np.nan)
+        self.seen = np.zeros(k, dtype=np.int64)
+
+    def update(self, frame):
+        """Fold one chunk of rows into the running statistics"""
+        if self.columns is None:
+            self.columns = [str(column) for column in frame.columns]
+            self.data_types = frame.dtypes.astype(str).to_dict()
+            self.data_types = {str(key): value for key, value in self.data_types.items()}
+            self.missing = {column: 0 for column in self.columns}
+            self.numeric_columns = [
+                str(column) for column in frame.select_dtypes(include=[np.number]).columns
+            ]
+            self._init_numeric(len(self.numeric_columns))
+        elif [str(column) for column in frame.columns] != self.columns:
+            raise ValueError(
+                f"Chunk columns {list(frame.columns)} do not match session columns {self.columns}"
+            )
+
+        frame.columns = self.columns
+        self.rows += len(frame)
+        for column, count in frame.isnull().sum().items():
+            self.missing[column] += int(count)
+
+        if self.numeric_columns and len(frame):
+            values = frame[self.numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+            self._update_numeric(values)
+
+    def _update_numeric(self, values):
+        present = ~np.isnan(values)
+        mask = present.astype(np.float64)
+
+        # Centre on the chunk's column means so the co-moments stay well conditioned
+        with np.errstate(invalid='ignore'):
+            shift = np.nanmean(values, axis=0)
+        shift = np.where(np.isnan(shift), 0.0, shift)
+        centred = np.where(present, values - shift, 0.0)
+
+        count_b = mask.T @ mask
+        sums = centred.T @ mask  # sums[i, j]: sum of centred x_i where x_j is present too
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_b = np.where(count_b > 0, sums / count_b, 0.0)
+        comoment_b = centred.T @ centred - mean_b * sums.T
+        sq_b = (centred * centred).T @ mask - mean_b * sums
+        mean_b = mean_b + shift[:, None]
+
+        count_a = self.pair_count
+        total = count_a + count_b
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean_b - self.pair_mean
+            weight = np.where(total > 0, count_a * count_b / total, 0.0)
+            self.comoment = self.comoment + comoment_b + delta * delta.T * weight
+            self.pair_sq = self.pair_sq + sq_b + delta * delta * weight
+            self.pair_mean = np.where(total > 0, self.pair_mean + delta * count_b / total, 0.0)
+        self.pair_count = total
+
+        with np.errstate(invalid='ignore'):
+            self.minimum = np.fmin(self.minimum, np.nanmin(np.where(present, values, np.inf), axis=0))
+            self.maximum = np.fmax(self.maximum, np.nanmax(np.where(present, values, -np.inf), axis=0))
+
+        for index in range(values.shape[1]):
+            self._sample(index, values[present[:, index], index])
+
+    def _sample(self, index, column_values):
+        """Reservoir sampling (Algorithm R), vectorized over one chunk of a column"""
+        seen = int(self.seen[index])
+        capacity = self.reservoir_size
+        fill = max(0, min(capacity - seen, len(column_values)))
+        if fill:
+            self.reservoir[seen:seen + fill, index] = column_values[:fill]
+
+        rest = column_values[fill:]
+        if len(rest):
+            positions = np.arange(seen + fill + 1, seen + len(column_values) + 1)
+            accept = self._rng.random(len(rest)) < capacity / positions
+            slots = self._rng.integers(0, capacity, size=int(accept.sum()))
+            self.reservoir[slots, index] = rest[accept]
+        self.seen[index] = seen + len(column_values)
+
+    def analysis(self):
+        """Statistics in the same layout the pandas-based /analyze returned"""
+        columns = self.columns or []
+        result = {
+            'shape': [self.rows, len(columns)],
+            'columns': columns,
+            'missing_values': dict(self.missing),
+            'basic_stats': {},
+            'data_types': dict(self.data_types)
+        }
+
+        count = np.diag(self.pair_count)
+        mean = np.diag(self.pair_mean)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = np.where(count > 1, np.diag(self.comoment) / (count - 1), np.nan)
+
+        for index, column in enumerate(self.numeric_columns):
+            sample = self.reservoir[:min(self.seen[index], self.reservoir_size), index]
+            quantiles = np.quantile(sample, [0.25, 0.5, 0.75]) if len(sample) else [np.nan] * 3
+            result['basic_stats'][column] = _finite({
+                'count': float(count[index]),
+                'mean': mean[index] if count[index] else np.nan,
+                'std': np.sqrt(variance[index]),
+                'min': self.minimum[index] if count[index] else np.nan,
+                '25%': quantiles[0],
+                '50%': quantiles[1],
+                '75%': quantiles[2],
+                'max': self.maximum[index] if count[index] else np.nan
+            })
+        result['quantiles_exact'] = bool(np.all(self.seen <= self.reservoir_size))
+
+        if len(self.numeric_columns) > 1:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                # Both variances are taken over the same rows as the co-moment
+                correlation = self.comoment / np.sqrt(self.pair_sq * self.pair_sq.T)
+            correlation = np.where(self.pair_count > 1, correlation, np.nan)
+            result['correlations'] = {
+                column_j: _finite({
+                    column_i: correlation[i, j]
+                    for i, column_i in enumerate(self.numeric_columns)
+                })
+                for j, column_j in enumerate(self.numeric_columns)
+            }
+        return result
+
+    def state(self):
+        """Arrays and metadata needed to resume this engine later"""
+        meta = {
+            'reservoir_size': self.reservoir_size,
+            'rows': self.rows,
+            'columns': self.columns,
+            'data_types': self.data_types,
+            'missing': self.missing,
+            'numeric_columns': self.numeric_columns
+        }
+        arrays = {
+            'pair_count': self.pair_count,
+            'pair_mean': self.pair_mean,
+            'comoment': self.comoment,
+            'pair_sq': self.pair_sq,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'reservoir': self.reservoir,
+            'seen': self.seen
+        }
+        return meta, arrays
+
+    @classmethod
+    def from_state(cls, meta, arrays):
+        engine = cls(reservoir_size=meta['reservoir_size'])
+        engine.rows = meta['rows']
+        engine.columns = meta['columns']
+        engine.data_types = meta['data_types']
+        engine.missing = meta['missing']
+        engine.numeric_columns = meta['numeric_columns']
+        for name, value in arrays.items():
+            setattr(engine, name, value)
+        return engine
+
+
+def _finite(values):
+    """Replace NaN/inf with None so the result is valid JSON"""
+    return {
+        key: (float(value) if value is not None and np.isfinite(value) else None)
+        for key, value in values.items()
+    }
+
+
+class AnalysisSessionStore:
+    """Statistics sessions persisted on disk, shared by all API worker processes"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, session_id):
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise ValueError(f"Invalid session id: {session_id}")
+        base = os.path.join(self.directory, session_id)
+        return f"{base}.json", f"{base}.npz", f"{base}.lock"
+
+    def exists(self, session_id):
+        return os.path.exists(self._paths(session_id)[0])
+
+    def lock(self, session_id):
+        """Exclusive lock held while a session is read, updated and written back"""
+        return FileLock(self._paths(session_id)[2])
+
+    def load(self, session_id, reservoir_size=DEFAULT_RESERVOIR_SIZE):
+        meta_path, arrays_path, _ = self._paths(session_id)
+        if not os.path.exists(meta_path):
+            return IncrementalStats(reservoir_size=reservoir_size)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with np.load(arrays_path) as arrays:
+            return IncrementalStats.from_state(meta, {name: arrays[name] for name in arrays.files})
+
+    def save(self, session_id, engine):
+        meta_path, arrays_path, _ = self._paths(session_id)
+        meta, arrays = engine.state()
+
+        fd, tmp_arrays = tempfile.mkstemp(dir=self.directory, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        fd, tmp_meta = tempfile.mkstemp(dir=self.directory, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_arrays, arrays_path)
+        os.replace(tmp_meta, meta_path)
+
+    def delete(self, session_id):
+        removed = False
+        for path in self._paths(session_id):
+            if os.path.exists(path):
+                os.remove(path)
+                removed = True
+        return removed
+
+
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'w')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+def iter_frames(source, mimetype, chunk_size, columns=None):
+    """DataFrame chunks from CSV, Parquet, Arrow IPC or .npy input
+
+    source is a binary file-like object. Parquet needs random access, so
+    a non-seekable source is buffered first.
+    """
+    if mimetype == 'text/csv':
+        yield from pd.read_csv(source, chunksize=chunk_size)
+    elif mimetype in ('application/vnd.apache.parquet', 'application/x-parquet'):
+        import pyarrow.parquet as pq
+        if not source.seekable():
+            import io
+            source = io.BytesIO(source.read())
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif mimetype in ('application/vnd.apache.arrow.stream', 'application/vnd.apache.arrow.file'):
+        import pyarrow as pa
+        reader = pa.ipc.open_stream(source) if mimetype.endswith('stream') else pa.ipc.open_file(source)
+        if hasattr(reader, 'num_record_batches'):
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        else:
+            batches = reader
+        for batch in batches:
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size).to_pandas()
+    elif mimetype == 'application/x-npy':
+        from bulk_scoring import iter_npy_stream_chunks
+        for chunk in iter_npy_stream_chunks(source, chunk_size):
+            chunk = chunk.reshape(len(chunk), -1)
+            names = columns or [f'col_{index}' for index in range(chunk.shape[1])]
+            yield pd.DataFrame(chunk, columns=names)
+    else:
+        raise ValueError(f"Unsupported analysis input type: {mimetype}")
+
+
+MIMETYPES_BY_EXTENSION = {
+    '.csv': 'text/csv',
+    '.parquet': 'application/vnd.apache.parquet',
+    '.arrow': 'application/vnd.apache.arrow.file',
+    '.feather': 'application/vnd.apache.arrow.file',
+    '.arrows': 'application/vnd.apache.arrow.stream',
+    '.npy': 'application/x-npy'
+}
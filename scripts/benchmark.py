@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+LEAN Trading Bot Stack - Benchmark harness
+Powtarzalne testy obciążeniowe ML Runtime i backendu WebUI
+
+Builds small stand-in models at run time (scikit-learn, its ONNX export
+and a tiny Keras model when TensorFlow is installed), then drives the ML
+runtime (/predict, /analyze) and the main backend endpoints at one or
+more concurrency levels. Apps run in-process through the Flask test
+client against a throwaway SQLite database and an in-memory Redis, so no
+network or external service is needed; --ml-url / --backend-url point
+the same scenarios at running servers instead.
+
+Results (throughput, p50/p95/p99 latency) are written as JSON;
+--compare prints the change against an earlier result file.
+
+    python scripts/benchmark.py --concurrency 1,8 --requests 500 --output bench.json
+    python scripts/benchmark.py --compare bench.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ML_RUNTIME_DIR = os.path.join(REPO_ROOT, 'docker', 'ml-runtime')
+BACKEND_DIR = os.path.join(REPO_ROOT, 'webui', 'backend')
+
+
+class InMemoryRedis:
+    """Minimal Redis stand-in used when fakeredis is not installed"""
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        with self._lock:
+            return self._data[key] if self._alive(key) else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = self._encode(value)
+            self._expires.pop(key, None)
+            if ex:
+                self._expires[key] = time.time() + ex
+        return True
+
+    def setex(self, key, seconds, value):
+        return self.set(key, value, ex=seconds)
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._alive(key):
+                    del self._data[key]
+                    self._expires.pop(key, None)
+                    removed += 1
+            return removed
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._alive(key))
+
+
+def make_redis():
+    try:
+        import fakeredis
+        return fakeredis.FakeRedis()
+    except ImportError:
+        return InMemoryRedis()
+
+
+# ---------------------------------------------------------------------------
+# Clients: in-process Flask test client or HTTP against a running server
+# ---------------------------------------------------------------------------
+
+class InProcessClient:
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, content_type=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, data=body, content_type=content_type, headers=headers)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None, content_type=None, headers=None):
+        request = urllib.request.Request(
+            self.base_url + path, data=body, method=method, headers=dict(headers or {})
+        )
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def json_body(payload):
+    return json.dumps(payload).encode(), 'application/json'
+
+
+# ---------------------------------------------------------------------------
+# Stand-in models
+# ---------------------------------------------------------------------------
+
+def build_models(directory, n_features, seed):
+    """Train and save the stand-in models; returns {model_id: (file name, input dtype)}"""
+    from sklearn.linear_model import LogisticRegression
+    import joblib
+
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((2000, n_features)).astype(np.float32)
+    y = (X[:, 0] + 0.5 * X[:, 1] > 0).astype(int)
+    sklearn_model = LogisticRegression(max_iter=200).fit(X, y)
+    joblib.dump(sklearn_model, os.path.join(directory, 'bench_sklearn.pkl'))
+    models = {'bench_sklearn': ('bench_sklearn.pkl', 'float64')}
+
+    sys.path.insert(0, ML_RUNTIME_DIR)
+    import model_conversion
+    try:
+        model_conversion.sklearn_to_onnx(sklearn_model, os.path.join(directory, 'bench_onnx.onnx'))
+        models['bench_onnx'] = ('bench_onnx.onnx', 'float32')
+    except ImportError as e:
+        print(f"Skipping ONNX model: {e}", file=sys.stderr)
+
+    try:
+        import tensorflow as tf
+        keras_model = tf.keras.Sequential([
+            tf.keras.layers.Input(shape=(n_features,)),
+            tf.keras.layers.Dense(16, activation='relu'),
+            tf.keras.layers.Dense(2, activation='softmax')
+        ])
+        keras_model.compile(optimizer='adam', loss='sparse_categorical_crossentropy')
+        keras_model.fit(X, y, epochs=1, verbose=0)
+        keras_model.save(os.path.join(directory, 'bench_keras.h5'))
+        models['bench_keras'] = ('bench_keras.h5', 'float32')
+    except ImportError:
+        pass
+    return models
+
+
+# ---------------------------------------------------------------------------
+# Scenarios: name -> callable returning (method, path, body, content_type, headers)
+# ---------------------------------------------------------------------------
+
+def ml_scenarios(models, n_features, rows, analyze_rows, seed):
+    rng = np.random.default_rng(seed)
+    batch = rng.standard_normal((rows, n_features))
+    scenarios = {}
+
+    for model_id, (_, dtype) in models.items():
+        body, content_type = json_body({'input': batch.astype(dtype).tolist()})
+        scenarios[f'predict_{model_id}_json'] = (
+            lambda body=body, content_type=content_type, model_id=model_id:
+            ('POST', f'/models/{model_id}/predict', body, content_type, None)
+        )
+
+        buffer = io.BytesIO()
+        np.save(buffer, batch.astype(dtype), allow_pickle=False)
+        npy = buffer.getvalue()
+        scenarios[f'predict_{model_id}_npy'] = (
+            lambda npy=npy, model_id=model_id:
+            ('POST', f'/models/{model_id}/predict', npy, 'application/x-npy', {'Accept': 'application/x-npy'})
+        )
+
+    if len(models) > 1:
+        # One decode, every model concurrently; vote works for labels and probabilities alike
+        body, content_type = json_body({'models': list(models), 'input': batch.tolist(), 'combine': 'vote'})
+        scenarios['ensemble_vote_json'] = (
+            lambda body=body, content_type=content_type:
+            ('POST', '/ensembles/predict', body, content_type, None)
+        )
+
+    frame = rng.standard_normal((analyze_rows, 4))
+    records = [dict(zip(('open', 'high', 'low', 'close'), row)) for row in frame.tolist()]
+    body, content_type = json_body({'data': records})
+    scenarios['analyze_json'] = lambda: ('POST', '/analyze', body, content_type, None)
+    return scenarios
+
+
+def backend_scenarios(token):
+    headers = {'Authorization': f'Bearer {token}'}
+    login, content_type = json_body({'username': 'admin', 'password': 'admin123'})
+    backtest, _ = json_body({
+        'strategy_id': 1,
+        'start_date': '2023-01-01',
+        'end_date': '2023-12-31',
+        'initial_capital': 100000
+    })
+    return {
+        'health': lambda: ('GET', '/api/health', None, None, None),
+        'login': lambda: ('POST', '/api/auth/login', login, content_type, None),
+        'brokers': lambda: ('GET', '/api/brokers', None, None, headers),
+        'strategies': lambda: ('GET', '/api/strategies', None, None, headers),
+        'models': lambda: ('GET', '/api/models', None, None, headers),
+        'backtest': lambda: ('POST', '/api/backtest', backtest, content_type, headers),
+        'market_data': lambda: ('GET', '/api/market-data/SPY', None, None, None),
+        'market_quotes_batch': lambda: ('GET', '/api/market-data/quotes?symbols=SPY,QQQ,IWM,BTCUSD,EURUSD', None, None, None),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Targets
+# ---------------------------------------------------------------------------
+
+def setup_ml_target(args, workdir):
+    if args.ml_url and not args.model_dir:
+        raise SystemExit("--ml-url needs --model-dir pointing at the server's MODEL_STORAGE_PATH")
+    model_dir = args.model_dir or workdir
+    models = build_models(model_dir, args.features, args.seed)
+    if args.ml_url:
+        client = HttpClient(args.ml_url)
+    else:
+        os.environ['MODEL_STORAGE_PATH'] = model_dir
+        os.environ.setdefault('ANALYSIS_SESSION_PATH', os.path.join(workdir, 'analysis'))
+        os.environ.setdefault('FEATURE_STATE_PATH', os.path.join(workdir, 'features'))
+        sys.path.insert(0, ML_RUNTIME_DIR)
+        import ml_api
+        client = InProcessClient(ml_api.app)
+
+    for model_id, (file_name, _) in models.items():
+        status, payload = client.request(
+            'POST', f'/models/{model_id}/load', *json_body({'model_path': file_name, 'wait': True})
+        )
+        if status != 200:
+            raise RuntimeError(f"Loading {model_id} failed ({status}): {payload[:200]}")
+    return client, ml_scenarios(models, args.features, args.rows, args.analyze_rows, args.seed)
+
+
+def setup_backend_target(args, workdir):
+    if args.backend_url:
+        client = HttpClient(args.backend_url)
+    else:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'backend.db')}"
+        sys.path.insert(0, BACKEND_DIR)
+        import app as backend
+        backend.redis_client = make_redis()
+        backend.token_service.redis = backend.token_service.revocations.redis = backend.redis_client
+        backend.backtest_queue.redis = backend.redis_client
+        backend.market_data_service.redis = backend.redis_client
+        backend.broker_health_checker.redis = backend.redis_client
+        # No broker has a status URL, so checks never leave the process and GET /api/brokers reads the cache
+        backend.broker_health_checker.endpoint_overrides = {
+            name: {} for name in backend.broker_health.HEALTH_ENDPOINTS
+        }
+        backend.limiter.enabled = False
+        client = InProcessClient(backend.app)
+
+    status, payload = client.request('POST', '/api/auth/login', *json_body(
+        {'username': 'admin', 'password': 'admin123'}
+    ))
+    if status != 200:
+        raise RuntimeError(f"Backend login failed ({status}): {payload[:200]}")
+    token = json.loads(payload)['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    # Seed rows so list endpoints have something to serialize
+    for index in range(args.seed_rows):
+        client.request('POST', '/api/strategies', *json_body({
+            'name': f'bench-strategy-{index}',
+            'description': 'benchmark fixture',
+            'code': 'class Algorithm: pass',
+            'parameters': {'fast': 10, 'slow': 30}
+        }), headers=headers)
+        client.request('POST', '/api/brokers', *json_body({
+            'broker_name': 'paper',
+            'api_key': f'key-{index}',
+            'api_secret': 'secret',
+            'is_paper_trading': True
+        }), headers=headers)
+    return client, backend_scenarios(token)
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def run_scenario(client, make_request, concurrency, total, warmup):
+    def call(_):
+        method, path, body, content_type, headers = make_request()
+        started = time.perf_counter()
+        status, _ = client.request(method, path, body, content_type, headers)
+        return time.perf_counter() - started, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(warmup)))
+        started = time.perf_counter()
+        outcomes = list(pool.map(call, range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = np.array([latency for latency, _ in outcomes]) * 1000.0
+    statuses = {}
+    for _, status in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': sum(count for status, count in statuses.items() if not status.startswith('2')),
+        'status_counts': statuses,
+        'seconds': elapsed,
+        'throughput_rps': total / elapsed if elapsed > 0 else None,
+        'latency_ms': {
+            'mean': float(latencies.mean()),
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+            'max': float(latencies.max())
+        }
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    """Print throughput and p99 change per scenario against a previous run"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {
+        (result['target'], result['scenario'], result['concurrency']): result
+        for result in baseline['results']
+    }
+    print(f"{'scenario':44} {'conc':>4} {'rps':>10} {'Δrps':>8} {'p99 ms':>9} {'Δp99':>8}")
+    for result in current['results']:
+        key = (result['target'], result['scenario'], result['concurrency'])
+        before = previous.get(key)
+        rps = result['throughput_rps'] or 0.0
+        p99 = result['latency_ms']['p99']
+        if before and before['throughput_rps']:
+            rps_change = f"{(rps / before['throughput_rps'] - 1) * 100:+.1f}%"
+            p99_change = f"{(p99 / before['latency_ms']['p99'] - 1) * 100:+.1f}%"
+        else:
+            rps_change = p99_change = 'new'
+        print(f"{result['target'] + '/' + result['scenario']:44} {result['concurrency']:>4} "
+              f"{rps:>10.1f} {rps_change:>8} {p99:>9.2f} {p99_change:>8}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=('ml', 'backend', 'all'), default='all')
+    parser.add_argument('--concurrency', default='1,8', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=300, help='timed requests per scenario and level')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests before each run')
+    parser.add_argument('--scenarios', help='comma-separated scenario names to run (default: all)')
+    parser.add_argument('--features', type=int, default=16, help='input width of the stand-in models')
+    parser.add_argument('--rows', type=int, default=1, help='rows per /predict request')
+    parser.add_argument('--analyze-rows', type=int, default=1000, help='rows per /analyze request')
+    parser.add_argument('--seed-rows', type=int, default=20, help='strategies and brokers created in the backend')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ml-url', help='benchmark a running ML runtime instead of an in-process app')
+    parser.add_argument('--model-dir', help="where stand-in models are written (the server's MODEL_STORAGE_PATH with --ml-url)")
+    parser.add_argument('--backend-url', help='benchmark a running backend instead of an in-process app')
+    parser.add_argument('--output', help='write JSON results here (default: stdout)')
+    parser.add_argument('--compare', help='previous JSON results to compare against')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    levels = [int(level) for level in args.concurrency.split(',')]
+    selected = set(args.scenarios.split(',')) if args.scenarios else None
+    targets = ('ml', 'backend') if args.target == 'all' else (args.target,)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args)
+        },
+        'results': []
+    }
+
+    with tempfile.TemporaryDirectory(prefix='lean-bench-') as workdir:
+        for target in targets:
+            setup = setup_ml_target if target == 'ml' else setup_backend_target
+            target_dir = os.path.join(workdir, target)
+            os.makedirs(target_dir)
+            client, scenarios = setup(args, target_dir)
+            for name, make_request in scenarios.items():
+                if selected and name not in selected:
+                    continue
+                for concurrency in levels:
+                    result = run_scenario(client, make_request, concurrency, args.requests, args.warmup)
+                    result.update({'target': target, 'scenario': name})
+                    report['results'].append(result)
+                    print(f"{target}/{name} c={concurrency}: {result['throughput_rps']:.1f} rps, "
+                          f"p99 {result['latency_ms']['p99']:.2f} ms, errors {result['errors']}",
+                          file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    elif not args.compare:
+        print(output)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
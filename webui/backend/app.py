@@ -6,20 +6,38 @@ Licencja: Apache 2.0
 """
 
 import os
+import base64
 import json
 import logging
-from datetime import datetime
-from flask import Flask, request, jsonify, render_template
+import secrets
+import threading
+from datetime import datetime, timezone
+from flask import Flask, request, jsonify, render_template, Response, g, has_request_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import numpy as np
 import redis
 import requests
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import queue
+import time
+import uuid
 from werkzeug.security import check_password_hash, generate_password_hash
 from functools import wraps
 
+import vector_backtest
+from auth_tokens import TokenError, TokenService
+from backtest_jobs import BacktestJobQueue, JobNotFound
+import market_data
+from bar_store import COLUMNS as BAR_COLUMNS, BarStore, downsample as downsample_bars, lttb
+from backtest_series import TRADE_COLUMNS, decode_series, drawdown, encode_equity, encode_trades
+from bar_aggregator import StreamConsumer, publish_ticks
+import broker_health
+
 # Inicjalizacja aplikacji
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
@@ -33,8 +51,8 @@ migrate = Migrate(app, db)
 
 # Rate Limiting
 limiter = Limiter(
-    app,
-    key_func=get_remote_address,
+    get_remote_address,
+    app=app,
     default_limits=["200 per day", "50 per hour"]
 )
 
@@ -43,6 +61,55 @@ redis_client = redis.Redis.from_url(
     os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 )
 
+# Klucze przykładowe, którymi nie wolno podpisywać tokenów
+INSECURE_JWT_SECRET_KEYS = {'', 'dev-secret-key', 'change_me_jwt_secret_key', 'change_me_flask_secret_key'}
+
+
+def jwt_secret_key():
+    """JWT_SECRET_KEY, or a random per-process key when it is unset or a known placeholder
+
+    Access tokens are verified by signature alone, so a guessable key
+    would let anyone forge a token for any user. A random key is safe,
+    but tokens then stop working after a restart and across processes
+    that did not inherit it.
+    """
+    key = os.getenv('JWT_SECRET_KEY', '').strip()
+    if key in INSECURE_JWT_SECRET_KEYS:
+        logging.getLogger(__name__).warning(
+            'JWT_SECRET_KEY is unset or a placeholder; signing tokens with a random key '
+            'valid only for this process. Set JWT_SECRET_KEY in production.'
+        )
+        return secrets.token_urlsafe(32)
+    return key
+
+
+# Tokeny dostępowe JWT weryfikowane lokalnie; Redis tylko przy logowaniu, odświeżaniu i wylogowaniu
+token_service = TokenService(
+    jwt_secret_key(),
+    redis_client,
+    access_ttl=int(os.getenv('JWT_ACCESS_TTL_SECONDS', '900')),
+    refresh_ttl=int(os.getenv('JWT_REFRESH_TTL_SECONDS', '86400')),
+    revocation_sync_seconds=float(os.getenv('AUTH_REVOCATION_SYNC_SECONDS', '5'))
+)
+
+# Kolejka backtestów LEAN; przebiegi uruchamia backtest_worker.py
+backtest_queue = BacktestJobQueue(
+    redis_client,
+    retention_seconds=int(os.getenv('BACKTEST_JOB_RETENTION_SECONDS', str(7 * 86400)))
+)
+
+# Notowania: jedno odpytanie źródła na symbol, cache w Redis, rozsyłanie przez pub/sub
+market_data_service = market_data.create_service(redis_client)
+
+# Wektorowe backtesty dzielą jedną pulę procesów; ogranicznik równoczesnych przebiegów na proces
+sweep_slots = threading.BoundedSemaphore(int(os.getenv('BACKTEST_MAX_CONCURRENT_SWEEPS', '2')))
+
+# Historia świec: kolumnowe pliki mapowane w pamięci, jeden na symbol i interwał
+bar_store = BarStore(os.getenv('BAR_STORE_PATH', 'bars'))
+
+# Stan brokerów sprawdzany w tle i trzymany w Redis; GET /api/brokers tylko czyta
+broker_health_checker = broker_health.create_checker(redis_client)
+
 # Logging
 logging.basicConfig(
     level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
@@ -60,6 +127,9 @@ class User(db.Model):
     is_active = db.Column(db.Boolean, default=True)
 
 class BrokerConnection(db.Model):
+    __table_args__ = (
+        db.Index('ix_broker_connection_user_active', 'user_id', 'is_active', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     broker_name = db.Column(db.String(50), nullable=False)
@@ -70,6 +140,10 @@ class BrokerConnection(db.Model):
     last_used = db.Column(db.DateTime)
 
 class TradingStrategy(db.Model):
+    __table_args__ = (
+        db.Index('ix_trading_strategy_user', 'user_id', 'id'),
+        db.Index('ix_trading_strategy_user_active', 'user_id', 'is_active', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
@@ -80,17 +154,30 @@ class TradingStrategy(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class MLModel(db.Model):
+    __table_args__ = (
+        db.Index('ix_ml_model_user_active', 'user_id', 'is_active', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     model_type = db.Column(db.String(50))  # onnx, tensorflow, sklearn
     file_path = db.Column(db.String(255))
-    metadata = db.Column(db.JSON)
+    # 'metadata' jest zarezerwowane przez SQLAlchemy; kolumna zachowuje nazwę
+    model_metadata = db.Column('metadata', db.JSON)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class BacktestResult(db.Model):
+    # Rankings read (user_id, metric, id) in index order; the metric's NULLs are filtered out
+    __table_args__ = (
+        db.Index('ix_backtest_result_user', 'user_id', 'id'),
+        db.Index('ix_backtest_result_user_sharpe', 'user_id', 'sharpe_ratio', 'id'),
+        db.Index('ix_backtest_result_user_return', 'user_id', 'total_return', 'id'),
+        db.Index('ix_backtest_result_user_drawdown', 'user_id', 'max_drawdown', 'id'),
+        db.Index('ix_backtest_result_strategy', 'strategy_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     strategy_id = db.Column(db.Integer, db.ForeignKey('trading_strategy.id'), nullable=False)
     start_date = db.Column(db.DateTime)
     end_date = db.Column(db.DateTime)
@@ -99,9 +186,28 @@ class BacktestResult(db.Model):
     total_return = db.Column(db.Float)
     sharpe_ratio = db.Column(db.Float)
     max_drawdown = db.Column(db.Float)
+    trade_count = db.Column(db.Integer)
     results_json = db.Column(db.JSON)
+    # backtest_series blobs, loaded only when a query asks for them
+    equity_curve = db.deferred(db.Column(db.LargeBinary))
+    trade_log = db.deferred(db.Column(db.LargeBinary))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+# Licznik zapytań SQL na żądanie: ostrzeżenie przy N+1; testy sprawdzają g.query_count
+SQL_QUERY_WARN_THRESHOLD = int(os.getenv('SQL_QUERY_WARN_THRESHOLD', '20'))
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(*_):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+@app.after_request
+def report_query_count(response):
+    count = g.get('query_count', 0)
+    if count > SQL_QUERY_WARN_THRESHOLD:
+        logger.warning(f'{request.method} {request.path} ran {count} SQL queries')
+    return response
+
 # Utility functions
 def require_auth(f):
     @wraps(f)
@@ -111,23 +217,63 @@ def require_auth(f):
             return jsonify({'error': 'Authorization required'}), 401
         
         token = auth_header.split(' ')[1]
-        user_id = redis_client.get(f'session:{token}')
-        
-        if not user_id:
+        try:
+            claims = token_service.verify(token)
+        except TokenError:
             return jsonify({'error': 'Invalid or expired token'}), 401
         
-        request.current_user_id = int(user_id)
+        request.current_user_id = int(claims['sub'])
+        request.token_claims = claims
         return f(*args, **kwargs)
     
     return decorated_function
 
 # API Routes
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(str(position).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, parse=int):
+    try:
+        return parse(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+def keyset_page(query, id_column, default_limit=100, max_limit=500, sort_column=None, descending=True):
+    """One page of query, newest first, and the cursor of the next page (or None)
+
+    Pages continue from the last id seen instead of an OFFSET, so every
+    page costs the same index range scan however deep the client goes.
+    With sort_column the order is (sort_column, id) and the cursor
+    carries both values.
+    """
+    limit = request.args.get('limit', default_limit, type=int)
+    if not 1 <= limit <= max_limit:
+        raise ValueError(f'limit must be between 1 and {max_limit}')
+    cursor = request.args.get('cursor')
+    if cursor and sort_column is None:
+        after = decode_cursor(cursor)
+        query = query.filter(id_column < after if descending else id_column > after)
+    elif cursor:
+        after = decode_cursor(cursor, json.loads)
+        if not (isinstance(after, list) and len(after) == 2):
+            raise ValueError('Invalid cursor')
+        key, bound = db.tuple_(sort_column, id_column), db.tuple_(*after)
+        query = query.filter(key < bound if descending else key > bound)
+    columns = (id_column,) if sort_column is None else (sort_column, id_column)
+    query = query.order_by(*(column.desc() if descending else column.asc() for column in columns))
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    next_cursor = encode_cursor(last.id if sort_column is None else json.dumps([getattr(last, sort_column.key), last.id]))
+    return rows[:limit], next_cursor
+
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
     try:
         # Test database
-        db.session.execute('SELECT 1')
+        db.session.execute(db.text('SELECT 1'))
         db_status = 'ok'
     except:
         db_status = 'error'
@@ -161,15 +307,13 @@ def login():
     user = User.query.filter_by(username=data['username']).first()
     
     if user and check_password_hash(user.password_hash, data['password']):
-        # Create session token
-        import uuid
-        token = str(uuid.uuid4())
-        redis_client.setex(f'session:{token}', 3600, user.id)  # 1 hour
+        # Krótkotrwały token dostępowy + token odświeżający w Redis
+        tokens = token_service.issue(user.id)
         
         logger.info(f'User {user.username} logged in')
         
         return jsonify({
-            'token': token,
+            **tokens,
             'user': {
                 'id': user.id,
                 'username': user.username,
@@ -180,24 +324,88 @@ def login():
     logger.warning(f'Failed login attempt for {data["username"]}')
     return jsonify({'error': 'Invalid credentials'}), 401
 
+@app.route('/api/auth/refresh', methods=['POST'])
+@limiter.limit("30 per minute")
+def refresh_token():
+    """Exchange a refresh token for a new access/refresh token pair"""
+    data = request.get_json(silent=True)
+    
+    if not data or not data.get('refresh_token'):
+        return jsonify({'error': 'refresh_token required'}), 400
+    
+    try:
+        _, tokens = token_service.refresh(data['refresh_token'])
+    except TokenError as e:
+        return jsonify({'error': str(e)}), 401
+    
+    return jsonify(tokens)
+
+@app.route('/api/auth/logout', methods=['POST'])
+@require_auth
+def logout():
+    """End the login session behind the current access token"""
+    token_service.revoke(request.token_claims)
+    return jsonify({'message': 'Logged out'})
+
+@app.route('/api/auth/me', methods=['GET'])
+@require_auth
+def current_user():
+    """Profile of the authenticated user"""
+    user = db.session.get(User, request.current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({'error': 'User not found'}), 404
+    
+    return jsonify({
+        'id': user.id,
+        'username': user.username,
+        'email': user.email
+    })
+
 @app.route('/api/brokers', methods=['GET'])
 @require_auth
 def get_brokers():
-    """Get user's broker connections"""
-    connections = BrokerConnection.query.filter_by(
-        user_id=request.current_user_id,
-        is_active=True
-    ).all()
+    """Get user's broker connections with their cached health, one keyset page at a time
+
+    ?refresh=true checks every broker on the page concurrently before answering.
+    """
+    query = db.session.query(
+        BrokerConnection.id,
+        BrokerConnection.broker_name,
+        BrokerConnection.environment,
+        BrokerConnection.last_used
+    ).filter(BrokerConnection.user_id == request.current_user_id, BrokerConnection.is_active.is_(True))
+    try:
+        connections, next_cursor = keyset_page(query, BrokerConnection.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'brokers': [{
+    broker_health_checker.start(active_broker_targets)
+    targets = {(conn.broker_name, conn.environment) for conn in connections}
+    if request.args.get('refresh', 'false').lower() == 'true':
+        health = broker_health_checker.check_all(targets)
+    else:
+        health = broker_health_checker.cached(targets)
+    
+    brokers = []
+    for conn in connections:
+        result = health[broker_health_checker.target_key(conn.broker_name, conn.environment)]
+        brokers.append({
             'id': conn.id,
             'broker_name': conn.broker_name,
             'environment': conn.environment,
             'last_used': conn.last_used.isoformat() if conn.last_used else None,
-            'status': test_broker_connection(conn)
-        } for conn in connections]
-    })
+            'status': result['status'],
+            'latency_ms': result.get('latency_ms'),
+            'checked_at': result.get('checked_at')
+        })
+    return jsonify({'brokers': brokers, 'next_cursor': next_cursor})
+
+def active_broker_targets():
+    """(broker, environment) pairs of every active connection, for the scheduled checks"""
+    with app.app_context():
+        return set(db.session.query(BrokerConnection.broker_name, BrokerConnection.environment)
+                   .filter_by(is_active=True).distinct().all())
 
 @app.route('/api/brokers', methods=['POST'])
 @require_auth
@@ -211,7 +419,7 @@ def add_broker():
     
     # Encrypt API keys (simplified - use proper encryption in production)
     from cryptography.fernet import Fernet
-    key = os.getenv('ENCRYPTION_KEY', Fernet.generate_key()).encode()
+    key = os.getenv('ENCRYPTION_KEY', Fernet.generate_key().decode()).encode()
     cipher = Fernet(key)
     
     encrypted_credentials = cipher.encrypt(json.dumps({
@@ -231,6 +439,7 @@ def add_broker():
     db.session.commit()
     
     logger.info(f'New broker connection added: {data["broker_name"]} for user {request.current_user_id}')
+    broker_health_checker.submit(connection.broker_name, connection.environment)
     
     return jsonify({
         'message': 'Broker connection added successfully',
@@ -240,10 +449,21 @@ def add_broker():
 @app.route('/api/strategies', methods=['GET'])
 @require_auth
 def get_strategies():
-    """Get user's trading strategies"""
-    strategies = TradingStrategy.query.filter_by(
-        user_id=request.current_user_id
-    ).all()
+    """Get user's trading strategies, one keyset page at a time (limit, cursor)"""
+    # Only the listed columns; the code column can be large and is not listed
+    query = db.session.query(
+        TradingStrategy.id,
+        TradingStrategy.name,
+        TradingStrategy.is_active,
+        TradingStrategy.created_at,
+        TradingStrategy.updated_at
+    ).filter(TradingStrategy.user_id == request.current_user_id)
+    if 'active' in request.args:
+        query = query.filter(TradingStrategy.is_active == (request.args['active'].lower() == 'true'))
+    try:
+        strategies, next_cursor = keyset_page(query, TradingStrategy.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'strategies': [{
@@ -252,7 +472,8 @@ def get_strategies():
             'is_active': strategy.is_active,
             'created_at': strategy.created_at.isoformat(),
             'updated_at': strategy.updated_at.isoformat()
-        } for strategy in strategies]
+        } for strategy in strategies],
+        'next_cursor': next_cursor
     })
 
 @app.route('/api/strategies', methods=['POST'])
@@ -282,20 +503,28 @@ def create_strategy():
 @app.route('/api/models', methods=['GET'])
 @require_auth
 def get_ml_models():
-    """Get user's ML models"""
-    models = MLModel.query.filter_by(
-        user_id=request.current_user_id,
-        is_active=True
-    ).all()
+    """Get user's ML models, one keyset page at a time (limit, cursor)"""
+    query = db.session.query(
+        MLModel.id,
+        MLModel.name,
+        MLModel.model_type,
+        MLModel.model_metadata,
+        MLModel.created_at
+    ).filter(MLModel.user_id == request.current_user_id, MLModel.is_active.is_(True))
+    try:
+        models, next_cursor = keyset_page(query, MLModel.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'models': [{
             'id': model.id,
             'name': model.name,
             'model_type': model.model_type,
-            'metadata': model.metadata,
+            'metadata': model.model_metadata,
             'created_at': model.created_at.isoformat()
-        } for model in models]
+        } for model in models],
+        'next_cursor': next_cursor
     })
 
 @app.route('/api/models/upload', methods=['POST'])
@@ -315,7 +544,6 @@ def upload_ml_model():
         return jsonify({'error': 'Invalid file type'}), 400
     
     # Save file
-    import uuid
     filename = f"{uuid.uuid4()}_{file.filename}"
     filepath = os.path.join('models', filename)
     
@@ -337,7 +565,7 @@ def upload_ml_model():
         name=request.form.get('name', file.filename),
         model_type=model_type,
         file_path=filepath,
-        metadata={
+        model_metadata={
             'original_filename': file.filename,
             'file_size': os.path.getsize(filepath),
             'upload_date': datetime.utcnow().isoformat()
@@ -356,8 +584,8 @@ def upload_ml_model():
 @app.route('/api/backtest', methods=['POST'])
 @require_auth
 def run_backtest():
-    """Run backtest on strategy"""
-    data = request.get_json()
+    """Queue a LEAN backtest of a strategy; returns the job id at once"""
+    data = request.get_json(silent=True) or {}
     
     required_fields = ['strategy_id', 'start_date', 'end_date', 'initial_capital']
     if not all(field in data for field in required_fields):
@@ -370,53 +598,494 @@ def run_backtest():
     
     if not strategy:
         return jsonify({'error': 'Strategy not found'}), 404
+    if not strategy.code:
+        return jsonify({'error': 'Strategy has no code to backtest'}), 400
     
-    # Simulate backtest (replace with actual LEAN integration)
     try:
-        # This would integrate with LEAN engine
-        backtest_config = {
-            'algorithm-type-name': strategy.name,
-            'algorithm-code': strategy.code,
-            'start-date': data['start_date'],
-            'end-date': data['end_date'],
-            'cash': data['initial_capital']
-        }
+        datetime.fromisoformat(data['start_date'])
+        datetime.fromisoformat(data['end_date'])
+        initial_capital = float(data['initial_capital'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start_date and end_date must be ISO dates, initial_capital a number'}), 400
+    
+    job = backtest_queue.submit(request.current_user_id, strategy.id, {
+        'name': strategy.name,
+        'code': strategy.code,
+        'parameters': {**(strategy.parameters or {}), **data.get('parameters', {})},
+        'start_date': data['start_date'],
+        'end_date': data['end_date'],
+        'initial_capital': initial_capital
+    })
+    
+    return jsonify({
+        'message': 'Backtest queued',
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'status_url': f"/api/backtest/jobs/{job['job_id']}"
+    }), 202
+
+def backtest_job_payload(job):
+    """A job as returned by the API, without the strategy code"""
+    payload = {key: value for key, value in job.items() if key not in ('config', 'user_id')}
+    payload['start_date'] = job['config']['start_date']
+    payload['end_date'] = job['config']['end_date']
+    payload['initial_capital'] = job['config']['initial_capital']
+    return payload
+
+@app.route('/api/backtest/jobs', methods=['GET'])
+@require_auth
+def list_backtest_jobs():
+    """The user's most recent backtest jobs"""
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    jobs = backtest_queue.list_for_user(request.current_user_id, limit)
+    return jsonify({
+        'jobs': [backtest_job_payload(job) for job in jobs],
+        'queued': backtest_queue.queue_length()
+    })
+
+@app.route('/api/backtest/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_backtest_job(job_id):
+    """Status and progress of a backtest job, with its results once finished"""
+    try:
+        job = backtest_queue.get(job_id, request.current_user_id)
+    except JobNotFound:
+        return jsonify({'error': 'Backtest job not found'}), 404
+    return jsonify(backtest_job_payload(job))
+
+@app.route('/api/backtest/jobs/<job_id>/result', methods=['GET'])
+@require_auth
+def get_backtest_job_result(job_id):
+    """Stored BacktestResult of a succeeded job"""
+    try:
+        job = backtest_queue.get(job_id, request.current_user_id)
+    except JobNotFound:
+        return jsonify({'error': 'Backtest job not found'}), 404
+    if job['status'] != 'succeeded':
+        return jsonify({'error': f"Backtest job is {job['status']}", 'status': job['status']}), 409
+    
+    result = db.session.get(BacktestResult, job['result_id'])
+    if result is None:
+        return jsonify({'error': 'Backtest result not found'}), 404
+    return jsonify({
+        'job_id': job_id,
+        'result_id': result.id,
+        'strategy_id': result.strategy_id,
+        'start_date': result.start_date.isoformat() if result.start_date else None,
+        'end_date': result.end_date.isoformat() if result.end_date else None,
+        'initial_capital': result.initial_capital,
+        'final_capital': result.final_capital,
+        'total_return': result.total_return,
+        'sharpe_ratio': result.sharpe_ratio,
+        'max_drawdown': result.max_drawdown,
+        'trade_count': result.trade_count,
+        'results': result.results_json,
+        # Equity curve and trades are served from there, downsampled and paged
+        'details_url': f'/api/backtests/{result.id}'
+    })
+
+@app.route('/api/backtest/jobs/<job_id>/cancel', methods=['POST'])
+@require_auth
+def cancel_backtest_job(job_id):
+    """Cancel a queued job, or stop the LEAN run of a running one"""
+    try:
+        job = backtest_queue.request_cancel(job_id, request.current_user_id)
+    except JobNotFound:
+        return jsonify({'error': 'Backtest job not found'}), 404
+    # A running job is stopped by its worker within a poll interval
+    return jsonify(backtest_job_payload(job)), 200 if job['status'] == 'cancelled' else 202
+
+@app.route('/api/backtest/sweep', methods=['POST'])
+@require_auth
+def run_backtest_sweep():
+    """Vectorized first-pass backtest over a parameter grid
+
+    Body: strategy_id, initial_capital, signal (sma_cross, momentum,
+    bollinger, breakout; defaults to the strategy's 'signal' parameter),
+    parameters ({name: value or [values]}), bars (columns or records),
+    symbol and timeframe (stored bars) or data_path (CSV under
+    BACKTEST_DATA_PATH), optional start_date,
+    end_date, fee_bps, slippage_bps, allow_short, periods_per_year,
+    rank_by and top. Every combination is stored as a BacktestResult.
+    """
+    data = request.get_json(silent=True) or {}
+    
+    if 'strategy_id' not in data or 'initial_capital' not in data:
+        return jsonify({'error': 'strategy_id and initial_capital are required'}), 400
+    
+    strategy = TradingStrategy.query.filter_by(
+        id=data['strategy_id'],
+        user_id=request.current_user_id
+    ).first()
+    
+    if not strategy:
+        return jsonify({'error': 'Strategy not found'}), 404
+    
+    strategy_parameters = strategy.parameters or {}
+    signal = data.get('signal') or strategy_parameters.get('signal')
+    rank_by = data.get('rank_by', 'sharpe_ratio')
+    if rank_by not in ('sharpe_ratio', 'total_return', 'max_drawdown', 'final_capital'):
+        return jsonify({'error': 'rank_by must be sharpe_ratio, total_return, max_drawdown or final_capital'}), 400
+    
+    try:
+        if 'bars' in data:
+            bars = vector_backtest.parse_bars(data['bars'])
+        elif 'symbol' in data:
+            stored = bar_store.read(
+                str(data['symbol']).upper(), data.get('timeframe', '1d'),
+                parse_epoch(data.get('start_date')), parse_epoch(data.get('end_date'))
+            )
+            if len(stored['time']) == 0:
+                return jsonify({'error': f"No stored bars for {data['symbol']}"}), 404
+            bars = dict(stored, time=stored['time'].astype('datetime64[s]'))
+        elif 'data_path' in data:
+            root = os.path.realpath(os.getenv('BACKTEST_DATA_PATH', 'data'))
+            path = os.path.realpath(os.path.join(root, data['data_path']))
+            if not path.startswith(root + os.sep) or not os.path.exists(path):
+                return jsonify({'error': f'Data file not found: {data["data_path"]}'}), 404
+            bars = vector_backtest.load_bars_file(path)
+        else:
+            return jsonify({'error': 'bars, symbol or data_path is required'}), 400
+        bars = vector_backtest.slice_bars(bars, data.get('start_date'), data.get('end_date'))
         
-        # Mock results for now
-        results = {
-            'total_return': 0.15,  # 15%
-            'sharpe_ratio': 1.2,
-            'max_drawdown': -0.08,  # -8%
-            'trades': 45,
-            'winning_trades': 28,
-            'losing_trades': 17
-        }
+        grid = vector_backtest.expand_grid(data.get('parameters', strategy_parameters.get('grid')))
+        max_combinations = int(os.getenv('BACKTEST_MAX_COMBINATIONS', '5000'))
+        if len(grid) > max_combinations:
+            return jsonify({'error': f'{len(grid)} parameter sets exceed the limit of {max_combinations}'}), 400
         
-        # Save results
-        backtest_result = BacktestResult(
+        settings = {
+            'initial_capital': float(data['initial_capital']),
+            'fee_bps': float(data.get('fee_bps', 1.0)),
+            'slippage_bps': float(data.get('slippage_bps', 1.0)),
+            'allow_short': bool(data.get('allow_short', True)),
+            'periods_per_year': float(data.get('periods_per_year', 252))
+        }
+        # Waiting sweeps hold request threads, so the wait is short and the client retries
+        if not sweep_slots.acquire(timeout=float(os.getenv('BACKTEST_SWEEP_WAIT_SECONDS', '10'))):
+            return jsonify({'error': 'Too many backtest sweeps running, try again shortly'}), 503
+        try:
+            started = time.perf_counter()
+            results = vector_backtest.run_sweep(
+                bars, signal, grid, settings,
+                workers=int(os.getenv('BACKTEST_WORKERS', '0')) or None
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            sweep_slots.release()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Drawdowns are negative, so the best one is the largest value as well
+    order = sorted(range(len(results)), key=lambda index: results[index][rank_by], reverse=True)
+    best = vector_backtest.run_combination(
+        bars, signal, results[order[0]]['parameters'], settings, keep_equity=True
+    )
+    
+    if 'time' in bars:
+        start_date = bars['time'][0].item()
+        end_date = bars['time'][-1].item()
+    else:
+        start_date = datetime.fromisoformat(data['start_date']) if data.get('start_date') else None
+        end_date = datetime.fromisoformat(data['end_date']) if data.get('end_date') else None
+    
+    sweep_id = uuid.uuid4().hex
+    rows = [
+        BacktestResult(
+            user_id=request.current_user_id,
             strategy_id=strategy.id,
-            start_date=datetime.fromisoformat(data['start_date']),
-            end_date=datetime.fromisoformat(data['end_date']),
-            initial_capital=data['initial_capital'],
-            final_capital=data['initial_capital'] * (1 + results['total_return']),
-            total_return=results['total_return'],
-            sharpe_ratio=results['sharpe_ratio'],
-            max_drawdown=results['max_drawdown'],
-            results_json=results
+            start_date=start_date,
+            end_date=end_date,
+            initial_capital=settings['initial_capital'],
+            final_capital=result['final_capital'],
+            total_return=result['total_return'],
+            sharpe_ratio=result['sharpe_ratio'],
+            max_drawdown=result['max_drawdown'],
+            trade_count=result['trades'],
+            results_json={
+                'engine': 'vectorized',
+                'sweep_id': sweep_id,
+                'signal': signal,
+                **{key: value for key, value in settings.items() if key != 'initial_capital'},
+                **result
+            }
         )
-        
-        db.session.add(backtest_result)
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Backtest completed successfully',
-            'result_id': backtest_result.id,
-            'results': results
-        })
-        
-    except Exception as e:
-        logger.error(f'Backtest error: {e}')
-        return jsonify({'error': 'Backtest failed'}), 500
+        for result in results
+    ]
+    # Only the best run keeps its curve and trades; the rest are kept as metrics
+    times = (
+        bars['time'].astype('datetime64[s]').astype(np.int64) if 'time' in bars
+        else np.arange(len(best['equity']), dtype=np.int64)
+    )
+    trade_log = best['trade_log']
+    rows[order[0]].equity_curve = encode_equity(times, best['equity'])
+    rows[order[0]].trade_log = encode_trades({
+        **trade_log,
+        'entry_time': times[trade_log['entry_index']],
+        'exit_time': times[trade_log['exit_index']],
+        'symbol': np.zeros(len(trade_log['entry_index']), dtype=np.int32)
+    }, [str(data.get('symbol', '')).upper()])
+    db.session.add_all(rows)
+    db.session.flush()
+    # Read before the commit expires them, or every id costs a query
+    result_ids = [row.id for row in rows]
+    db.session.commit()
+    
+    top = [
+        {**results[index], 'result_id': result_ids[index]}
+        for index in order[:int(data.get('top', 10))]
+    ]
+    logger.info(f'Backtest sweep {sweep_id}: {len(results)} parameter sets in {elapsed:.2f}s')
+    
+    return jsonify({
+        'message': 'Backtest sweep completed successfully',
+        'sweep_id': sweep_id,
+        'signal': signal,
+        'combinations': len(results),
+        'seconds': elapsed,
+        'rank_by': rank_by,
+        'top': top,
+        'best': {
+            'result_id': result_ids[order[0]],
+            'parameters': best['parameters'],
+            'equity_curve': vector_backtest.downsample(best['equity']).tolist()
+        },
+        'result_ids': result_ids
+    })
+
+# Wyniki backtestów: rankingi i filtry w SQL, krzywe i transakcje ładowane osobno
+BACKTEST_RANKINGS = {
+    'sharpe_ratio': BacktestResult.sharpe_ratio,
+    'total_return': BacktestResult.total_return,
+    'max_drawdown': BacktestResult.max_drawdown
+}
+
+BACKTEST_COLUMNS = (
+    BacktestResult.id,
+    BacktestResult.strategy_id,
+    BacktestResult.start_date,
+    BacktestResult.end_date,
+    BacktestResult.initial_capital,
+    BacktestResult.final_capital,
+    BacktestResult.total_return,
+    BacktestResult.sharpe_ratio,
+    BacktestResult.max_drawdown,
+    BacktestResult.trade_count,
+    BacktestResult.created_at
+)
+
+def backtest_payload(row):
+    return {
+        'id': row.id,
+        'strategy_id': row.strategy_id,
+        'start_date': row.start_date.isoformat() if row.start_date else None,
+        'end_date': row.end_date.isoformat() if row.end_date else None,
+        'initial_capital': row.initial_capital,
+        'final_capital': row.final_capital,
+        'total_return': row.total_return,
+        'sharpe_ratio': row.sharpe_ratio,
+        'max_drawdown': row.max_drawdown,
+        'trade_count': row.trade_count,
+        'created_at': row.created_at.isoformat() if row.created_at else None
+    }
+
+def filter_backtests(query):
+    """The user's backtests narrowed by the metric and date filters of the request"""
+    args = request.args
+    query = query.filter(BacktestResult.user_id == request.current_user_id)
+    if 'strategy_id' in args:
+        strategy_id = args.get('strategy_id', type=int)
+        if strategy_id is None:
+            raise ValueError('strategy_id must be an integer')
+        query = query.filter(BacktestResult.strategy_id == strategy_id)
+    numbers = {}
+    for name in ('min_sharpe', 'min_return', 'max_drawdown', 'min_trades'):
+        if name in args:
+            numbers[name] = args.get(name, type=float)
+            if numbers[name] is None:
+                raise ValueError(f'{name} must be a number')
+    if 'min_sharpe' in numbers:
+        query = query.filter(BacktestResult.sharpe_ratio >= numbers['min_sharpe'])
+    if 'min_return' in numbers:
+        query = query.filter(BacktestResult.total_return >= numbers['min_return'])
+    if 'max_drawdown' in numbers:
+        # Drawdowns are stored negative; max_drawdown=0.2 keeps those no worse than -20%
+        query = query.filter(BacktestResult.max_drawdown >= -abs(numbers['max_drawdown']))
+    if 'min_trades' in numbers:
+        query = query.filter(BacktestResult.trade_count >= numbers['min_trades'])
+    # The tested period must lie within [start, end]
+    start = parse_epoch(args.get('start'))
+    end = parse_epoch(args.get('end'))
+    if start is not None:
+        query = query.filter(BacktestResult.start_date >= datetime.utcfromtimestamp(start))
+    if end is not None:
+        query = query.filter(BacktestResult.end_date <= datetime.utcfromtimestamp(end))
+    return query
+
+@app.route('/api/backtests', methods=['GET'])
+@require_auth
+def get_backtests():
+    """The user's backtests, filtered and ranked in the database
+
+    Query: sort (created, sharpe_ratio, total_return, max_drawdown),
+    order (desc or asc), strategy_id, min_sharpe, min_return,
+    max_drawdown (as a positive fraction), min_trades, start, end,
+    limit and cursor. Ranking by a metric skips backtests without it.
+    Curves, trades and raw statistics are not loaded.
+    """
+    sort = request.args.get('sort', 'created')
+    if sort != 'created' and sort not in BACKTEST_RANKINGS:
+        return jsonify({'error': f"sort must be created, {', '.join(BACKTEST_RANKINGS)}"}), 400
+    order = request.args.get('order', 'desc')
+    if order not in ('desc', 'asc'):
+        return jsonify({'error': 'order must be desc or asc'}), 400
+    
+    try:
+        query = filter_backtests(db.session.query(*BACKTEST_COLUMNS))
+        sort_column = BACKTEST_RANKINGS.get(sort)
+        if sort_column is not None:
+            query = query.filter(sort_column.isnot(None))
+        backtests, next_cursor = keyset_page(
+            query, BacktestResult.id, sort_column=sort_column, descending=order == 'desc'
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'backtests': [backtest_payload(row) for row in backtests],
+        'sort': sort,
+        'order': order,
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/backtests/summary', methods=['GET'])
+@require_auth
+def get_backtests_summary():
+    """Per-strategy aggregates of the user's backtests (same filters as GET /api/backtests)"""
+    try:
+        query = filter_backtests(db.session.query(
+            BacktestResult.strategy_id,
+            TradingStrategy.name,
+            db.func.count(BacktestResult.id).label('backtests'),
+            db.func.max(BacktestResult.sharpe_ratio).label('best_sharpe_ratio'),
+            db.func.max(BacktestResult.total_return).label('best_return'),
+            db.func.avg(BacktestResult.total_return).label('average_return'),
+            db.func.min(BacktestResult.max_drawdown).label('worst_drawdown'),
+            db.func.max(BacktestResult.created_at).label('last_run_at')
+        ).join(TradingStrategy, TradingStrategy.id == BacktestResult.strategy_id))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = query.group_by(BacktestResult.strategy_id, TradingStrategy.name).all()
+    
+    return jsonify({
+        'strategies': [{
+            'strategy_id': row.strategy_id,
+            'name': row.name,
+            'backtests': row.backtests,
+            'best_sharpe_ratio': row.best_sharpe_ratio,
+            'best_return': row.best_return,
+            'average_return': float(row.average_return) if row.average_return is not None else None,
+            'worst_drawdown': row.worst_drawdown,
+            'last_run_at': row.last_run_at.isoformat() if row.last_run_at else None
+        } for row in rows]
+    })
+
+@app.route('/api/backtests/<int:result_id>', methods=['GET'])
+@require_auth
+def get_backtest(result_id):
+    """Metrics and statistics of one backtest; the curve and trades have their own endpoints"""
+    row = db.session.query(
+        BacktestResult,
+        BacktestResult.equity_curve.isnot(None).label('has_equity_curve'),
+        BacktestResult.trade_log.isnot(None).label('has_trade_log')
+    ).filter(BacktestResult.id == result_id, BacktestResult.user_id == request.current_user_id).first()
+    if row is None:
+        return jsonify({'error': 'Backtest not found'}), 404
+    
+    result = row.BacktestResult
+    return jsonify({
+        **backtest_payload(result),
+        'results': result.results_json,
+        'equity_url': f'/api/backtests/{result.id}/equity' if row.has_equity_curve else None,
+        'trades_url': f'/api/backtests/{result.id}/trades' if row.has_trade_log else None
+    })
+
+def load_backtest_series(result_id, column):
+    """The stored blob of one of the user's backtests, or None"""
+    row = db.session.query(column).filter(
+        BacktestResult.id == result_id, BacktestResult.user_id == request.current_user_id
+    ).first()
+    return None if row is None else row[0]
+
+@app.route('/api/backtests/<int:result_id>/equity', methods=['GET'])
+@require_auth
+def get_backtest_equity(result_id):
+    """Equity curve and drawdown in [start, end], downsampled to max_points with LTTB"""
+    blob = load_backtest_series(result_id, BacktestResult.equity_curve)
+    if blob is None:
+        return jsonify({'error': 'Backtest has no stored equity curve'}), 404
+    try:
+        start = parse_epoch(request.args.get('start'))
+        end = parse_epoch(request.args.get('end'))
+        max_points = request.args.get('max_points', 1000, type=int)
+        if not 3 <= max_points <= 20000:
+            raise ValueError('max_points must be between 3 and 20000')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    series, _ = decode_series(blob)
+    times, equity = series['time'], series['equity']
+    first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+    last = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+    times, equity = times[first:last], equity[first:last]
+    # Drawdown from the full-resolution curve, so downsampling cannot hide the worst point
+    drawdowns = drawdown(equity)
+    index = lttb(times, equity, max_points)
+    
+    return jsonify({
+        'id': result_id,
+        'stored_points': len(series['time']),
+        'points': len(index),
+        'time': times[index].tolist(),
+        'equity': equity[index].tolist(),
+        'drawdown': drawdowns[index].tolist(),
+        'max_drawdown': float(drawdowns.min()) if len(drawdowns) else None
+    })
+
+@app.route('/api/backtests/<int:result_id>/trades', methods=['GET'])
+@require_auth
+def get_backtest_trades(result_id):
+    """Closed trades of a backtest in entry order, offset/limit at a time"""
+    blob = load_backtest_series(result_id, BacktestResult.trade_log)
+    if blob is None:
+        return jsonify({'error': 'Backtest has no stored trades'}), 404
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', 500, type=int)
+    if offset < 0 or not 1 <= limit <= 5000:
+        return jsonify({'error': 'offset must be >= 0 and limit between 1 and 5000'}), 400
+    
+    trades, meta = decode_series(blob)
+    symbols = meta.get('symbols') or []
+    page = {name: trades[name][offset:offset + limit].tolist() for name in TRADE_COLUMNS}
+    page['symbol'] = [symbols[index] if index < len(symbols) else None for index in page['symbol']]
+    total = len(trades['entry_time'])
+    
+    return jsonify({
+        'id': result_id,
+        'total': total,
+        'offset': offset,
+        'trades': [dict(zip(page, values)) for values in zip(*page.values())],
+        'next_offset': offset + limit if offset + limit < total else None
+    })
+
+@app.route('/api/backtests/<int:result_id>', methods=['DELETE'])
+@require_auth
+def delete_backtest(result_id):
+    """Delete a stored backtest result"""
+    deleted = BacktestResult.query.filter_by(id=result_id, user_id=request.current_user_id).delete()
+    db.session.commit()
+    if not deleted:
+        return jsonify({'error': 'Backtest not found'}), 404
+    return jsonify({'message': 'Backtest deleted successfully'})
 
 @app.route('/api/live/start', methods=['POST'])
 @require_auth
@@ -449,32 +1118,187 @@ def start_live_trading():
         'broker_name': broker.broker_name
     })
 
+MARKET_DATA_MAX_SYMBOLS = int(os.getenv('MARKET_DATA_MAX_SYMBOLS', '50'))
+
 @app.route('/api/market-data/<symbol>')
-@limiter.limit("30 per minute")
+@limiter.limit("120 per minute")
 def get_market_data(symbol):
-    """Get real-time market data"""
-    # Mock market data - replace with real data feed
-    import random
+    """Latest quote of one symbol from the shared cache"""
+    try:
+        symbols = market_data.parse_symbols(symbol, 1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(market_data_service.get_quotes(symbols)[symbols[0]])
+
+@app.route('/api/market-data/quotes')
+@limiter.limit("120 per minute")
+def get_market_quotes():
+    """Latest quotes of ?symbols=AAPL,MSFT,... in one call"""
+    try:
+        symbols = market_data.parse_symbols(request.args.get('symbols'), MARKET_DATA_MAX_SYMBOLS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'quotes': market_data_service.get_quotes(symbols)})
+
+@app.route('/api/market-data/stream')
+@limiter.limit("30 per minute")
+def stream_market_data():
+    """Server-sent events with quotes of ?symbols=... as the shared poller updates them
+
+    The first event ('snapshot') carries the cached quotes, every later
+    one ('quotes') only the symbols that changed.
+    """
+    try:
+        symbols = market_data.parse_symbols(request.args.get('symbols'), MARKET_DATA_MAX_SYMBOLS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    keepalive_seconds = 15
+    
+    def event(name, payload):
+        return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
     
-    price = round(random.uniform(100, 200), 2)
-    change = round(random.uniform(-5, 5), 2)
+    def events():
+        client_id, updates = market_data_service.subscribe(symbols)
+        try:
+            yield 'retry: 3000\n' + event('snapshot', market_data_service.get_quotes(symbols))
+            interest_renewed = time.monotonic()
+            while True:
+                try:
+                    yield event('quotes', updates.get(timeout=keepalive_seconds))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                # Keep the poller fetching these symbols while somebody watches them
+                if time.monotonic() - interest_renewed > market_data_service.interest_seconds / 3:
+                    market_data_service.register_interest(symbols)
+                    interest_renewed = time.monotonic()
+        finally:
+            market_data_service.unsubscribe(client_id)
+    
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def parse_epoch(value):
+    """Epoch seconds from a number or an ISO 8601 string; None stays None"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Invalid time: {value}')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+@app.route('/api/market-data/<symbol>/history', methods=['GET'])
+@limiter.limit("120 per minute")
+def get_market_history(symbol):
+    """Stored bars of a symbol in [start, end], downsampled to max_points
+
+    Query: timeframe (1m, 1h, 1d, ...), start, end (ISO or epoch
+    seconds), max_points, method (ohlc merges neighbouring bars, lttb
+    keeps the bars that preserve the close curve's shape), columns.
+    """
+    columns = tuple(request.args.get('columns', 'time,open,high,low,close,volume').split(','))
+    try:
+        start = parse_epoch(request.args.get('start'))
+        end = parse_epoch(request.args.get('end'))
+        unknown = set(columns) - set(BAR_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        max_points = request.args.get('max_points', 1000, type=int)
+        if not 3 <= max_points <= 20000:
+            raise ValueError('max_points must be between 3 and 20000')
+        method = request.args.get('method', 'ohlc')
+        read_columns = tuple(dict.fromkeys(('time',) + columns + (('close',) if method == 'lttb' else ())))
+        bars = bar_store.read(symbol.upper(), request.args.get('timeframe', '1m'), start, end, read_columns)
+        stored = len(bars['time'])
+        bars = downsample_bars(bars, max_points, method)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'symbol': symbol.upper(),
-        'price': price,
-        'change': change,
-        'change_percent': round(change / price * 100, 2),
-        'timestamp': datetime.utcnow().isoformat()
+        'timeframe': request.args.get('timeframe', '1m'),
+        'bars': stored,
+        'points': len(bars['time']),
+        **{name: bars[name].tolist() for name in columns}
     })
 
-def test_broker_connection(connection):
-    """Test broker API connection"""
+@app.route('/api/market-data/<symbol>/history', methods=['POST'])
+@require_auth
+def append_market_history(symbol):
+    """Append bars ({timeframe, bars: {time: [...], open: [...], ...}}); existing times are replaced"""
+    data = request.get_json(silent=True) or {}
+    payload = data.get('bars') or {}
+    missing = [name for name in BAR_COLUMNS if name not in payload]
+    if missing:
+        return jsonify({'error': f"bars is missing columns: {', '.join(missing)}"}), 400
     try:
-        # This would test actual broker connection
-        # For now, return mock status
-        return 'connected' if connection.is_active else 'disconnected'
-    except:
-        return 'error'
+        bars = dict(payload, time=[parse_epoch(value) for value in payload['time']])
+        if len({len(values) for values in bars.values()}) > 1:
+            raise ValueError('Bar columns must have equal lengths')
+        added, replaced = bar_store.append(symbol.upper(), data.get('timeframe', '1m'), bars)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'added': added, 'replaced': replaced})
+
+@app.route('/api/market-data/ticks', methods=['POST'])
+@require_auth
+@limiter.limit("600 per minute")
+def ingest_ticks():
+    """Queue tick batches for bar aggregation
+
+    Body: {symbol, time: [...], price: [...], size: [...]} or
+    {batches: [such objects]}; times are epoch seconds. Bars appear in
+    the history endpoint as bar_aggregator.py closes them.
+
+    Backfill works per symbol in time order: ticks more than
+    BAR_LATE_SECONDS older than the newest tick of their symbol are
+    dropped (see GET /api/market-data/ticks/stats), so history must not
+    be posted for a symbol that is already receiving live ticks.
+    """
+    data = request.get_json(silent=True) or {}
+    batches = data.get('batches', [data])
+    queued = 0
+    try:
+        parsed = []
+        for batch in batches:
+            symbols = market_data.parse_symbols(batch.get('symbol'), 1)
+            columns = [np.asarray(batch.get(name) or [], dtype=np.float64) for name in ('time', 'price', 'size')]
+            if len({len(values) for values in columns}) > 1 or any(values.ndim != 1 for values in columns):
+                raise ValueError('time, price and size must be lists of equal length')
+            # None becomes NaN, which would poison every bar the tick lands in
+            if not all(np.isfinite(values).all() for values in columns):
+                raise ValueError('time, price and size must be finite numbers')
+            parsed.append((symbols[0], columns))
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    pipe = redis_client.pipeline()
+    for symbol, (times, prices, sizes) in parsed:
+        if len(times):
+            publish_ticks(pipe, symbol, times, prices, sizes)
+            queued += len(times)
+    pipe.execute()
+    return jsonify({'queued': queued}), 202
+
+@app.route('/api/market-data/ticks/stats', methods=['GET'])
+@require_auth
+def get_tick_stats():
+    """Ticks the aggregator accepted and dropped as too late, as of its last checkpoint"""
+    stats = redis_client.hgetall(StreamConsumer.stats_key)
+    stats = {key.decode(): value.decode() for key, value in stats.items()}
+    return jsonify({
+        key: float(value) if key == 'updated_at' else int(value)
+        for key, value in stats.items()
+    })
 
 # Error handlers
 @app.errorhandler(404)
@@ -491,21 +1315,32 @@ def rate_limit_exceeded(error):
     return jsonify({'error': 'Rate limit exceeded'}), 429
 
 # Database initialization
-@app.before_first_request
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+@app.before_request
 def create_tables():
-    db.create_all()
-    
-    # Create default admin user if doesn't exist
-    admin = User.query.filter_by(username='admin').first()
-    if not admin:
-        admin = User(
-            username='admin',
-            email='admin@localhost',
-            password_hash=generate_password_hash('admin123')  # Change in production!
-        )
-        db.session.add(admin)
-        db.session.commit()
-        logger.info('Default admin user created')
+    """Create tables and the default admin once, before the first request is handled"""
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if _tables_ready:
+            return
+        db.create_all()
+        
+        # Create default admin user if doesn't exist
+        admin = User.query.filter_by(username='admin').first()
+        if not admin:
+            admin = User(
+                username='admin',
+                email='admin@localhost',
+                password_hash=generate_password_hash('admin123')  # Change in production!
+            )
+            db.session.add(admin)
+            db.session.commit()
+            logger.info('Default admin user created')
+        _tables_ready = True
 
 if __name__ == '__main__':
     port = int(os.getenv('API_PORT', 5000))
@@ -0,0 +1,170 @@
+"""
+LEAN Trading Bot Stack - Tokeny uwierzytelniania
+Krótkotrwałe tokeny JWT weryfikowane lokalnie; Redis tylko przy logowaniu, odświeżaniu i wylogowaniu
+
+An access token is an HS256 JWT carrying the user id (sub) and a login
+session id (sid), so require_auth verifies it without any network call.
+It is paired with an opaque refresh token kept in Redis, which is
+rotated on every refresh. Logging out deletes the refresh token and
+records the session id as revoked, both in Redis and in this process.
+Other processes pick the revocation up when their local copy of the
+revoked set expires. A revoked access token therefore stops working
+after at most min(sync interval, access token lifetime).
+"""
+
+import json
+import logging
+import secrets
+import threading
+import time
+import uuid
+
+import jwt
+import redis
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_TYPE = 'access'
+# Tolerated clock difference between the issuing and the verifying host
+LEEWAY_SECONDS = 10
+
+
+class TokenError(Exception):
+    """The token is malformed, expired, revoked or unknown"""
+
+
+class RevocationCache:
+    """Session ids revoked before their access tokens expire
+
+    The set lives in a Redis sorted set scored by expiry time. Each
+    process keeps a copy and re-reads it at most every sync_seconds;
+    when Redis is unreachable the last copy keeps being used.
+    """
+
+    key = 'auth:revoked'
+
+    def __init__(self, redis_client, sync_seconds=5.0):
+        self.redis = redis_client
+        self.sync_seconds = sync_seconds
+        self._revoked = {}
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, session_id, expires_at):
+        with self._lock:
+            self._revoked[session_id] = expires_at
+        pipe = self.redis.pipeline()
+        pipe.zadd(self.key, {session_id: expires_at})
+        pipe.zremrangebyscore(self.key, '-inf', time.time())
+        pipe.execute()
+
+    def _sync(self, now):
+        try:
+            entries = self.redis.zrangebyscore(self.key, now, '+inf', withscores=True)
+        except redis.RedisError as e:
+            logger.warning(f'Could not refresh revoked sessions, using the cached set: {e}')
+            # Try again after another interval rather than on every request
+            self._synced_at = now
+            return
+        self._revoked = {
+            (member.decode() if isinstance(member, bytes) else member): score
+            for member, score in entries
+        }
+        self._synced_at = now
+
+    def is_revoked(self, session_id):
+        now = time.time()
+        if now - self._synced_at >= self.sync_seconds:
+            with self._lock:
+                if now - self._synced_at >= self.sync_seconds:
+                    self._sync(now)
+        expires_at = self._revoked.get(session_id)
+        return expires_at is not None and expires_at > now
+
+
+class TokenService:
+    """Issues, verifies, refreshes and revokes login tokens"""
+
+    def __init__(self, secret, redis_client, access_ttl=900, refresh_ttl=86400,
+                 revocation_sync_seconds=5.0, algorithm='HS256'):
+        self.secret = secret
+        self.redis = redis_client
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self.algorithm = algorithm
+        self.revocations = RevocationCache(redis_client, revocation_sync_seconds)
+
+    def _access_token(self, user_id, session_id):
+        now = int(time.time())
+        claims = {
+            'sub': str(user_id),
+            'sid': session_id,
+            'jti': uuid.uuid4().hex,
+            'type': ACCESS_TOKEN_TYPE,
+            'iat': now,
+            'exp': now + self.access_ttl
+        }
+        return jwt.encode(claims, self.secret, algorithm=self.algorithm)
+
+    def issue(self, user_id, session_id=None):
+        """Access and refresh token pair for a new (or continued) login session"""
+        session_id = session_id or uuid.uuid4().hex
+        refresh_token = secrets.token_urlsafe(32)
+        pipe = self.redis.pipeline()
+        pipe.setex(
+            f'auth:refresh:{refresh_token}', self.refresh_ttl,
+            json.dumps({'user_id': user_id, 'sid': session_id})
+        )
+        # The session remembers its current refresh token so logout can delete it
+        pipe.setex(f'auth:session:{session_id}', self.refresh_ttl, refresh_token)
+        pipe.execute()
+        return {
+            'token': self._access_token(user_id, session_id),
+            'token_type': 'Bearer',
+            'expires_in': self.access_ttl,
+            'refresh_token': refresh_token,
+            'refresh_expires_in': self.refresh_ttl
+        }
+
+    def verify(self, token):
+        """Claims of a valid access token; no Redis call unless the revocation copy is stale"""
+        try:
+            claims = jwt.decode(
+                token, self.secret, algorithms=[self.algorithm], leeway=LEEWAY_SECONDS,
+                options={'require': ['exp', 'iat', 'sub', 'sid']}
+            )
+        except jwt.PyJWTError as e:
+            raise TokenError(str(e)) from e
+        if claims.get('type') != ACCESS_TOKEN_TYPE:
+            raise TokenError('Not an access token')
+        if self.revocations.is_revoked(claims['sid']):
+            raise TokenError('Session has been logged out')
+        return claims
+
+    def refresh(self, refresh_token):
+        """Exchange a refresh token for a new pair; the old refresh token stops working"""
+        pipe = self.redis.pipeline()
+        pipe.get(f'auth:refresh:{refresh_token}')
+        pipe.delete(f'auth:refresh:{refresh_token}')
+        stored, deleted = pipe.execute()
+        # Only the request that actually deleted the token may use it
+        if not stored or not deleted:
+            raise TokenError('Invalid or expired refresh token')
+        session = json.loads(stored)
+        if self.revocations.is_revoked(session['sid']):
+            raise TokenError('Session has been logged out')
+        return session['user_id'], self.issue(session['user_id'], session['sid'])
+
+    def revoke(self, claims):
+        """Log a session out: no more refreshes, and its access tokens stop verifying"""
+        session_id = claims['sid']
+        refresh_token = self.redis.get(f'auth:session:{session_id}')
+        pipe = self.redis.pipeline()
+        if refresh_token:
+            if isinstance(refresh_token, bytes):
+                refresh_token = refresh_token.decode()
+            pipe.delete(f'auth:refresh:{refresh_token}')
+        pipe.delete(f'auth:session:{session_id}')
+        pipe.execute()
+        # Access tokens of the session live at most access_ttl past now
+        self.revocations.add(session_id, time.time() + self.access_ttl + LEEWAY_SECONDS)
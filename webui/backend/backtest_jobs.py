@@ -0,0 +1,559 @@
+"""
+LEAN Trading Bot Stack - Kolejka backtestów LEAN
+Zadania w Redis, limit równoległych przebiegów na hosta, postęp i anulowanie
+
+The API enqueues a job and returns at once; backtest_worker.py claims
+jobs and runs LEAN for each. Job records are Redis hashes, so status,
+progress and cancellation work from any backend process. A worker must
+hold one of the host's slots (BACKTEST_MAX_CONCURRENT per host, shared
+by every worker process on it) before claiming a job. Slots and running
+jobs carry heartbeats, so a crashed worker frees its slots and its jobs
+are marked failed instead of staying 'running' forever. A claimed job id
+moves atomically from the queue to the worker's own processing list, so
+a worker that dies before marking it running leaves it there, and the
+reaper puts it back at the head of the queue.
+"""
+
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import shlex
+import signal
+import socket
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import redis
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobNotFound(LookupError):
+    """No job with this id (or it belongs to another user)"""
+
+
+class BacktestJobQueue:
+    """Job records, the pending queue and heartbeats in Redis"""
+
+    queue_key = 'backtest:queue'
+    running_key = 'backtest:running'
+    workers_key = 'backtest:workers'
+
+    def __init__(self, redis_client, retention_seconds=7 * 86400, heartbeat_seconds=30):
+        self.redis = redis_client
+        self.retention_seconds = retention_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+
+    @staticmethod
+    def _job_key(job_id):
+        return f'backtest:job:{job_id}'
+
+    @staticmethod
+    def _user_key(user_id):
+        return f'backtest:user:{user_id}:jobs'
+
+    @staticmethod
+    def _processing_key(worker_id):
+        return f'backtest:processing:{worker_id}'
+
+    @staticmethod
+    def _decode(record):
+        job = {
+            (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+            for key, value in record.items()
+        }
+        for field in ('config', 'result', 'log_tail'):
+            if field in job:
+                job[field] = json.loads(job[field])
+        for field in ('user_id', 'strategy_id', 'result_id'):
+            if job.get(field):
+                job[field] = int(job[field])
+        if 'progress' in job:
+            job['progress'] = float(job['progress'])
+        job['cancel_requested'] = job.get('cancel_requested') == '1'
+        return job
+
+    def submit(self, user_id, strategy_id, config):
+        """Queue a backtest; returns the new job record"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        record = {
+            'job_id': job_id,
+            'user_id': user_id,
+            'strategy_id': strategy_id,
+            'status': QUEUED,
+            'progress': 0.0,
+            'submitted_at': datetime.utcnow().isoformat(),
+            'config': json.dumps(config)
+        }
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping=record)
+        pipe.zadd(self._user_key(user_id), {job_id: now})
+        pipe.lpush(self.queue_key, job_id)
+        pipe.execute()
+        return self.get(job_id)
+
+    def get(self, job_id, user_id=None):
+        record = self.redis.hgetall(self._job_key(job_id))
+        if not record:
+            raise JobNotFound(job_id)
+        job = self._decode(record)
+        if user_id is not None and job['user_id'] != user_id:
+            raise JobNotFound(job_id)
+        return job
+
+    def list_for_user(self, user_id, limit=50):
+        job_ids = self.redis.zrevrange(self._user_key(user_id), 0, limit - 1)
+        jobs = []
+        for job_id in job_ids:
+            job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+            try:
+                jobs.append(self.get(job_id))
+            except JobNotFound:
+                # Finished records expire; drop their index entries too
+                self.redis.zrem(self._user_key(user_id), job_id)
+        return jobs
+
+    def queue_length(self):
+        return self.redis.llen(self.queue_key)
+
+    def request_cancel(self, job_id, user_id=None):
+        """Cancel a queued job at once, or ask the worker running it to stop"""
+        job = self.get(job_id, user_id)
+        if job['status'] in FINISHED_STATES:
+            return job
+        if job['status'] == QUEUED and self.redis.lrem(self.queue_key, 0, job_id):
+            self.finish(job_id, CANCELLED)
+        else:
+            self.redis.hset(self._job_key(job_id), 'cancel_requested', '1')
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id):
+        return self.redis.hget(self._job_key(job_id), 'cancel_requested') in (b'1', '1')
+
+    def claim(self, worker_id, timeout=5):
+        """Next queued job id for this worker, or None after timeout seconds"""
+        processing_key = self._processing_key(worker_id)
+        # The worker must look alive for longer than it can block below
+        self.redis.zadd(self.workers_key, {worker_id: time.time() + max(self.heartbeat_seconds * 3, timeout * 2)})
+        item = self.redis.blmove(self.queue_key, processing_key, timeout, 'RIGHT', 'LEFT')
+        if item is None:
+            return None
+        job_id = item.decode() if isinstance(item, bytes) else item
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            'status': RUNNING,
+            'started_at': datetime.utcnow().isoformat(),
+            'worker': worker_id
+        })
+        pipe.zadd(self.running_key, {job_id: time.time() + self.heartbeat_seconds * 3})
+        pipe.lrem(processing_key, 0, job_id)
+        pipe.execute()
+        if self.cancel_requested(job_id):
+            self.finish(job_id, CANCELLED)
+            return None
+        return job_id
+
+    def heartbeat(self, job_id):
+        self.redis.zadd(self.running_key, {job_id: time.time() + self.heartbeat_seconds * 3})
+
+    def update(self, job_id, **fields):
+        encoded = {
+            key: json.dumps(value) if key in ('result', 'log_tail') else value
+            for key, value in fields.items()
+        }
+        self.redis.hset(self._job_key(job_id), mapping=encoded)
+
+    def finish(self, job_id, status, **fields):
+        fields = {**fields, 'status': status, 'finished_at': datetime.utcnow().isoformat()}
+        if status == SUCCEEDED:
+            fields['progress'] = 1.0
+        self.update(job_id, **fields)
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.running_key, job_id)
+        pipe.expire(self._job_key(job_id), self.retention_seconds)
+        pipe.execute()
+
+    def fail_abandoned(self):
+        """Mark running jobs whose worker stopped sending heartbeats as failed"""
+        expired = self.redis.zrangebyscore(self.running_key, '-inf', time.time())
+        for job_id in expired:
+            job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+            logger.warning(f'Backtest job {job_id} lost its worker')
+            self.finish(job_id, FAILED, error='Worker stopped while the backtest was running')
+        return len(expired)
+
+    def requeue_orphaned(self):
+        """Put jobs claimed by workers that died before starting them back at the head of the queue"""
+        requeued = 0
+        for worker_id in self.redis.zrangebyscore(self.workers_key, '-inf', time.time()):
+            worker_id = worker_id.decode() if isinstance(worker_id, bytes) else worker_id
+            processing_key = self._processing_key(worker_id)
+            while True:
+                job_id = self.redis.lmove(processing_key, self.queue_key, 'RIGHT', 'RIGHT')
+                if job_id is None:
+                    break
+                job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+                logger.warning(f'Backtest job {job_id} requeued, worker {worker_id} stopped before starting it')
+                requeued += 1
+            self.redis.zrem(self.workers_key, worker_id)
+        return requeued
+
+
+class HostSlots:
+    """Counting semaphore for concurrent LEAN runs on one host, shared through Redis
+
+    Members expire unless renewed, so a killed worker gives its slots back.
+    """
+
+    def __init__(self, redis_client, capacity, host=None, ttl_seconds=90):
+        self.redis = redis_client
+        self.capacity = capacity
+        self.host = host or socket.gethostname()
+        self.ttl_seconds = ttl_seconds
+        self.key = f'backtest:slots:{self.host}'
+
+    def acquire(self, holder):
+        """Take a slot for holder; False when the host is at capacity"""
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key)
+                    pipe.zremrangebyscore(self.key, '-inf', time.time())
+                    held = pipe.zscore(self.key, holder) is not None
+                    if not held and pipe.zcard(self.key) >= self.capacity:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.zadd(self.key, {holder: time.time() + self.ttl_seconds})
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+
+    def renew(self, holder):
+        self.redis.zadd(self.key, {holder: time.time() + self.ttl_seconds}, xx=True)
+
+    def release(self, holder):
+        self.redis.zrem(self.key, holder)
+
+    def in_use(self):
+        self.redis.zremrangebyscore(self.key, '-inf', time.time())
+        return self.redis.zcard(self.key)
+
+
+# LEAN result statistics, as printed ("12.5%", "$1,234.00", "1.2")
+def _number(text):
+    if text is None:
+        return None
+    cleaned = str(text).replace('$', '').replace(',', '').replace('%', '').strip()
+    try:
+        value = float(cleaned)
+    except ValueError:
+        return None
+    return value / 100 if str(text).strip().endswith('%') else value
+
+
+def parse_statistics(statistics, initial_capital):
+    """BacktestResult columns from a LEAN statistics dict"""
+    total_return = _number(statistics.get('Net Profit', statistics.get('Return')))
+    drawdown = _number(statistics.get('Drawdown'))
+    trades = _number(statistics.get('Total Trades', statistics.get('Total Orders')))
+    final_capital = _number(statistics.get('End Equity'))
+    if final_capital is None and total_return is not None:
+        final_capital = initial_capital * (1 + total_return)
+    return {
+        'total_return': total_return,
+        'sharpe_ratio': _number(statistics.get('Sharpe Ratio')),
+        # Stored as a negative fraction, like the vectorized engine
+        'max_drawdown': -abs(drawdown) if drawdown is not None else None,
+        'final_capital': final_capital,
+        'trades': int(trades) if trades is not None else None,
+        'win_rate': _number(statistics.get('Win Rate'))
+    }
+
+
+def result_statistics(document):
+    return document.get('statistics') or document.get('Statistics')
+
+
+def find_result(results_dir):
+    """The LEAN result JSON written to results_dir (the one with statistics), if any"""
+    for path in sorted(glob.glob(os.path.join(results_dir, '*.json')), key=os.path.getsize, reverse=True):
+        try:
+            with open(path) as f:
+                document = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(document, dict) and result_statistics(document):
+            return document
+    return None
+
+
+def _field(record, name):
+    """A field of a LEAN JSON object, which is camelCase or PascalCase by version"""
+    return record.get(name, record.get(name[0].upper() + name[1:]))
+
+
+def _epoch(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def parse_equity(document):
+    """(times, equity) of the 'Strategy Equity' chart, or None
+
+    Points are {x, y} in older LEAN versions and [time, open, high,
+    low, close] candles in newer ones; a candle counts as its close.
+    """
+    chart = (_field(document, 'charts') or {}).get('Strategy Equity') or {}
+    series = (_field(chart, 'series') or {}).get('Equity') or {}
+    points = _field(series, 'values') or []
+    times, values = [], []
+    for point in points:
+        if isinstance(point, dict):
+            time_value, value = point.get('x'), point.get('y')
+        else:
+            time_value, value = point[0], point[-1]
+        if time_value is None or value is None:
+            continue
+        times.append(int(time_value))
+        values.append(float(value))
+    if not times:
+        return None
+    # LEAN may sample a moment twice; the later point wins
+    times = np.asarray(times, dtype=np.int64)
+    order = np.argsort(times, kind='stable')
+    times, values = times[order], np.asarray(values)[order]
+    keep = np.append(times[1:] != times[:-1], True)
+    return times[keep], values[keep]
+
+
+def parse_trades(document):
+    """(columns, symbols) of the closed trades in LEAN's total performance, or None"""
+    performance = _field(document, 'totalPerformance') or {}
+    trades = _field(performance, 'closedTrades') or []
+    if not trades:
+        return None
+    symbols = {}
+    columns = {name: [] for name in ('entry_time', 'exit_time', 'symbol', 'direction', 'quantity',
+                                     'entry_price', 'exit_price', 'pnl', 'fees')}
+    for trade in trades:
+        symbol = _field(trade, 'symbol')
+        if isinstance(symbol, dict):
+            symbol = symbol.get('value') or symbol.get('Value') or symbol.get('permtick') or ''
+        # TradeDirection is serialized as 0 (long) / 1 (short) or by name
+        direction = _field(trade, 'direction')
+        short = direction in (1, 'Short', 'short')
+        columns['entry_time'].append(_epoch(_field(trade, 'entryTime')))
+        columns['exit_time'].append(_epoch(_field(trade, 'exitTime')))
+        columns['symbol'].append(symbols.setdefault(str(symbol or ''), len(symbols)))
+        columns['direction'].append(-1 if short else 1)
+        columns['quantity'].append(_number(_field(trade, 'quantity')) or 0.0)
+        columns['entry_price'].append(_number(_field(trade, 'entryPrice')) or 0.0)
+        columns['exit_price'].append(_number(_field(trade, 'exitPrice')) or 0.0)
+        columns['pnl'].append(_number(_field(trade, 'profitLoss')) or 0.0)
+        columns['fees'].append(_number(_field(trade, 'totalFees')) or 0.0)
+    return columns, list(symbols)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class LeanRunner:
+    """Runs one LEAN backtest in its own workspace
+
+    The command is a template (LEAN_BACKTEST_COMMAND) with {job_id},
+    {job_dir}, {config}, {host_job_dir} and {host_data_dir}; by default
+    it starts a throwaway container from the LEAN image. The generated
+    config points at container_job_dir / container_data_dir, which must
+    match the mounts in the command. Progress is read from lines such as
+    "45% complete"; statistics like "Win Rate 55%" do not match.
+
+    Signals to the docker CLI do not reach the container, so a cancelled
+    or timed out run is stopped with stop_command and, if that fails,
+    kill_command (templates with {job_id} and {grace_seconds}). Without
+    them, as for a custom command, the run's process group is signalled.
+    """
+
+    DEFAULT_COMMAND = (
+        'docker run --rm --name lean-backtest-{job_id} '
+        '-v {host_data_dir}:/Lean/Data:ro -v {host_job_dir}:/Job '
+        'quantconnect/lean:latest dotnet QuantConnect.Lean.Launcher.dll --config /Job/config.json'
+    )
+    DEFAULT_STOP_COMMAND = 'docker stop -t {grace_seconds} lean-backtest-{job_id}'
+    DEFAULT_KILL_COMMAND = 'docker rm -f lean-backtest-{job_id}'
+
+    def __init__(self, jobs_path, data_path, command=None, host_jobs_path=None, host_data_path=None,
+                 container_job_dir='/Job', container_data_dir='/Lean/Data',
+                 progress_pattern=r'(\d{1,3}(?:\.\d+)?)\s*%\s*(?:complete|progress)\b',
+                 timeout_seconds=3600, poll_seconds=1.0, stop_command=None, kill_command=None,
+                 grace_seconds=10):
+        self.jobs_path = jobs_path
+        self.data_path = data_path
+        self.command = command or self.DEFAULT_COMMAND
+        if command is None:
+            stop_command = stop_command or self.DEFAULT_STOP_COMMAND
+            kill_command = kill_command or self.DEFAULT_KILL_COMMAND
+        self.stop_command = stop_command
+        self.kill_command = kill_command
+        self.grace_seconds = grace_seconds
+        self.host_jobs_path = host_jobs_path or jobs_path
+        self.host_data_path = host_data_path or data_path
+        self.container_job_dir = container_job_dir
+        self.container_data_dir = container_data_dir
+        self.progress_pattern = re.compile(progress_pattern, re.IGNORECASE)
+        self.timeout_seconds = timeout_seconds
+        self.poll_seconds = poll_seconds
+
+    @staticmethod
+    def algorithm_class(code, default):
+        match = re.search(r'^class\s+(\w+)\s*\(\s*QCAlgorithm\s*\)', code or '', re.MULTILINE)
+        return match.group(1) if match else default
+
+    def prepare(self, job_id, config):
+        """Write the algorithm and a backtesting config.json into the job's workspace"""
+        job_dir = os.path.join(self.jobs_path, job_id)
+        os.makedirs(os.path.join(job_dir, 'results'), exist_ok=True)
+        with open(os.path.join(job_dir, 'main.py'), 'w') as f:
+            f.write(config['code'])
+
+        # Algorithms read these through GetParameter('start-date') etc.
+        parameters = {key: str(value) for key, value in (config.get('parameters') or {}).items()}
+        parameters.update({
+            'start-date': config['start_date'],
+            'end-date': config['end_date'],
+            'cash': str(config['initial_capital'])
+        })
+        lean_config = {
+            'environment': 'backtesting',
+            'algorithm-type-name': self.algorithm_class(config['code'], config['name']),
+            'algorithm-language': 'Python',
+            'algorithm-location': f'{self.container_job_dir}/main.py',
+            'data-folder': self.container_data_dir,
+            'results-destination-folder': f'{self.container_job_dir}/results',
+            'close-automatically': True,
+            'parameters': parameters
+        }
+        with open(os.path.join(job_dir, 'config.json'), 'w') as f:
+            json.dump(lean_config, f, indent=2)
+        return job_dir
+
+    def build_command(self, job_id, job_dir):
+        return shlex.split(self.command.format(
+            job_id=job_id,
+            job_dir=job_dir,
+            config=os.path.join(job_dir, 'config.json'),
+            host_job_dir=os.path.join(self.host_jobs_path, job_id),
+            host_data_dir=self.host_data_path
+        ))
+
+    def _control(self, template, job_id):
+        """Run a stop or kill command template; True when it succeeded"""
+        command = shlex.split(template.format(job_id=job_id, grace_seconds=self.grace_seconds))
+        try:
+            completed = subprocess.run(
+                command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                timeout=self.grace_seconds + 30
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f'Could not stop LEAN backtest {job_id}: {e}')
+            return False
+        if completed.returncode != 0:
+            logger.warning(f'Could not stop LEAN backtest {job_id}: {completed.stdout.strip()}')
+        return completed.returncode == 0
+
+    def _stop(self, process, job_id):
+        if self.stop_command:
+            # The container is stopped by name; the CLI then exits on its own
+            if not self._control(self.stop_command, job_id) and self.kill_command:
+                self._control(self.kill_command, job_id)
+            try:
+                process.wait(timeout=self.grace_seconds)
+                return
+            except subprocess.TimeoutExpired:
+                pass
+        # The run is its own process group, so LEAN's children stop with it
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=self.grace_seconds)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+        except ProcessLookupError:
+            pass
+
+    def run(self, job_id, config, on_progress, should_cancel, on_tick=None):
+        """Run LEAN to completion; returns (result document, log tail)
+
+        Raises JobCancelled when should_cancel() turns true, and
+        RuntimeError when LEAN fails, times out or writes no statistics.
+        """
+        job_dir = self.prepare(job_id, config)
+        command = self.build_command(job_id, job_dir)
+        logger.info(f'Starting LEAN backtest {job_id}: {" ".join(command)}')
+        process = subprocess.Popen(
+            command, cwd=job_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, bufsize=1, start_new_session=True
+        )
+
+        lines = queue.Queue()
+        reader = threading.Thread(target=lambda: [lines.put(line) for line in process.stdout], daemon=True)
+        reader.start()
+
+        tail = []
+        progress = 0.0
+        started = time.monotonic()
+        with open(os.path.join(job_dir, 'lean.log'), 'w') as log_file:
+            while True:
+                deadline = time.monotonic() + self.poll_seconds
+                while time.monotonic() < deadline:
+                    try:
+                        line = lines.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    log_file.write(line)
+                    tail = (tail + [line.rstrip()])[-50:]
+                    match = self.progress_pattern.search(line)
+                    if match:
+                        value = min(float(match.group(1)) / 100, 0.99)
+                        if value > progress:
+                            progress = value
+                            on_progress(progress)
+
+                if on_tick:
+                    on_tick()
+                if process.poll() is not None and lines.empty() and not reader.is_alive():
+                    break
+                if should_cancel():
+                    self._stop(process, job_id)
+                    raise JobCancelled()
+                if time.monotonic() - started > self.timeout_seconds:
+                    self._stop(process, job_id)
+                    raise RuntimeError(f'LEAN run exceeded {self.timeout_seconds}s')
+
+        if process.returncode != 0:
+            raise RuntimeError(f'LEAN exited with code {process.returncode}: {tail[-1] if tail else ""}')
+        document = find_result(os.path.join(job_dir, 'results'))
+        if document is None:
+            raise RuntimeError('LEAN finished without writing result statistics')
+        return document, tail
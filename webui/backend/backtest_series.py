@@ -0,0 +1,115 @@
+"""
+LEAN Trading Bot Stack - Krzywe kapitału i dzienniki transakcji backtestów
+Zwarte kolumny binarne zamiast list w JSON, dekodowane tylko na żądanie
+
+A series is a short JSON header followed by one zlib block per column.
+Integer time columns are delta-encoded first, so a regular clock
+compresses to almost nothing. Float columns are byte-shuffled: byte k
+of every value is stored together, which groups the similar sign and
+exponent bytes and lets zlib shrink them. Each column is compressed on
+its own, so a reader decodes only the columns it asks for.
+"""
+
+import json
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'BTSER\x00\x01\x00'
+PREFIX = struct.Struct('<8sI')  # magic, header length
+
+EQUITY_COLUMNS = {'time': np.dtype('<i8'), 'equity': np.dtype('<f8')}
+
+# Times are epoch seconds; direction is 1 (long) or -1 (short); symbol indexes meta['symbols']
+TRADE_COLUMNS = {
+    'entry_time': np.dtype('<i8'),
+    'exit_time': np.dtype('<i8'),
+    'symbol': np.dtype('<i4'),
+    'direction': np.dtype('<i1'),
+    'quantity': np.dtype('<f8'),
+    'entry_price': np.dtype('<f8'),
+    'exit_price': np.dtype('<f8'),
+    'pnl': np.dtype('<f8'),
+    'fees': np.dtype('<f8')
+}
+
+
+def _encode_column(values):
+    if values.dtype.kind == 'i' and len(values):
+        encoding = 'delta'
+        values = np.diff(values, prepend=values.dtype.type(0))
+    elif values.dtype.kind == 'f':
+        encoding = 'shuffle'
+        values = values.view(np.uint8).reshape(-1, values.dtype.itemsize).T
+    else:
+        encoding = 'raw'
+    return encoding, zlib.compress(np.ascontiguousarray(values).tobytes(), 6)
+
+
+def _decode_column(payload, dtype, count, encoding):
+    raw = zlib.decompress(payload)
+    if encoding == 'shuffle':
+        shuffled = np.frombuffer(raw, dtype=np.uint8).reshape(dtype.itemsize, count)
+        return np.ascontiguousarray(shuffled.T).view(dtype).reshape(count)
+    values = np.frombuffer(raw, dtype=dtype, count=count)
+    return np.cumsum(values, dtype=dtype) if encoding == 'delta' else values.copy()
+
+
+def encode_series(columns, dtypes, meta=None):
+    """Bytes of equal-length columns ({name: array}) cast to dtypes"""
+    arrays = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in dtypes.items()}
+    counts = {len(values) for values in arrays.values()}
+    if len(counts) > 1:
+        raise ValueError('Series columns must have equal lengths')
+    count = counts.pop() if counts else 0
+
+    blocks, entries, offset = [], [], 0
+    for name, values in arrays.items():
+        encoding, payload = _encode_column(values)
+        entries.append({
+            'name': name, 'dtype': values.dtype.str, 'encoding': encoding,
+            'offset': offset, 'size': len(payload)
+        })
+        blocks.append(payload)
+        offset += len(payload)
+    header = json.dumps({'count': count, 'columns': entries, 'meta': meta or {}}).encode()
+    return PREFIX.pack(MAGIC, len(header)) + header + b''.join(blocks)
+
+
+def read_header(blob):
+    magic, length = PREFIX.unpack_from(blob, 0)
+    if magic != MAGIC:
+        raise ValueError('Not a backtest series')
+    return json.loads(bytes(blob[PREFIX.size:PREFIX.size + length])), PREFIX.size + length
+
+
+def decode_series(blob, columns=None):
+    """({name: array}, meta) of a series; only the named columns are decompressed"""
+    header, start = read_header(blob)
+    wanted = None if columns is None else set(columns)
+    decoded = {}
+    for entry in header['columns']:
+        if wanted is not None and entry['name'] not in wanted:
+            continue
+        payload = blob[start + entry['offset']:start + entry['offset'] + entry['size']]
+        decoded[entry['name']] = _decode_column(
+            payload, np.dtype(entry['dtype']), header['count'], entry['encoding']
+        )
+    return decoded, header['meta']
+
+
+def encode_equity(times, equity):
+    return encode_series({'time': times, 'equity': equity}, EQUITY_COLUMNS)
+
+
+def encode_trades(trades, symbols=()):
+    """trades has every TRADE_COLUMNS column; symbol holds indexes into symbols"""
+    return encode_series(trades, TRADE_COLUMNS, {'symbols': list(symbols)})
+
+
+def drawdown(equity):
+    """Fraction below the running peak at every point (0 or negative)"""
+    if not len(equity):
+        return equity
+    return equity / np.maximum.accumulate(equity) - 1
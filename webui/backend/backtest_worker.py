@@ -0,0 +1,174 @@
+"""
+LEAN Trading Bot Stack - Worker backtestów LEAN
+Pobiera zadania z kolejki Redis, uruchamia LEAN i zapisuje wyniki w BacktestResult
+
+Run as `python backtest_worker.py`. Each of the BACKTEST_MAX_CONCURRENT
+slot threads takes a host slot, waits for a job, runs LEAN and gives the
+slot back, so several worker processes on one host never run more LEAN
+backtests together than the host allows. SIGTERM stops claiming new
+jobs and lets the running ones finish.
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+from datetime import datetime
+
+from app import BacktestResult, app, backtest_queue, db, redis_client
+from backtest_jobs import (
+    CANCELLED, FAILED, SUCCEEDED,
+    HostSlots, JobCancelled, LeanRunner, parse_equity, parse_statistics, parse_trades, result_statistics
+)
+from backtest_series import encode_equity, encode_trades
+
+logger = logging.getLogger('backtest_worker')
+
+
+class BacktestWorker:
+    def __init__(self, job_queue, slots, runner, concurrency):
+        self.queue = job_queue
+        self.slots = slots
+        self.runner = runner
+        self.concurrency = concurrency
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.stopping = threading.Event()
+
+    def store_result(self, job, document):
+        config = job['config']
+        statistics = result_statistics(document)
+        metrics = parse_statistics(statistics, config['initial_capital'])
+        # The curve and the trades go to their own binary columns, not into results_json
+        equity = parse_equity(document)
+        trades = parse_trades(document)
+        with app.app_context():
+            row = BacktestResult(
+                user_id=job['user_id'],
+                strategy_id=job['strategy_id'],
+                start_date=datetime.fromisoformat(config['start_date']),
+                end_date=datetime.fromisoformat(config['end_date']),
+                initial_capital=config['initial_capital'],
+                final_capital=metrics['final_capital'],
+                total_return=metrics['total_return'],
+                sharpe_ratio=metrics['sharpe_ratio'],
+                max_drawdown=metrics['max_drawdown'],
+                trade_count=len(trades[0]['pnl']) if trades else metrics['trades'],
+                equity_curve=encode_equity(*equity) if equity else None,
+                trade_log=encode_trades(*trades) if trades else None,
+                results_json={
+                    'engine': 'lean',
+                    'job_id': job['job_id'],
+                    **metrics,
+                    'statistics': statistics
+                }
+            )
+            db.session.add(row)
+            db.session.commit()
+            return row.id, metrics
+
+    def run_job(self, job_id, holder):
+        job = self.queue.get(job_id)
+        last_progress = [0.0]
+
+        def on_progress(progress):
+            # A few hundred progress lines must not become as many Redis writes
+            if progress - last_progress[0] >= 0.01:
+                last_progress[0] = progress
+                self.queue.update(job_id, progress=round(progress, 4))
+
+        def on_tick():
+            self.queue.heartbeat(job_id)
+            self.slots.renew(holder)
+
+        try:
+            document, log_tail = self.runner.run(
+                job_id, job['config'], on_progress,
+                should_cancel=lambda: self.queue.cancel_requested(job_id),
+                on_tick=on_tick
+            )
+            result_id, metrics = self.store_result(job, document)
+        except JobCancelled:
+            logger.info(f'Backtest job {job_id} cancelled')
+            self.queue.finish(job_id, CANCELLED)
+        except Exception as e:
+            logger.error(f'Backtest job {job_id} failed: {e}')
+            self.queue.finish(job_id, FAILED, error=str(e))
+        else:
+            logger.info(f'Backtest job {job_id} finished, result {result_id}')
+            self.queue.finish(job_id, SUCCEEDED, result_id=result_id, result=metrics, log_tail=log_tail)
+
+    def slot_loop(self, index):
+        holder = f'{self.worker_id}:{index}'
+        while not self.stopping.is_set():
+            if not self.slots.acquire(holder):
+                self.stopping.wait(1.0)
+                continue
+            try:
+                job_id = self.queue.claim(self.worker_id, timeout=5)
+                if job_id is not None:
+                    self.run_job(job_id, holder)
+            except Exception as e:
+                logger.error(f'Backtest slot {holder} error: {e}')
+                self.stopping.wait(1.0)
+            finally:
+                self.slots.release(holder)
+
+    def reap_loop(self):
+        while not self.stopping.wait(self.queue.heartbeat_seconds):
+            try:
+                self.queue.requeue_orphaned()
+                self.queue.fail_abandoned()
+            except Exception as e:
+                logger.warning(f'Could not check for abandoned backtests: {e}')
+
+    def run(self):
+        self.queue.requeue_orphaned()
+        self.queue.fail_abandoned()
+        threads = [
+            threading.Thread(target=self.slot_loop, args=(index,), name=f'backtest-slot-{index}')
+            for index in range(self.concurrency)
+        ]
+        threads.append(threading.Thread(target=self.reap_loop, name='backtest-reaper', daemon=True))
+        for thread in threads:
+            thread.start()
+        logger.info(
+            f'Backtest worker {self.worker_id}: {self.concurrency} slots, '
+            f'host limit {self.slots.capacity} on {self.slots.host}'
+        )
+        for thread in threads[:-1]:
+            thread.join()
+
+    def stop(self, *_):
+        logger.info('Stopping after the running backtests finish')
+        self.stopping.set()
+
+
+def main():
+    capacity = int(os.getenv('BACKTEST_MAX_CONCURRENT', '2'))
+    jobs_path = os.getenv('LEAN_JOBS_PATH', 'backtests')
+    runner = LeanRunner(
+        jobs_path=jobs_path,
+        data_path=os.getenv('LEAN_DATA_PATH', 'data'),
+        command=os.getenv('LEAN_BACKTEST_COMMAND') or None,
+        host_jobs_path=os.getenv('LEAN_HOST_JOBS_PATH') or None,
+        host_data_path=os.getenv('LEAN_HOST_DATA_PATH') or None,
+        container_job_dir=os.getenv('LEAN_CONTAINER_JOB_DIR', '/Job'),
+        container_data_dir=os.getenv('LEAN_CONTAINER_DATA_DIR', '/Lean/Data'),
+        timeout_seconds=int(os.getenv('BACKTEST_TIMEOUT_SECONDS', '3600')),
+        stop_command=os.getenv('LEAN_STOP_COMMAND') or None,
+        kill_command=os.getenv('LEAN_KILL_COMMAND') or None,
+        grace_seconds=int(os.getenv('LEAN_STOP_GRACE_SECONDS', '10'))
+    )
+    os.makedirs(jobs_path, exist_ok=True)
+    # One host name for every worker container that shares a Docker daemon
+    slots = HostSlots(redis_client, capacity, host=os.getenv('BACKTEST_HOST_ID') or None)
+    worker = BacktestWorker(backtest_queue, slots, runner, concurrency=capacity)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
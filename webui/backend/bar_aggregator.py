@@ -0,0 +1,333 @@
+"""
+LEAN Trading Bot Stack - Agregacja ticków do świec
+Przyrostowe świece kilku interwałów naraz, z oknem na spóźnione ticki
+
+Ticks arrive in batches per symbol (time in epoch seconds, price, size).
+Each symbol keeps, per resolution, a small array of bar slots: start,
+first and last tick time, OHLC, volume, tick count and state. A batch
+is grouped into periods with array operations and merged into those
+slots. No history is ever re-aggregated.
+
+Time is event time. A symbol's watermark is the newest tick time it has
+seen. A bar is emitted once the watermark passes its end. It then stays
+revisable for late_seconds: a late tick updates it and it is emitted
+again (the bar store replaces bars by time). Ticks older than
+watermark - late_seconds are dropped and counted.
+
+A quiet symbol's bars still have to close on time, so the wall clock
+moves the watermark forward, but only for live symbols: those whose
+newest tick was within live_lag_seconds of its arrival. A backfilled
+symbol keeps its own event time and its last bars close when later
+ticks arrive.
+
+Run as `python bar_aggregator.py` to consume the Redis stream that
+POST /api/market-data/ticks writes to. Bars go to the bar store and to
+Redis (latest bar per symbol plus a pub/sub message).
+"""
+
+import json
+import logging
+import math
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+
+from bar_store import RESOLUTIONS
+
+logger = logging.getLogger(__name__)
+
+# Slot columns
+START, FIRST, LAST, OPEN, HIGH, LOW, CLOSE, VOLUME, TICKS, STATE = range(10)
+EMPTY, OPEN_BAR, EMITTED, REVISED = 0, 1, 2, 3
+
+TICK_STREAM = 'market:ticks'
+
+
+class SymbolBars:
+    """Open bars of one symbol for every resolution"""
+
+    def __init__(self, resolutions, late_seconds):
+        self.watermark = -math.inf
+        # Arrival time minus the newest tick time of the last batch
+        self.lag = math.inf
+        self.slots = {
+            resolution: np.zeros((int(late_seconds // seconds) + 2, 10))
+            for resolution, seconds in resolutions.items()
+        }
+
+
+class BarAggregator:
+    def __init__(self, resolutions=('1m', '1h', '1d'), late_seconds=5.0, emit=None, min_emit_start=None,
+                 live_lag_seconds=60.0):
+        unknown = [resolution for resolution in resolutions if resolution not in RESOLUTIONS]
+        if unknown:
+            raise ValueError(f"Unknown resolutions: {', '.join(unknown)}")
+        self.resolutions = {resolution: RESOLUTIONS[resolution] for resolution in resolutions}
+        self.late_seconds = late_seconds
+        self.live_lag_seconds = live_lag_seconds
+        self.emit = emit or (lambda symbol, resolution, bars: None)
+        # After a restart, bars older than the replayed ticks are already stored complete
+        self.min_emit_start = min_emit_start
+        self.symbols = {}
+        self.ticks_accepted = 0
+        self.ticks_dropped = 0
+
+    def add_ticks(self, symbol, times, prices, sizes, arrived_at=None):
+        """Aggregate one batch of a symbol's ticks and emit the bars it closed or revised
+
+        arrived_at is when the batch was received (epoch seconds; now by
+        default); it decides whether the symbol is live.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        prices = np.asarray(prices, dtype=np.float64)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        if not len(times):
+            return
+        state = self.symbols.get(symbol)
+        if state is None:
+            state = self.symbols[symbol] = SymbolBars(self.resolutions, self.late_seconds)
+
+        accepted = times >= state.watermark - self.late_seconds
+        if not accepted.all():
+            self.ticks_dropped += int((~accepted).sum())
+            times, prices, sizes = times[accepted], prices[accepted], sizes[accepted]
+            if not len(times):
+                return
+        if np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind='stable')
+            times, prices, sizes = times[order], prices[order], sizes[order]
+        self.ticks_accepted += len(times)
+        state.watermark = max(state.watermark, times[-1])
+        state.lag = (time.time() if arrived_at is None else arrived_at) - state.watermark
+
+        evicted = {
+            resolution: self._merge(state.slots[resolution], seconds, times, prices, sizes)
+            for resolution, seconds in self.resolutions.items()
+        }
+        self._emit_closed(symbol, state, evicted)
+
+    @staticmethod
+    def _merge(slots, seconds, times, prices, sizes):
+        """Merge sorted ticks into the slots; returns unemitted bars pushed out of them
+
+        Bars are pushed out only when one batch spans more periods than
+        there are slots (a backfill); those bars are closed already.
+        """
+        evicted = []
+        starts = np.floor(times / seconds) * seconds
+        first = np.concatenate(([0], np.flatnonzero(np.diff(starts)) + 1))
+        last = np.concatenate((first[1:] - 1, [len(times) - 1]))
+        highs = np.maximum.reduceat(prices, first)
+        lows = np.minimum.reduceat(prices, first)
+        volumes = np.add.reduceat(sizes, first)
+
+        # A batch spans only a few periods, so this loop is short
+        for group in range(len(first)):
+            start = starts[first[group]]
+            row = slots[int(start // seconds) % len(slots)]
+            if row[STATE] == EMPTY or row[START] != start:
+                if row[STATE] in (OPEN_BAR, REVISED):
+                    evicted.append(row.copy())
+                row[:] = (
+                    start, times[first[group]], times[last[group]], prices[first[group]], highs[group],
+                    lows[group], prices[last[group]], volumes[group], last[group] - first[group] + 1, OPEN_BAR
+                )
+                continue
+            if times[first[group]] < row[FIRST]:
+                row[FIRST], row[OPEN] = times[first[group]], prices[first[group]]
+            if times[last[group]] >= row[LAST]:
+                row[LAST], row[CLOSE] = times[last[group]], prices[last[group]]
+            row[HIGH] = max(row[HIGH], highs[group])
+            row[LOW] = min(row[LOW], lows[group])
+            row[VOLUME] += volumes[group]
+            row[TICKS] += last[group] - first[group] + 1
+            if row[STATE] == EMITTED:
+                row[STATE] = REVISED
+        return evicted
+
+    def _emit_closed(self, symbol, state, evicted=None):
+        for resolution, seconds in self.resolutions.items():
+            slots = state.slots[resolution]
+            ends = slots[:, START] + seconds
+            live = slots[:, STATE] != EMPTY
+            due = live & (ends <= state.watermark) & (slots[:, STATE] != EMITTED)
+            rows = slots[due]
+            if evicted and evicted[resolution]:
+                rows = np.concatenate((np.stack(evicted[resolution]), rows))
+            if self.min_emit_start is not None:
+                rows = rows[rows[:, START] >= self.min_emit_start]
+            if len(rows):
+                rows = rows[np.argsort(rows[:, START])]
+                self.emit(symbol, resolution, {
+                    'time': rows[:, START].astype(np.int64),
+                    'open': rows[:, OPEN],
+                    'high': rows[:, HIGH],
+                    'low': rows[:, LOW],
+                    'close': rows[:, CLOSE],
+                    'volume': rows[:, VOLUME],
+                    'ticks': rows[:, TICKS].astype(np.int64)
+                })
+            slots[due, STATE] = EMITTED
+            # Past the late window a bar can no longer change
+            slots[live & (ends + self.late_seconds <= state.watermark), STATE] = EMPTY
+
+    def live_symbols(self):
+        return [symbol for symbol, state in self.symbols.items() if state.lag <= self.live_lag_seconds]
+
+    def advance(self, now):
+        """Move live symbols' watermarks up to now, closing bars of those without new ticks
+
+        Backfilled symbols are left alone: moving them to the wall clock
+        would drop the rest of their history as late.
+        """
+        for symbol, state in self.symbols.items():
+            if state.lag <= self.live_lag_seconds and now > state.watermark:
+                state.watermark = now
+                self._emit_closed(symbol, state)
+
+    def oldest_open_start(self):
+        """Start of the oldest bar that can still change, or None"""
+        oldest = None
+        for state in self.symbols.values():
+            for slots in state.slots.values():
+                live = slots[slots[:, STATE] != EMPTY, START]
+                if len(live):
+                    oldest = live.min() if oldest is None else min(oldest, live.min())
+        return oldest
+
+
+# Stream transport: compact float64 arrays instead of one message per tick
+
+def encode_ticks(times, prices, sizes):
+    return np.stack([
+        np.asarray(times, dtype=np.float64),
+        np.asarray(prices, dtype=np.float64),
+        np.asarray(sizes, dtype=np.float64)
+    ]).tobytes()
+
+
+def decode_ticks(payload):
+    times, prices, sizes = np.frombuffer(payload, dtype=np.float64).reshape(3, -1)
+    return times, prices, sizes
+
+
+def publish_ticks(redis_client, symbol, times, prices, sizes, maxlen=5_000_000):
+    """Queue a tick batch for the aggregator process"""
+    return redis_client.xadd(
+        TICK_STREAM, {'symbol': symbol, 'ticks': encode_ticks(times, prices, sizes)},
+        maxlen=maxlen, approximate=True
+    )
+
+
+class StreamConsumer:
+    """Feeds the tick stream into an aggregator; bars go to the bar store and Redis
+
+    The checkpoint is the stream id from which a restart has to replay
+    to rebuild every bar that can still change. Older entries are
+    trimmed from the stream.
+    """
+
+    checkpoint_key = 'market:ticks:checkpoint'
+    stats_key = 'market:ticks:stats'
+    latest_key = 'market:bars:latest'
+    channel = 'market:bars:updates'
+
+    def __init__(self, redis_client, bar_store, resolutions, late_seconds, batch=1000, block_ms=1000,
+                 live_lag_seconds=60.0):
+        self.redis = redis_client
+        self.bar_store = bar_store
+        self.batch = batch
+        self.block_ms = block_ms
+        self.stopping = threading.Event()
+
+        checkpoint = self.redis.get(self.checkpoint_key)
+        checkpoint = json.loads(checkpoint) if checkpoint else {}
+        self.last_id = checkpoint.get('replay_from', '0-0')
+        # Replayed ticks rebuild every bar from min_emit_start on; older ones are stored complete
+        min_emit_start = checkpoint.get('min_emit_start')
+        self.aggregator = BarAggregator(
+            resolutions, late_seconds, self.store_bars, min_emit_start, live_lag_seconds
+        )
+
+    def store_bars(self, symbol, resolution, bars):
+        try:
+            self.bar_store.append(symbol, resolution, bars)
+        except ValueError as e:
+            logger.error(f'Could not store {resolution} bars of {symbol}: {e}')
+        latest = {name: values[-1].item() for name, values in bars.items()}
+        message = json.dumps({'symbol': symbol, 'resolution': resolution, **latest})
+        pipe = self.redis.pipeline()
+        pipe.hset(f'{self.latest_key}:{resolution}', symbol, message)
+        pipe.publish(self.channel, message)
+        pipe.execute()
+
+    @staticmethod
+    def _id_key(stream_id):
+        return tuple(int(part) for part in stream_id.split('-'))
+
+    def checkpoint(self):
+        aggregator = self.aggregator
+        guard = aggregator.oldest_open_start()
+        if guard is None and aggregator.symbols:
+            # Nothing open: every bar that started before this is final
+            guard = min(state.watermark for state in aggregator.symbols.values()) - aggregator.late_seconds
+        replay_from = self.last_id
+        if guard is not None:
+            # Stream ids are arrival times in ms; every tick of a bar from guard on arrived after it
+            replay_ms = max(int((guard - aggregator.late_seconds - 60) * 1000), 0)
+            replay_from = min(replay_from, f'{replay_ms}-0', key=self._id_key)
+        self.redis.set(self.checkpoint_key, json.dumps({'replay_from': replay_from, 'min_emit_start': guard}))
+        self.redis.xtrim(TICK_STREAM, minid=replay_from, approximate=True)
+        self.redis.hset(self.stats_key, mapping={
+            'ticks_accepted': aggregator.ticks_accepted,
+            'ticks_dropped': aggregator.ticks_dropped,
+            'symbols': len(aggregator.symbols),
+            'live_symbols': len(aggregator.live_symbols()),
+            'updated_at': time.time()
+        })
+
+    def run(self, checkpoint_seconds=5.0):
+        last_checkpoint = time.monotonic()
+        while not self.stopping.is_set():
+            entries = self.redis.xread({TICK_STREAM: self.last_id}, count=self.batch, block=self.block_ms)
+            for _, messages in entries or ():
+                for message_id, fields in messages:
+                    message_id = message_id.decode() if isinstance(message_id, bytes) else message_id
+                    symbol = fields[b'symbol'].decode()
+                    # The stream id is the arrival time in ms, which holds on replay too
+                    arrived_at = int(message_id.split('-')[0]) / 1000
+                    self.aggregator.add_ticks(symbol, *decode_ticks(fields[b'ticks']), arrived_at=arrived_at)
+                    self.last_id = message_id
+            caught_up = not entries or sum(len(messages) for _, messages in entries) < self.batch
+            if caught_up:
+                # Quiet symbols still need their bars closed on time
+                self.aggregator.advance(time.time() - self.aggregator.late_seconds)
+            if time.monotonic() - last_checkpoint >= checkpoint_seconds:
+                self.checkpoint()
+                last_checkpoint = time.monotonic()
+        self.checkpoint()
+
+    def stop(self, *_):
+        self.stopping.set()
+
+
+def main():
+    from app import bar_store, redis_client
+
+    consumer = StreamConsumer(
+        redis_client, bar_store,
+        resolutions=tuple(os.getenv('BAR_RESOLUTIONS', '1m,5m,1h,1d').split(',')),
+        late_seconds=float(os.getenv('BAR_LATE_SECONDS', '5')),
+        live_lag_seconds=float(os.getenv('BAR_LIVE_LAG_SECONDS', '60'))
+    )
+    signal.signal(signal.SIGTERM, consumer.stop)
+    signal.signal(signal.SIGINT, consumer.stop)
+    logger.info(f'Aggregating ticks from {consumer.last_id} into {", ".join(consumer.aggregator.resolutions)} bars')
+    consumer.run()
+
+
+if __name__ == '__main__':
+    main()
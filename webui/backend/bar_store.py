@@ -0,0 +1,253 @@
+"""
+LEAN Trading Bot Stack - Magazyn świec OHLCV
+Kolumnowe pliki mapowane w pamięci: jeden plik na symbol i interwał
+
+Each file is a 64-byte header followed by six column blocks of equal
+capacity: time (int64 epoch seconds, strictly increasing), open, high,
+low, close and volume (float64). Readers map the file and binary-search
+the time column, so a range query touches only the pages of the slice
+it returns. Writers append in place while capacity lasts. After that the
+file is rewritten at double the capacity and renamed over the old one,
+so a reader never sees a half-grown file. The header's count is written
+last, which means readers only ever see whole bars. Writers of one
+series are serialized with a lock file.
+"""
+
+import fcntl
+import mmap
+import os
+import re
+import struct
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+MAGIC = b'OHLCV\x00\x01\x00'
+HEADER = struct.Struct('<8sqq40x')  # magic, count, capacity
+COLUMNS = ('time', 'open', 'high', 'low', 'close', 'volume')
+DTYPES = {'time': np.dtype('<i8'), **{name: np.dtype('<f8') for name in COLUMNS[1:]}}
+INITIAL_CAPACITY = 4096
+
+RESOLUTIONS = {
+    '1s': 1, '1m': 60, '5m': 300, '15m': 900, '30m': 1800,
+    '1h': 3600, '4h': 14400, '1d': 86400
+}
+
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9][A-Z0-9._-]{0,19}$')
+
+
+def _offsets(capacity):
+    return {name: HEADER.size + index * capacity * 8 for index, name in enumerate(COLUMNS)}
+
+
+class BarStore:
+    """Bars of every symbol and resolution under one root directory"""
+
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}
+        self._maps_lock = threading.Lock()
+
+    def path(self, symbol, resolution):
+        if not SYMBOL_PATTERN.match(symbol):
+            raise ValueError(f'Invalid symbol: {symbol}')
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}; available: {', '.join(RESOLUTIONS)}")
+        return os.path.join(self.root, symbol, f'{resolution}.bars')
+
+    @contextmanager
+    def _write_lock(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _map(self, path):
+        """Read-only map of the current file, re-opened when a writer replaced it"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_size)
+        with self._maps_lock:
+            cached = self._maps.get(path)
+            if cached and cached[0] == key:
+                return cached[1]
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # The old map stays valid for readers still holding it; it closes when they drop it
+            self._maps[path] = (key, mapped)
+            return mapped
+
+    @staticmethod
+    def _columns(buffer, count, capacity):
+        offsets = _offsets(capacity)
+        return {
+            name: np.frombuffer(buffer, dtype=DTYPES[name], count=count, offset=offsets[name])
+            for name in COLUMNS
+        }
+
+    @staticmethod
+    def _header(buffer):
+        magic, count, capacity = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a bar store file')
+        return count, capacity
+
+    def count(self, symbol, resolution):
+        mapped = self._map(self.path(symbol, resolution))
+        return 0 if mapped is None else self._header(mapped)[0]
+
+    def read(self, symbol, resolution, start=None, end=None, columns=COLUMNS):
+        """Copies of the bars with start <= time <= end (epoch seconds)"""
+        mapped = self._map(self.path(symbol, resolution))
+        if mapped is None:
+            return {name: np.empty(0, dtype=DTYPES[name]) for name in columns}
+        count, capacity = self._header(mapped)
+        data = self._columns(mapped, count, capacity)
+        times = data['time']
+        first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        last = count if end is None else int(np.searchsorted(times, end, side='right'))
+        return {name: data[name][first:last].copy() for name in columns}
+
+    def _grow(self, path, data, count, capacity):
+        """Rewrite the series with room for capacity bars and swap it in atomically"""
+        temporary = f'{path}.{os.getpid()}.tmp'
+        offsets = _offsets(capacity)
+        with open(temporary, 'wb') as f:
+            f.truncate(HEADER.size + len(COLUMNS) * capacity * 8)
+            f.write(HEADER.pack(MAGIC, count, capacity))
+            for name in COLUMNS:
+                f.seek(offsets[name])
+                f.write(np.ascontiguousarray(data[name][:count], dtype=DTYPES[name]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    def append(self, symbol, resolution, bars):
+        """Add bars, or replace bars whose time is already stored
+
+        bars is a dict of equal-length arrays with every column. New
+        bars must come after the last stored one; a bar for an existing
+        time overwrites it (e.g. a bar revised by late ticks). Returns
+        (added, replaced).
+        """
+        times = np.asarray(bars['time'], dtype=np.int64)
+        if len(times) == 0:
+            return 0, 0
+        if np.any(np.diff(times) <= 0):
+            raise ValueError('Bar times must be strictly increasing')
+        incoming = {name: np.asarray(bars[name], dtype=DTYPES[name]) for name in COLUMNS}
+        path = self.path(symbol, resolution)
+
+        with self._write_lock(path):
+            if not os.path.exists(path):
+                self._grow(path, {name: incoming[name][:0] for name in COLUMNS}, 0,
+                           max(INITIAL_CAPACITY, len(times)))
+            with open(path, 'r+b') as f:
+                mapped = mmap.mmap(f.fileno(), 0)
+            try:
+                added, replaced, grown = self._write(mapped, times, incoming)
+            finally:
+                # The column views are gone once _write returns, so the map can close
+                mapped.flush()
+                mapped.close()
+            if grown is not None:
+                self._grow(path, *grown)
+            return added, replaced
+
+    def _write(self, mapped, times, incoming):
+        """Replace and append in the mapped file; returns (added, replaced, grow arguments or None)"""
+        count, capacity = self._header(mapped)
+        stored = self._writable_columns(mapped, capacity)
+        new = times > stored['time'][count - 1] if count else np.ones(len(times), dtype=bool)
+        existing = ~new
+        if existing.any():
+            positions = np.minimum(np.searchsorted(stored['time'][:count], times[existing]), count - 1)
+            if np.any(stored['time'][positions] != times[existing]):
+                raise ValueError('Bars can only be appended or replace stored bars; '
+                                 'inserting before the last bar is not supported')
+            for name in COLUMNS[1:]:
+                stored[name][positions] = incoming[name][existing]
+
+        added = int(new.sum())
+        if count + added > capacity:
+            merged = {name: np.concatenate((stored[name][:count], incoming[name][new])) for name in COLUMNS}
+            return added, int(existing.sum()), (merged, count + added, max(capacity * 2, count + added))
+        if added:
+            for name in COLUMNS:
+                stored[name][count:count + added] = incoming[name][new]
+            # Publish the bars only after they are written
+            HEADER.pack_into(mapped, 0, MAGIC, count + added, capacity)
+        return added, int(existing.sum()), None
+
+    @staticmethod
+    def _writable_columns(mapped, capacity):
+        offsets = _offsets(capacity)
+        return {
+            name: np.ndarray((capacity,), dtype=DTYPES[name], buffer=mapped, offset=offsets[name])
+            for name in COLUMNS
+        }
+
+
+# Downsampling to a target number of points
+
+def downsample_ohlc(bars, max_points):
+    """Merge runs of consecutive bars so at most max_points remain"""
+    count = len(bars['time'])
+    if count <= max_points:
+        return bars
+    size = -(-count // max_points)
+    starts = np.arange(0, count, size)
+    ends = np.minimum(starts + size, count) - 1
+    merged = {'time': bars['time'][starts]}
+    if 'open' in bars:
+        merged['open'] = bars['open'][starts]
+    if 'high' in bars:
+        merged['high'] = np.maximum.reduceat(bars['high'], starts)
+    if 'low' in bars:
+        merged['low'] = np.minimum.reduceat(bars['low'], starts)
+    if 'close' in bars:
+        merged['close'] = bars['close'][ends]
+    if 'volume' in bars:
+        merged['volume'] = np.add.reduceat(bars['volume'], starts)
+    return merged
+
+
+def lttb(times, values, max_points):
+    """Indices picked by Largest-Triangle-Three-Buckets, keeping the curve's shape"""
+    count = len(values)
+    if count <= max_points or max_points < 3:
+        return np.arange(count)
+    x = times.astype(np.float64)
+    y = values.astype(np.float64)
+    edges = np.linspace(1, count - 1, max_points - 1).astype(np.int64)
+    picked = np.empty(max_points, dtype=np.int64)
+    picked[0], picked[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        following_end = edges[bucket + 2] if bucket + 2 < len(edges) else count
+        # The next bucket is represented by its average point
+        next_x = x[end:following_end].mean()
+        next_y = y[end:following_end].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        picked[bucket + 1] = previous
+    return picked
+
+
+def downsample(bars, max_points, method='ohlc', value='close'):
+    if method == 'ohlc':
+        return downsample_ohlc(bars, max_points)
+    if method == 'lttb':
+        index = lttb(bars['time'], bars[value], max_points)
+        return {name: values[index] for name, values in bars.items()}
+    raise ValueError("method must be 'ohlc' or 'lttb'")
@@ -0,0 +1,209 @@
+"""
+LEAN Trading Bot Stack - Stan połączeń z brokerami
+Sprawdzanie w tle, równolegle i z cache w Redis zamiast pingowania przy każdym zapytaniu
+
+A check pings the broker's public status endpoint, so it depends on the
+broker and environment, not on the user's credentials. Every connection
+to Binance demo shares one check. Results go into one Redis hash,
+together with the time they were taken. GET /api/brokers reads them in
+a single round trip. One process at a time (the holder of a Redis lock)
+re-checks every broker in use on a schedule. Each broker gets its own
+keep-alive HTTP session, and checks run on a bounded thread pool, so a
+refresh costs the slowest broker's round trip rather than the sum of
+all of them.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Public, unauthenticated status endpoints: {broker: {environment: url}}
+HEALTH_ENDPOINTS = {
+    'binance': {
+        'live': 'https://api.binance.com/api/v3/ping',
+        'demo': 'https://testnet.binance.vision/api/v3/ping'
+    },
+    'bybit': {
+        'live': 'https://api.bybit.com/v5/market/time',
+        'demo': 'https://api-testnet.bybit.com/v5/market/time'
+    },
+    'kraken': {'live': 'https://api.kraken.com/0/public/SystemStatus'},
+    'coinbase': {
+        'live': 'https://api.exchange.coinbase.com/time',
+        'demo': 'https://api-public.sandbox.exchange.coinbase.com/time'
+    },
+    'okx': {'live': 'https://www.okx.com/api/v5/public/time'},
+    'kucoin': {'live': 'https://api.kucoin.com/api/v1/timestamp'},
+    'bitfinex': {'live': 'https://api-pub.bitfinex.com/v2/platform/status'}
+}
+
+
+def endpoint_for(broker_name, environment, overrides=None):
+    """Status URL of a broker, or None when there is nothing to ping"""
+    endpoints = {**HEALTH_ENDPOINTS, **(overrides or {})}.get(broker_name.lower())
+    if not endpoints:
+        return None
+    return endpoints.get(environment) or endpoints.get('live')
+
+
+class BrokerHealthChecker:
+    key = 'broker:health'
+    lock_key = 'broker:health:scheduler'
+
+    def __init__(self, redis_client, concurrency=8, timeout_seconds=5.0, interval_seconds=60.0,
+                 slow_ms=2000.0, endpoint_overrides=None):
+        self.redis = redis_client
+        self.timeout_seconds = timeout_seconds
+        self.interval_seconds = interval_seconds
+        self.slow_ms = slow_ms
+        self.endpoint_overrides = endpoint_overrides or {}
+        self.node_id = uuid.uuid4().hex
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='broker-health')
+        self._pool_size = concurrency
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    @staticmethod
+    def target_key(broker_name, environment):
+        return f'{broker_name.lower()}:{environment}'
+
+    def _session(self, broker_name):
+        """One pooled keep-alive session per broker"""
+        with self._sessions_lock:
+            session = self._sessions.get(broker_name)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[broker_name] = session
+            return session
+
+    def _check(self, broker_name, environment):
+        url = endpoint_for(broker_name, environment, self.endpoint_overrides)
+        result = {'checked_at': datetime.now(timezone.utc).isoformat(), 'checked_ts': time.time()}
+        if url is None:
+            # No public endpoint (e.g. MT4/MT5 brokers behind the bridge): nothing to measure
+            return {**result, 'status': 'unchecked', 'latency_ms': None}
+        started = time.perf_counter()
+        try:
+            response = self._session(broker_name.lower()).get(url, timeout=self.timeout_seconds)
+            latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            if response.status_code >= 500:
+                status = 'error'
+            elif response.status_code >= 400 or latency_ms > self.slow_ms:
+                status = 'degraded'
+            else:
+                status = 'connected'
+            return {**result, 'status': status, 'latency_ms': latency_ms, 'http_status': response.status_code}
+        except requests.RequestException as e:
+            return {**result, 'status': 'error', 'latency_ms': None, 'error': type(e).__name__}
+
+    def _check_and_store(self, broker_name, environment):
+        key = self.target_key(broker_name, environment)
+        try:
+            result = self._check(broker_name, environment)
+            self.redis.hset(self.key, key, json.dumps(result))
+            return result
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.pop(key, None)
+
+    def submit(self, broker_name, environment):
+        """Check in the background; a target already being checked is not checked twice"""
+        key = self.target_key(broker_name, environment)
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._executor.submit(self._check_and_store, broker_name, environment)
+                self._in_flight[key] = future
+            return future
+
+    def check_all(self, targets):
+        """Check (broker, environment) targets concurrently; returns {target key: result}"""
+        targets = set(targets)
+        futures = {self.target_key(*target): self.submit(*target) for target in targets}
+        wait(futures.values(), timeout=self.timeout_seconds + 1)
+        unfinished = [target for target in targets if not futures[self.target_key(*target)].done()]
+        results = self.cached(unfinished)
+        for key, future in futures.items():
+            if future.done():
+                results[key] = future.result()
+        return results
+
+    def cached(self, targets):
+        """Stored results of targets in one round trip; stale or missing ones are re-checked in the background"""
+        targets = {self.target_key(*target): target for target in targets}
+        if not targets:
+            return {}
+        keys = list(targets)
+        values = self.redis.hmget(self.key, keys)
+        results = {}
+        now = time.time()
+        for key, value in zip(keys, values):
+            result = json.loads(value) if value else None
+            if result is None or now - result['checked_ts'] > self.interval_seconds * 3:
+                # The scheduler is behind or never saw this broker; answer now, check meanwhile
+                self.submit(*targets[key])
+            results[key] = result or {'status': 'unknown', 'checked_at': None, 'latency_ms': None}
+        return results
+
+    # Schedule
+
+    def _is_leader(self):
+        ttl = max(int(self.interval_seconds * 2), 10)
+        if self.redis.set(self.lock_key, self.node_id, nx=True, ex=ttl):
+            return True
+        holder = self.redis.get(self.lock_key)
+        if holder is not None and (holder.decode() if isinstance(holder, bytes) else holder) == self.node_id:
+            self.redis.expire(self.lock_key, ttl)
+            return True
+        return False
+
+    def _schedule_loop(self, list_targets):
+        while not self._stopping.is_set():
+            try:
+                if self._is_leader():
+                    self.check_all(list_targets())
+            except Exception as e:
+                logger.warning(f'Scheduled broker health check failed: {e}')
+            self._stopping.wait(self.interval_seconds)
+
+    def start(self, list_targets):
+        """Start the scheduled checks of this process; list_targets returns the (broker, environment) pairs in use"""
+        if self._started:
+            return
+        with self._start_lock:
+            if not self._started:
+                threading.Thread(
+                    target=self._schedule_loop, args=(list_targets,), name='broker-health-scheduler', daemon=True
+                ).start()
+                self._started = True
+
+    def stop(self):
+        self._stopping.set()
+
+
+def create_checker(redis_client):
+    return BrokerHealthChecker(
+        redis_client,
+        concurrency=int(os.getenv('BROKER_HEALTH_CONCURRENCY', '8')),
+        timeout_seconds=float(os.getenv('BROKER_CONNECTION_TIMEOUT', '10')),
+        interval_seconds=float(os.getenv('BROKER_HEALTH_INTERVAL_SECONDS', '60')),
+        endpoint_overrides=json.loads(os.getenv('BROKER_HEALTH_ENDPOINTS') or '{}')
+    )
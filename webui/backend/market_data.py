@@ -0,0 +1,258 @@
+"""
+LEAN Trading Bot Stack - Dane rynkowe
+Jedno odpytanie źródła na symbol, ostatnie notowania w Redis, rozsyłanie przez pub/sub
+
+Clients never reach the upstream feed themselves. They register
+interest in symbols and read quotes from one Redis hash. One poller in
+the whole deployment (the holder of a Redis lock) fetches the symbols
+somebody is interested in, once per interval, writes them to the hash
+and publishes them on a channel. Every backend process keeps a single
+subscription to that channel and hands the quotes to its local
+streaming clients. A thousand dashboards watching SPY cost one upstream
+request per interval, not a thousand.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9][A-Z0-9._:/-]{0,19}$')
+
+
+def parse_symbols(text, limit):
+    """Upper-cased, de-duplicated symbols from a comma-separated list"""
+    symbols = list(dict.fromkeys(s.strip().upper() for s in (text or '').split(',') if s.strip()))
+    if not symbols:
+        raise ValueError('symbols is required')
+    if len(symbols) > limit:
+        raise ValueError(f'At most {limit} symbols per request')
+    invalid = [s for s in symbols if not SYMBOL_PATTERN.match(s)]
+    if invalid:
+        raise ValueError(f"Invalid symbols: {', '.join(invalid)}")
+    return symbols
+
+
+class SimulatedFeed:
+    """Stand-in upstream with deterministic prices
+
+    The price of a symbol is a function of the symbol and the clock, so
+    every process (and every test) sees the same quote for the same
+    moment without sharing any state.
+    """
+
+    def __init__(self, step_seconds=1.0):
+        self.step_seconds = step_seconds
+
+    @staticmethod
+    def _seed(symbol):
+        digest = hashlib.sha256(symbol.encode()).digest()
+        return int.from_bytes(digest[:8], 'big')
+
+    def _price(self, symbol, at):
+        seed = self._seed(symbol)
+        base = 20 + seed % 480
+        phase = (seed >> 16) % 1000 / 1000 * 2 * math.pi
+        step = int(at // self.step_seconds)
+        # Slow daily swing plus a small per-step wobble
+        noise = ((self._seed(f'{symbol}:{step}') % 2001) - 1000) / 1000
+        swing = 0.03 * math.sin(at / 86400 * 2 * math.pi + phase)
+        return round(base * (1 + swing + 0.001 * noise), 4)
+
+    def fetch(self, symbols):
+        now = time.time()
+        day_start = now - now % 86400
+        quotes = {}
+        for symbol in symbols:
+            price = self._price(symbol, now)
+            previous_close = self._price(symbol, day_start)
+            change = price - previous_close
+            spread = max(price * 0.0002, 0.01)
+            quotes[symbol] = {
+                'symbol': symbol,
+                'price': price,
+                'bid': round(price - spread / 2, 4),
+                'ask': round(price + spread / 2, 4),
+                'change': round(change, 4),
+                'change_percent': round(change / previous_close * 100, 2),
+                'timestamp': datetime.fromtimestamp(now, timezone.utc).isoformat()
+            }
+        return quotes
+
+
+FEEDS = {
+    'simulated': SimulatedFeed
+}
+
+
+class MarketDataService:
+    """Quote cache, interest tracking, the shared poller and the local fan-out hub"""
+
+    quotes_key = 'market:quotes'
+    interest_key = 'market:interest'
+    channel = 'market:quotes:updates'
+    lock_key = 'market:poller'
+
+    def __init__(self, redis_client, feed, poll_seconds=1.0, interest_seconds=60, client_queue_size=256):
+        self.redis = redis_client
+        self.feed = feed
+        self.poll_seconds = poll_seconds
+        self.interest_seconds = interest_seconds
+        self.client_queue_size = client_queue_size
+        self.node_id = uuid.uuid4().hex
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    # Cache
+
+    def register_interest(self, symbols):
+        expires_at = time.time() + self.interest_seconds
+        self.redis.zadd(self.interest_key, {symbol: expires_at for symbol in symbols})
+
+    def store(self, quotes):
+        if not quotes:
+            return
+        pipe = self.redis.pipeline()
+        pipe.hset(self.quotes_key, mapping={symbol: json.dumps(quote) for symbol, quote in quotes.items()})
+        pipe.publish(self.channel, json.dumps(quotes))
+        pipe.execute()
+
+    def get_quotes(self, symbols):
+        """Latest quotes for symbols in one round trip; fetches the ones never seen yet"""
+        self.start()
+        self.register_interest(symbols)
+        cached = self.redis.hmget(self.quotes_key, symbols)
+        quotes = {symbol: json.loads(value) for symbol, value in zip(symbols, cached) if value}
+        missing = [symbol for symbol in symbols if symbol not in quotes]
+        if missing:
+            # First request for these symbols; later ones are served by the poller
+            fetched = self.feed.fetch(missing)
+            self.store(fetched)
+            quotes.update(fetched)
+        return quotes
+
+    # Shared poller
+
+    def _is_leader(self):
+        """Take or keep the poller lock; only its holder calls the feed"""
+        ttl = max(int(self.poll_seconds * 5), 5)
+        if self.redis.set(self.lock_key, self.node_id, nx=True, ex=ttl):
+            return True
+        holder = self.redis.get(self.lock_key)
+        if holder is not None and (holder.decode() if isinstance(holder, bytes) else holder) == self.node_id:
+            self.redis.expire(self.lock_key, ttl)
+            return True
+        return False
+
+    def poll_once(self):
+        if not self._is_leader():
+            return 0
+        now = time.time()
+        self.redis.zremrangebyscore(self.interest_key, '-inf', now)
+        symbols = [
+            symbol.decode() if isinstance(symbol, bytes) else symbol
+            for symbol in self.redis.zrangebyscore(self.interest_key, now, '+inf')
+        ]
+        if symbols:
+            self.store(self.feed.fetch(symbols))
+        return len(symbols)
+
+    def _poll_loop(self):
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.warning(f'Market data poll failed: {e}')
+            self._stopping.wait(max(0.0, self.poll_seconds - (time.monotonic() - started)))
+
+    # Local fan-out
+
+    def _listen_loop(self):
+        while not self._stopping.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                while not self._stopping.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        self._dispatch(json.loads(message['data']))
+            except redis.RedisError as e:
+                logger.warning(f'Market data subscription lost, reconnecting: {e}')
+                self._stopping.wait(1.0)
+            finally:
+                pubsub.close()
+
+    def _dispatch(self, quotes):
+        with self._clients_lock:
+            clients = list(self._clients.values())
+        for symbols, client_queue in clients:
+            update = {symbol: quote for symbol, quote in quotes.items() if symbol in symbols}
+            if not update:
+                continue
+            try:
+                client_queue.put_nowait(update)
+            except queue.Full:
+                # A stalled client loses its oldest update, not everyone else's latency
+                try:
+                    client_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                client_queue.put_nowait(update)
+
+    def subscribe(self, symbols):
+        """(client id, queue of {symbol: quote} updates) for one streaming client"""
+        self.start()
+        client_id = uuid.uuid4().hex
+        client_queue = queue.Queue(maxsize=self.client_queue_size)
+        with self._clients_lock:
+            self._clients[client_id] = (frozenset(symbols), client_queue)
+        return client_id, client_queue
+
+    def unsubscribe(self, client_id):
+        with self._clients_lock:
+            self._clients.pop(client_id, None)
+
+    def client_count(self):
+        with self._clients_lock:
+            return len(self._clients)
+
+    def start(self):
+        """Start the poller and listener threads of this process on first use"""
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            threading.Thread(target=self._poll_loop, name='market-data-poller', daemon=True).start()
+            threading.Thread(target=self._listen_loop, name='market-data-listener', daemon=True).start()
+            self._started = True
+
+    def stop(self):
+        self._stopping.set()
+
+
+def create_service(redis_client):
+    feed_name = os.getenv('MARKET_DATA_FEED', 'simulated')
+    if feed_name not in FEEDS:
+        raise ValueError(f"Unknown MARKET_DATA_FEED: {feed_name}; available: {', '.join(sorted(FEEDS))}")
+    return MarketDataService(
+        redis_client,
+        FEEDS[feed_name](),
+        poll_seconds=float(os.getenv('MARKET_DATA_POLL_SECONDS', '1')),
+        interest_seconds=int(os.getenv('MARKET_DATA_INTEREST_SECONDS', '60'))
+    )
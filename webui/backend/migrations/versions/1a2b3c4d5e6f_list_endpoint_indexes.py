@@ -0,0 +1,36 @@
+"""Composite indexes for the per-user list endpoints
+
+Revision ID: 1a2b3c4d5e6f
+Revises:
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '1a2b3c4d5e6f'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# Tables are created by db.create_all(), which env.py runs before the revisions
+# (and the app on start); it already adds these indexes on new databases, and
+# if_not_exists makes the upgrade safe on either kind
+INDEXES = (
+    ('ix_broker_connection_user_active', 'broker_connection', ['user_id', 'is_active', 'id']),
+    ('ix_trading_strategy_user', 'trading_strategy', ['user_id', 'id']),
+    ('ix_trading_strategy_user_active', 'trading_strategy', ['user_id', 'is_active', 'id']),
+    ('ix_ml_model_user_active', 'ml_model', ['user_id', 'is_active', 'id']),
+)
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
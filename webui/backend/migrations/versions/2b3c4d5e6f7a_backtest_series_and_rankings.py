@@ -0,0 +1,67 @@
+"""Backtest owner, trade count, binary curve and trade columns, ranking indexes
+
+Revision ID: 2b3c4d5e6f7a
+Revises: 1a2b3c4d5e6f
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b3c4d5e6f7a'
+down_revision = '1a2b3c4d5e6f'
+branch_labels = None
+depends_on = None
+
+
+NEW_COLUMNS = (
+    ('trade_count', sa.Integer),
+    ('equity_curve', sa.LargeBinary),
+    ('trade_log', sa.LargeBinary),
+)
+
+INDEXES = (
+    ('ix_backtest_result_user', ['user_id', 'id']),
+    ('ix_backtest_result_user_sharpe', ['user_id', 'sharpe_ratio', 'id']),
+    ('ix_backtest_result_user_return', ['user_id', 'total_return', 'id']),
+    ('ix_backtest_result_user_drawdown', ['user_id', 'max_drawdown', 'id']),
+    ('ix_backtest_result_strategy', ['strategy_id', 'id']),
+)
+
+
+def upgrade():
+    # Databases created by db.create_all() after this change already have the columns
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('backtest_result')}
+
+    if 'user_id' not in existing:
+        with op.batch_alter_table('backtest_result') as batch_op:
+            batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        # The owner is the owner of the strategy; rankings filter on it without a join
+        op.execute(
+            'UPDATE backtest_result SET user_id = ('
+            'SELECT trading_strategy.user_id FROM trading_strategy '
+            'WHERE trading_strategy.id = backtest_result.strategy_id)'
+        )
+        with op.batch_alter_table('backtest_result') as batch_op:
+            batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.create_foreign_key('fk_backtest_result_user_id_user', 'user', ['user_id'], ['id'])
+
+    missing = [(name, type_) for name, type_ in NEW_COLUMNS if name not in existing]
+    if missing:
+        with op.batch_alter_table('backtest_result') as batch_op:
+            for name, type_ in missing:
+                batch_op.add_column(sa.Column(name, type_(), nullable=True))
+
+    for name, columns in INDEXES:
+        op.create_index(name, 'backtest_result', columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='backtest_result', if_exists=True)
+    with op.batch_alter_table('backtest_result') as batch_op:
+        for name, _ in reversed(NEW_COLUMNS):
+            batch_op.drop_column(name)
+        batch_op.drop_column('user_id')
@@ -0,0 +1,54 @@
+"""
+LEAN Trading Bot Stack - Konfiguracja testów backendu
+SQLite w katalogu tymczasowym i Redis w pamięci zamiast usług z docker-compose
+"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope='session')
+def backend(tmp_path_factory):
+    fakeredis = pytest.importorskip('fakeredis')
+    os.environ['DATABASE_URL'] = f"sqlite:///{tmp_path_factory.mktemp('db') / 'backend.db'}"
+    import app as backend
+
+    redis_client = fakeredis.FakeRedis()
+    backend.redis_client = redis_client
+    backend.token_service.redis = backend.token_service.revocations.redis = redis_client
+    backend.backtest_queue.redis = redis_client
+    backend.market_data_service.redis = redis_client
+    backend.broker_health_checker.redis = redis_client
+    # No broker has a status URL, so health checks never leave the process
+    backend.broker_health_checker.endpoint_overrides = {name: {} for name in backend.broker_health.HEALTH_ENDPOINTS}
+    backend.limiter.enabled = False
+    return backend
+
+
+@pytest.fixture
+def user(backend):
+    """A fresh schema with one user; tables are created here, not by the first request"""
+    with backend.app.app_context():
+        backend.db.drop_all()
+        backend.db.create_all()
+        backend._tables_ready = True
+        user = backend.User(username='tester', email='tester@localhost')
+        backend.db.session.add(user)
+        backend.db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def auth_headers(backend, user):
+    token = backend.token_service.issue(user)['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
@@ -0,0 +1,72 @@
+"""
+LEAN Trading Bot Stack - Liczba zapytań SQL list
+Strona listy kosztuje tyle samo zapytań bez względu na liczbę wierszy (brak N+1)
+"""
+
+import flask
+import pytest
+
+LIST_ENDPOINTS = (
+    '/api/strategies',
+    '/api/models',
+    '/api/brokers',
+    '/api/backtests',
+    '/api/backtests?sort=sharpe_ratio'
+)
+
+
+def seed(backend, user_id, count):
+    """count rows for every list endpoint, each with a backtest"""
+    with backend.app.app_context():
+        db = backend.db
+        strategies = [
+            backend.TradingStrategy(user_id=user_id, name=f'strategy-{index}', code='pass', parameters={})
+            for index in range(count)
+        ]
+        db.session.add_all(strategies)
+        db.session.flush()
+        db.session.add_all(
+            [backend.MLModel(user_id=user_id, name=f'model-{index}', model_type='onnx') for index in range(count)]
+            + [backend.BrokerConnection(user_id=user_id, broker_name='paper') for _ in range(count)]
+            + [
+                backend.BacktestResult(
+                    user_id=user_id, strategy_id=strategy.id, sharpe_ratio=index / 10,
+                    total_return=0.01 * index, max_drawdown=-0.01 * index, trade_count=index,
+                    results_json={'engine': 'vectorized'}
+                )
+                for index, strategy in enumerate(strategies)
+            ]
+        )
+        db.session.commit()
+
+
+def query_count(client, path, headers):
+    # Inside `with client` the request context, and so g, outlives the request
+    with client:
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        return flask.g.get('query_count', 0)
+
+
+@pytest.mark.parametrize('path', LIST_ENDPOINTS)
+def test_list_query_count_does_not_grow_with_rows(backend, client, user, auth_headers, path):
+    seed(backend, user, 2)
+    few = query_count(client, path, auth_headers)
+    seed(backend, user, 40)
+    many = query_count(client, path, auth_headers)
+
+    assert many == few
+    assert 1 <= few <= 2
+
+
+@pytest.mark.parametrize('path', LIST_ENDPOINTS)
+def test_next_page_costs_the_same(backend, client, user, auth_headers, path):
+    seed(backend, user, 30)
+    separator = '&' if '?' in path else '?'
+    with client:
+        first = client.get(f'{path}{separator}limit=10', headers=auth_headers)
+        first_count = flask.g.get('query_count', 0)
+    cursor = first.get_json()['next_cursor']
+    assert cursor
+
+    assert query_count(client, f'{path}{separator}limit=10&cursor={cursor}', auth_headers) == first_count
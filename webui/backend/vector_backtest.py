@@ -0,0 +1,351 @@
+"""
+LEAN Trading Bot Stack - Wektorowy backtester
+Szybka wstępna ocena strategii na tablicach OHLCV przed pełnym przebiegiem LEAN
+
+Signals are computed on each bar's close and filled at the next bar's
+open, so no bar trades on information it did not have. Positions are
+-1, 0 or 1 (long only unless allow_short). Every change of position
+pays fees and slippage as a fraction of the traded notional. The whole
+simulation is array arithmetic over the bars; parameter grids are
+spread over one shared process pool in chunks of combinations.
+"""
+
+import functools
+import itertools
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# Below this many combinations a process pool costs more than it saves
+MIN_PARALLEL_COMBINATIONS = 8
+
+
+# Data loading
+
+def bars_from_frame(frame):
+    """Column arrays from a DataFrame with OHLCV columns and an optional time column"""
+    frame = frame.rename(columns=str.lower)
+    missing = [field for field in ('open', 'close') if field not in frame]
+    if missing:
+        raise ValueError(f"Bars are missing columns: {', '.join(missing)}")
+
+    bars = {}
+    for field in BAR_FIELDS:
+        if field in frame:
+            bars[field] = frame[field].to_numpy(dtype=np.float64)
+    bars.setdefault('high', np.maximum(bars['open'], bars['close']))
+    bars.setdefault('low', np.minimum(bars['open'], bars['close']))
+    bars.setdefault('volume', np.zeros(len(frame)))
+
+    for column in ('time', 'timestamp', 'date', 'datetime'):
+        if column in frame:
+            bars['time'] = pd.to_datetime(frame[column]).to_numpy(dtype='datetime64[s]')
+            break
+    return bars
+
+
+def parse_bars(payload):
+    """Bars from a {column: [values]} dict or a list of bar records"""
+    if isinstance(payload, dict):
+        frame = pd.DataFrame({key: list(value) for key, value in payload.items()})
+    elif isinstance(payload, list):
+        frame = pd.DataFrame.from_records(payload)
+    else:
+        raise ValueError("bars must be a dict of columns or a list of records")
+    return bars_from_frame(frame)
+
+
+def load_bars_file(path):
+    """Bars from a CSV file with a header row"""
+    if not path.endswith('.csv'):
+        raise ValueError(f"Unsupported bar file format: {path}")
+    return bars_from_frame(pd.read_csv(path))
+
+
+def slice_bars(bars, start=None, end=None):
+    """Bars with start <= time <= end; bars without timestamps are returned whole"""
+    if 'time' not in bars or (start is None and end is None):
+        return bars
+    mask = np.ones(len(bars['time']), dtype=bool)
+    if start is not None:
+        mask &= bars['time'] >= np.datetime64(start, 's')
+    if end is not None:
+        mask &= bars['time'] <= np.datetime64(end, 's')
+    return {field: values[mask] for field, values in bars.items()}
+
+
+# Signals: target position per bar, decided on that bar's close
+
+def _rolling_mean(values, window):
+    out = np.full(len(values), np.nan)
+    if window <= len(values):
+        sums = np.cumsum(np.concatenate(([0.0], values)))
+        out[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return out
+
+
+def _rolling_std(values, window):
+    out = np.full(len(values), np.nan)
+    if window <= len(values):
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+        out[window - 1:] = windows.std(axis=1)
+    return out
+
+
+def _rolling_extreme(values, window, reducer):
+    """Max or min over the window bars before each bar (excluding the bar itself)"""
+    out = np.full(len(values), np.nan)
+    if window < len(values):
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+        out[window:] = reducer(windows, axis=1)[:-1]
+    return out
+
+
+def _hold(entries):
+    """Forward-fill positions: NaN means keep the previous position, leading NaN is flat"""
+    filled = np.where(np.isnan(entries), 0.0, entries)
+    index = np.where(~np.isnan(entries), np.arange(len(entries)), 0)
+    np.maximum.accumulate(index, out=index)
+    return np.where(np.isnan(entries[index]), 0.0, filled[index])
+
+
+def signal_sma_cross(bars, fast, slow):
+    if not 0 < fast < slow:
+        raise ValueError("sma_cross needs 0 < fast < slow")
+    spread = _rolling_mean(bars['close'], int(fast)) - _rolling_mean(bars['close'], int(slow))
+    return np.nan_to_num(np.sign(spread))
+
+
+def signal_momentum(bars, lookback, threshold=0.0):
+    lookback = int(lookback)
+    if lookback <= 0:
+        raise ValueError("momentum needs lookback > 0")
+    close = bars['close']
+    change = np.full(len(close), np.nan)
+    change[lookback:] = close[lookback:] / close[:-lookback] - 1
+    return np.where(change > threshold, 1.0, np.where(change < -threshold, -1.0, 0.0))
+
+
+def signal_bollinger(bars, window, z_entry=2.0, z_exit=0.0):
+    """Mean reversion: fade moves beyond z_entry deviations, flatten once back inside z_exit"""
+    window = int(window)
+    close = bars['close']
+    std = _rolling_std(close, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (close - _rolling_mean(close, window)) / std
+    entries = np.full(len(close), np.nan)
+    entries[np.abs(z) <= z_exit] = 0.0
+    entries[z > z_entry] = -1.0
+    entries[z < -z_entry] = 1.0
+    return _hold(entries)
+
+
+def signal_breakout(bars, window):
+    """Donchian breakout: follow a close beyond the previous window's high or low"""
+    window = int(window)
+    upper = _rolling_extreme(bars['high'], window, np.max)
+    lower = _rolling_extreme(bars['low'], window, np.min)
+    entries = np.full(len(bars['close']), np.nan)
+    entries[bars['close'] > upper] = 1.0
+    entries[bars['close'] < lower] = -1.0
+    return _hold(entries)
+
+
+SIGNALS = {
+    'sma_cross': signal_sma_cross,
+    'momentum': signal_momentum,
+    'bollinger': signal_bollinger,
+    'breakout': signal_breakout
+}
+
+
+# Simulation
+
+def simulate(bars, target, initial_capital, fee_bps=1.0, slippage_bps=1.0,
+             periods_per_year=252, keep_equity=False):
+    """Fill target positions at the next open and measure the resulting equity curve"""
+    open_, close = bars['open'], bars['close']
+    n = len(close)
+    if n < 2:
+        raise ValueError("At least two bars are needed")
+
+    held = np.zeros(n)
+    held[1:] = target[:-1]
+    prev = np.zeros(n)
+    prev[1:] = held[:-1]
+
+    gap = np.zeros(n)
+    gap[1:] = open_[1:] / close[:-1] - 1
+    intraday = close / open_ - 1
+
+    changed = held != prev
+    rate = (fee_bps + slippage_bps) / 10000.0
+    exit_cost = np.where(changed, np.abs(prev), 0.0) * rate
+    entry_cost = np.where(changed, np.abs(held), 0.0) * rate
+
+    # At each open: the old position takes the gap, pays to exit, the new one pays to enter
+    exit_leg = (1 + prev * gap) * (1 - exit_cost)
+    entry_leg = (1 - entry_cost) * (1 + held * intraday)
+    growth = exit_leg * entry_leg
+    equity = initial_capital * np.cumprod(growth)
+
+    returns = growth - 1
+    std = returns.std()
+    sharpe = float(returns.mean() / std * math.sqrt(periods_per_year)) if std > 0 else 0.0
+    peaks = np.maximum.accumulate(np.concatenate(([initial_capital], equity)))[1:]
+    max_drawdown = float((equity / peaks - 1).min())
+
+    # Round trips: each entry opens a trade that runs until the position changes again
+    starts = (held != 0) & changed
+    trade_of_bar = np.where(held != 0, np.cumsum(starts), 0)
+    trade_of_prev = np.zeros(n, dtype=trade_of_bar.dtype)
+    trade_of_prev[1:] = trade_of_bar[:-1]
+    n_trades = int(starts.sum())
+    with np.errstate(divide='ignore'):
+        trade_log = (
+            np.bincount(trade_of_bar, weights=np.log(entry_leg), minlength=n_trades + 1)
+            + np.bincount(trade_of_prev, weights=np.log(exit_leg), minlength=n_trades + 1)
+        )[1:]
+
+    result = {
+        'final_capital': float(equity[-1]),
+        'total_return': float(equity[-1] / initial_capital - 1),
+        'sharpe_ratio': sharpe,
+        'max_drawdown': max_drawdown,
+        'trades': n_trades,
+        'winning_trades': int((trade_log > 0).sum()),
+        'losing_trades': int((trade_log <= 0).sum()),
+        'turnover': float(np.abs(held - prev).sum()),
+        'exposure': float(np.abs(held).mean()),
+        'bars': n
+    }
+    if keep_equity:
+        result['equity'] = equity
+        # A trade is filled at the open of its first bar and closed at the open after its last one
+        entries = np.flatnonzero(starts)
+        following = np.append(trade_of_bar[1:], 0)
+        exits = np.flatnonzero((trade_of_bar != 0) & (following != trade_of_bar)) + 1
+        # A trade still open after the last bar is valued at its close
+        exit_prices = np.where(exits < n, open_[np.minimum(exits, n - 1)], close[-1])
+        notional = np.concatenate(([initial_capital], equity))[entries] * np.abs(held[entries])
+        quantity = notional / open_[entries]
+        result['trade_log'] = {
+            'entry_index': entries,
+            'exit_index': np.minimum(exits, n - 1),
+            'direction': np.sign(held[entries]).astype(np.int8),
+            'quantity': quantity,
+            'entry_price': open_[entries],
+            'exit_price': exit_prices,
+            'pnl': notional * np.expm1(trade_log),
+            'fees': quantity * (open_[entries] + exit_prices) * rate
+        }
+    return result
+
+
+def run_combination(bars, signal, parameters, settings, keep_equity=False):
+    """Signal plus simulation for one parameter set"""
+    try:
+        target = SIGNALS[signal](bars, **parameters)
+    except TypeError as e:
+        raise ValueError(f"Bad parameters for {signal}: {e}") from e
+    if not settings.get('allow_short', True):
+        target = np.clip(target, 0.0, 1.0)
+    result = simulate(
+        bars, target, settings['initial_capital'],
+        fee_bps=settings.get('fee_bps', 1.0),
+        slippage_bps=settings.get('slippage_bps', 1.0),
+        periods_per_year=settings.get('periods_per_year', 252),
+        keep_equity=keep_equity
+    )
+    result['parameters'] = parameters
+    return result
+
+
+def expand_grid(parameters):
+    """Every combination of the list-valued parameters; scalars are kept fixed"""
+    parameters = parameters or {}
+    names = sorted(parameters)
+    choices = [value if isinstance(value, list) else [value] for value in (parameters[name] for name in names)]
+    if any(not choice for choice in choices):
+        raise ValueError("Parameter lists must not be empty")
+    return [dict(zip(names, combination)) for combination in itertools.product(*choices)]
+
+
+# One process pool per backend process, shared by every sweep. Its workers
+# come from a forkserver, never forked from a request thread that might
+# hold logging, database or Redis locks. A sweep's bars are written once
+# to .npy files that the workers memory-map, not pickled with every task.
+_pool = None
+_pool_lock = threading.Lock()
+_worker_bars = OrderedDict()
+WORKER_CACHED_SWEEPS = 4
+
+
+def _shared_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'))
+        return _pool
+
+
+def _reset_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _load_worker_bars(bars_dir, names):
+    bars = _worker_bars.get(bars_dir)
+    if bars is None:
+        bars = {name: np.load(os.path.join(bars_dir, f'{name}.npy'), mmap_mode='r') for name in names}
+        _worker_bars[bars_dir] = bars
+        if len(_worker_bars) > WORKER_CACHED_SWEEPS:
+            _worker_bars.popitem(last=False)
+    return bars
+
+
+def _run_in_worker(bars_dir, names, signal, settings, parameters):
+    return run_combination(_load_worker_bars(bars_dir, names), signal, parameters, settings)
+
+
+def run_sweep(bars, signal, grid, settings, workers=None):
+    """Results for every parameter set in grid, in grid order"""
+    if signal not in SIGNALS:
+        raise ValueError(f"Unknown signal: {signal}; available: {', '.join(sorted(SIGNALS))}")
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(grid) < MIN_PARALLEL_COMBINATIONS:
+        return [run_combination(bars, signal, parameters, settings) for parameters in grid]
+
+    pool = _shared_pool(workers)
+    with tempfile.TemporaryDirectory(prefix='sweep-') as bars_dir:
+        for name, values in bars.items():
+            np.save(os.path.join(bars_dir, f'{name}.npy'), np.ascontiguousarray(values))
+        task = functools.partial(_run_in_worker, bars_dir, tuple(bars), signal, settings)
+        chunksize = max(1, len(grid) // (workers * 4))
+        try:
+            return list(pool.map(task, grid, chunksize=chunksize))
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); the next sweep starts a new pool
+            _reset_pool(pool)
+            raise
+
+
+def downsample(values, max_points=500):
+    """Evenly spaced points of a curve, always keeping the last one"""
+    if len(values) <= max_points:
+        return values
+    index = np.linspace(0, len(values) - 1, max_points).round().astype(np.int64)
+    return values[index]
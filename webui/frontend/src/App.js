@@ -16,6 +16,7 @@ import Settings from './components/Settings';
 
 // Services
 import { authService } from './services/authService';
+import { clearTokens } from './services/apiService';
 
 // Styles
 import 'bootstrap/dist/css/bootstrap.min.css';
@@ -36,7 +37,7 @@ function App() {
           setUser(userData);
         })
         .catch(() => {
-          localStorage.removeItem('token');
+          clearTokens();
         })
         .finally(() => {
           setLoading(false);
@@ -51,8 +52,8 @@ function App() {
   };
 
   const handleLogout = () => {
-    localStorage.removeItem('token');
     setUser(null);
+    authService.logout();
   };
 
   if (loading) {
@@ -4,6 +4,8 @@ import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContai
 import { apiService } from '../services/apiService';
 import { toast } from 'react-toastify';
 
+const WATCHLIST = ['SPY', 'QQQ', 'BTCUSD', 'EURUSD'];
+
 function Dashboard() {
   const [stats, setStats] = useState({
     totalReturn: 0,
@@ -14,13 +16,23 @@ function Dashboard() {
   const [recentActivity, setRecentActivity] = useState([]);
   const [performanceData, setPerformanceData] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [quotes, setQuotes] = useState({});
 
   useEffect(() => {
     loadDashboardData();
-    
-    // Refresh data every 30 seconds
-    const interval = setInterval(loadDashboardData, 30000);
-    return () => clearInterval(interval);
+
+    // Counts change only through the user's own actions; reload when the tab regains focus
+    window.addEventListener('focus', loadDashboardData);
+    return () => window.removeEventListener('focus', loadDashboardData);
+  }, []);
+
+  useEffect(() => {
+    // Quotes are pushed by the server; EventSource reconnects on its own
+    const stream = apiService.streamQuotes(WATCHLIST);
+    const merge = (event) => setQuotes((current) => ({ ...current, ...JSON.parse(event.data) }));
+    stream.addEventListener('snapshot', merge);
+    stream.addEventListener('quotes', merge);
+    return () => stream.close();
   }, []);
 
   const loadDashboardData = async () => {
@@ -28,7 +40,7 @@ function Dashboard() {
       // Load various dashboard data
       const [brokersResponse, strategiesResponse, backtestsResponse] = await Promise.all([
         apiService.getBrokers(),
-        apiService.getStrategies(),
+        apiService.getStrategies({ active: true, limit: 500 }),
         apiService.getBacktests()
       ]);
 
@@ -124,6 +136,45 @@ function Dashboard() {
         </Col>
       </Row>
 
+      {/* Watchlist */}
+      <Row className="mb-4">
+        <Col>
+          <Card>
+            <Card.Header>
+              <h5 className="mb-0">
+                <i className="fas fa-eye me-2"></i>
+                Notowania
+              </h5>
+            </Card.Header>
+            <Card.Body className="p-0">
+              <Table className="mb-0" size="sm">
+                <thead>
+                  <tr>
+                    <th>Symbol</th>
+                    <th className="text-end">Cena</th>
+                    <th className="text-end">Zmiana</th>
+                  </tr>
+                </thead>
+                <tbody>
+                  {WATCHLIST.map((symbol) => {
+                    const quote = quotes[symbol];
+                    return (
+                      <tr key={symbol}>
+                        <td className="fw-bold">{symbol}</td>
+                        <td className="text-end">{quote ? quote.price.toLocaleString() : '—'}</td>
+                        <td className={`text-end ${quote && quote.change < 0 ? 'text-danger' : 'text-success'}`}>
+                          {quote ? `${quote.change_percent}%` : '—'}
+                        </td>
+                      </tr>
+                    );
+                  })}
+                </tbody>
+              </Table>
+            </Card.Body>
+          </Card>
+        </Col>
+      </Row>
+
       <Row>
         {/* Performance Chart */}
         <Col lg={8}>
@@ -1,6 +1,7 @@
 import React, { useState } from 'react';
 import { Container, Row, Col, Card, Form, Button, Alert } from 'react-bootstrap';
 import { authService } from '../services/authService';
+import { storeTokens } from '../services/apiService';
 
 function Login({ onLogin }) {
   const [credentials, setCredentials] = useState({
@@ -24,7 +25,7 @@ function Login({ onLogin }) {
 
     try {
       const response = await authService.login(credentials);
-      localStorage.setItem('token', response.data.token);
+      storeTokens(response.data);
       onLogin(response.data.user);
     } catch (error) {
       setError(error.response?.data?.error || 'Błąd logowania');
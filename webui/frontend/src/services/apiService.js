@@ -26,15 +26,63 @@ api.interceptors.request.use(
   }
 );
 
+// Store the access/refresh token pair returned by login and refresh
+export const storeTokens = (data) => {
+  localStorage.setItem('token', data.token);
+  if (data.refresh_token) {
+    localStorage.setItem('refreshToken', data.refresh_token);
+  }
+};
+
+export const clearTokens = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem('refreshToken');
+};
+
+// Concurrent 401s share one refresh call, since a refresh token works only once
+let refreshPromise = null;
+
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refreshToken');
+    refreshPromise = axios
+      .post(`${API_BASE_URL}/api/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        storeTokens(response.data);
+        return response.data.token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 // Response interceptor to handle auth errors
 api.interceptors.response.use(
   (response) => {
     return response;
   },
-  (error) => {
-    if (error.response?.status === 401) {
-      // Unauthorized - remove token and redirect to login
-      localStorage.removeItem('token');
+  async (error) => {
+    const original = error.config;
+    const isAuthCall = ['/api/auth/login', '/api/auth/refresh', '/api/auth/logout'].includes(original?.url);
+
+    // Short-lived access token expired - get a new one and retry once
+    if (error.response?.status === 401 && original && !original._retried && !isAuthCall
+        && localStorage.getItem('refreshToken')) {
+      original._retried = true;
+      try {
+        const token = await refreshAccessToken();
+        original.headers.Authorization = `Bearer ${token}`;
+        return api(original);
+      } catch (refreshError) {
+        // Refresh token expired or revoked - fall through to login
+      }
+    }
+
+    if (error.response?.status === 401 && original?.url !== '/api/auth/login') {
+      // Unauthorized - remove tokens and redirect to login
+      clearTokens();
       window.location.href = '/login';
     }
     return Promise.reject(error);
@@ -47,17 +95,20 @@ export const apiService = {
 
   // Authentication
   login: (credentials) => api.post('/api/auth/login', credentials),
+  logout: () => api.post('/api/auth/logout'),
   getCurrentUser: () => api.get('/api/auth/me'),
 
   // Brokers
-  getBrokers: () => api.get('/api/brokers'),
+  // Statuses come from the backend's cache; refresh=true re-checks every broker first
+  getBrokers: (refresh = false) => api.get('/api/brokers', { params: refresh ? { refresh: true } : {} }),
   addBroker: (brokerData) => api.post('/api/brokers', brokerData),
   updateBroker: (id, brokerData) => api.put(`/api/brokers/${id}`, brokerData),
   deleteBroker: (id) => api.delete(`/api/brokers/${id}`),
   testBrokerConnection: (id) => api.post(`/api/brokers/${id}/test`),
 
   // Strategies
-  getStrategies: () => api.get('/api/strategies'),
+  // List endpoints return one page (limit, default 100) and next_cursor for the following one
+  getStrategies: (params = {}) => api.get('/api/strategies', { params }),
   getStrategy: (id) => api.get(`/api/strategies/${id}`),
   createStrategy: (strategyData) => api.post('/api/strategies', strategyData),
   updateStrategy: (id, strategyData) => api.put(`/api/strategies/${id}`, strategyData),
@@ -65,7 +116,7 @@ export const apiService = {
   toggleStrategy: (id) => api.post(`/api/strategies/${id}/toggle`),
 
   // ML Models
-  getMLModels: () => api.get('/api/models'),
+  getMLModels: (params = {}) => api.get('/api/models', { params }),
   uploadMLModel: (formData) => api.post('/api/models/upload', formData, {
     headers: {
       'Content-Type': 'multipart/form-data',
@@ -75,8 +126,11 @@ export const apiService = {
   testMLModel: (id, testData) => api.post(`/api/models/${id}/test`, testData),
 
   // Backtests
-  getBacktests: () => api.get('/api/backtests'),
+  getBacktests: (params = {}) => api.get('/api/backtests', { params }),
+  getBacktestSummary: (params = {}) => api.get('/api/backtests/summary', { params }),
   getBacktest: (id) => api.get(`/api/backtests/${id}`),
+  getBacktestEquity: (id, params = {}) => api.get(`/api/backtests/${id}/equity`, { params }),
+  getBacktestTrades: (id, params = {}) => api.get(`/api/backtests/${id}/trades`, { params }),
   runBacktest: (backtestConfig) => api.post('/api/backtest', backtestConfig),
   deleteBacktest: (id) => api.delete(`/api/backtests/${id}`),
 
@@ -88,6 +142,11 @@ export const apiService = {
 
   // Market Data
   getMarketData: (symbol) => api.get(`/api/market-data/${symbol}`),
+  getQuotes: (symbols) => api.get('/api/market-data/quotes', { params: { symbols: symbols.join(',') } }),
+  // Server-sent events; every open stream shares the backend's single upstream poll
+  streamQuotes: (symbols) => new EventSource(
+    `${API_BASE_URL}/api/market-data/stream?symbols=${encodeURIComponent(symbols.join(','))}`
+  ),
   getHistoricalData: (symbol, timeframe, start, end) => 
     api.get(`/api/market-data/${symbol}/history`, {
       params: { timeframe, start, end }
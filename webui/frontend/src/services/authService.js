@@ -1,4 +1,4 @@
-import api from './apiService';
+import api, { clearTokens } from './apiService';
 
 export const authService = {
   login: async (credentials) => {
@@ -6,8 +6,14 @@ export const authService = {
     return response;
   },
 
-  logout: () => {
-    localStorage.removeItem('token');
+  logout: async () => {
+    try {
+      // Revoke the session server-side so the refresh token stops working too
+      await api.post('/api/auth/logout');
+    } catch (error) {
+      // Token already expired or revoked - nothing left to end
+    }
+    clearTokens();
     window.location.href = '/login';
   },
 